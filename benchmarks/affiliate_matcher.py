@@ -0,0 +1,80 @@
+"""
+アフィリエイトキーワード照合の計測
+
+キーワード数 × タイトル数の合成データで、Aho-Corasick マッチャーの構築時間と
+1秒あたりの照合件数を測る。従来の全キーワード線形走査は一部のタイトルだけで測り、
+全件分を推定して並べて表示する。
+
+    python benchmarks/affiliate_matcher.py --keywords 10000 --titles 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.affiliate_manager import LinkEntry, build_matcher, find_affiliate_links  # noqa: E402
+
+WORDS = ["AI", "Note", "Pro", "Max", "Studio", "Cloud", "Writer", "Voice", "Vision", "Agent",
+         "ノート", "レコーダー", "イヤホン", "カメラ", "翻訳", "要約", "画像生成", "動画編集"]
+
+
+def synthetic_keywords(count, rng):
+    return [f"{rng.choice(WORDS)}{rng.choice(WORDS)}-{i}" for i in range(count)]
+
+
+def synthetic_titles(count, keywords, rng, hit_ratio):
+    for i in range(count):
+        words = " ".join(rng.choice(WORDS) for _ in range(4))
+        if rng.random() < hit_ratio:
+            words += " " + rng.choice(keywords)
+        yield f"【入門】{words} {i}とは？初心者向け徹底解説"
+
+
+def linear_scan(keywords, title):
+    """従来の get_affiliate_html と同じ、キーワードごとの部分文字列検索"""
+    lowered = title.lower()
+    for keyword in keywords:
+        if keyword.lower() in lowered:
+            return keyword
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keywords", type=int, default=10000)
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--hit-ratio", type=float, default=0.3)
+    parser.add_argument("--linear-sample", type=int, default=200, help="線形走査で実測するタイトル数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    keywords = synthetic_keywords(args.keywords, rng)
+    titles = list(synthetic_titles(args.titles, keywords, rng, args.hit_ratio))
+    entries = [LinkEntry(keywords=[keyword], html=f"<a>{keyword}</a>", priority=i % 3)
+               for i, keyword in enumerate(keywords)]
+
+    start = time.perf_counter()
+    matcher = build_matcher(entries)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hits = sum(1 for title in titles if find_affiliate_links(title, matcher))
+    match_time = time.perf_counter() - start
+
+    sample = titles[:args.linear_sample]
+    start = time.perf_counter()
+    for title in sample:
+        linear_scan(keywords, title)
+    linear_estimate = (time.perf_counter() - start) / len(sample) * len(titles)
+
+    print(f"keywords={args.keywords} titles={args.titles} hits={hits}")
+    print(f"  build:        {build_time * 1000:8.1f} ms")
+    print(f"  aho-corasick: {match_time:8.2f} s  ({len(titles) / match_time:,.0f} titles/sec)")
+    print(f"  linear scan:  {linear_estimate:8.2f} s  (estimated from {len(sample)} titles)")
+
+
+if __name__ == "__main__":
+    main()
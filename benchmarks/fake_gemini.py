@@ -0,0 +1,52 @@
+"""
+Gemini の代わりに使う偽モデル（ContentGenerator(model=FakeGeminiModel()) で渡す）
+
+generate_content は指定した時間だけ待ってから、実際の記事に近い長さのMarkdownを返す。
+レスポンスは text / usage_metadata / candidates を本物と同じ名前で持つ。
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+PARAGRAPH = (
+    "このツールは日々の作業を自動化し、情報収集や文章作成にかかる時間を大幅に短縮します。"
+    "導入も簡単で、初心者でもすぐに使い始めることができます。"
+)
+
+
+class FakeGeminiModel:
+    def __init__(self, latency=0.5, body_chars=4000, fail_every=0):
+        """latency: 1回の呼び出しにかかる秒数 / fail_every: N回に1回例外を出す（0なら出さない）"""
+        self.latency = latency
+        self.body_chars = body_chars
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _body(self, prompt):
+        theme = next((line.split(":", 1)[1].strip() for line in prompt.splitlines() if "テーマ:" in line), "AI")
+        sections = [f"## {theme}とは", "## 主な特徴やメリット", "## 活用事例", "## まとめ"]
+        per_section = max(1, self.body_chars // (len(sections) * len(PARAGRAPH)))
+        return "\n\n".join(f"{heading}\n\n" + PARAGRAPH * per_section for heading in sections) + "\n"
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.latency)
+        if self.fail_every and call % self.fail_every == 0:
+            # 本物のレート制限と同じ型（ContentGenerator はこの型で再試行を判断する）
+            from google.api_core.exceptions import ResourceExhausted
+            raise ResourceExhausted("Resource has been exhausted (fake)")
+        text = self._body(prompt)
+        prompt_tokens = len(prompt) // 2
+        output_tokens = len(text) // 2
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+            candidates=[SimpleNamespace(finish_reason="STOP")],
+        )
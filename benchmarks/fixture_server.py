@@ -0,0 +1,121 @@
+"""
+スクレイピング対象サイトのフィクスチャを返すローカルHTTPサーバー
+
+benchmarks/fixtures/ のHTMLを、本物のサイトと同じセレクタで読めるように返す。
+{{BASE}} はサーバー自身のURL、{{NAME}} はパスから取ったツール名に置き換える。
+
+    /futuretools/tools/<name>          FutureTools のツールページ
+    /zenn/                             Zenn のトップ（トレンド記事一覧）
+    /kakaku/pc/note-pc/ranking_0020/   価格.com ノートPCランキング
+
+    python benchmarks/fixture_server.py --port 8000 --latency 0.05
+"""
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+ROUTES = [
+    ("/futuretools/tools/", "futuretools_tool.html"),
+    ("/zenn/", "zenn_trends.html"),
+    ("/kakaku/pc/note-pc/ranking_0020/", "kakaku_ranking.html"),
+]
+
+_fixtures = {}
+
+
+def _load(name):
+    if name not in _fixtures:
+        with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+            _fixtures[name] = f.read()
+    return _fixtures[name]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        for prefix, fixture in ROUTES:
+            if path.startswith(prefix):
+                break
+        else:
+            self.send_error(404)
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        name = path[len(prefix):].strip("/") or "index"
+        body = _load(fixture).replace("{{BASE}}", self.server.base_url).replace("{{NAME}}", name)
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.requests += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """with FixtureServer() as server: で起動し、抜けると止まる"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency = latency
+        self.httpd.requests = 0
+        self.base_url = self.httpd.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def futuretools_urls(self, count):
+        return [f"{self.base_url}/futuretools/tools/tool-{i}" for i in range(count)]
+
+    @property
+    def zenn_url(self):
+        return f"{self.base_url}/zenn/"
+
+    @property
+    def kakaku_url(self):
+        return f"{self.base_url}/kakaku/pc/note-pc/ranking_0020/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve scraping fixtures locally")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before each response")
+    args = parser.parse_args()
+    server = FixtureServer(port=args.port, latency=args.latency)
+    print(f"Serving fixtures at {server.base_url} (Ctrl+C to stop)")
+    print(f"  {server.futuretools_urls(1)[0]}\n  {server.zenn_url}\n  {server.kakaku_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
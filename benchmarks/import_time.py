@@ -0,0 +1,92 @@
+"""
+エントリポイントの起動時間（コールドimport）ベンチマーク
+
+各モジュールを新しいPythonプロセスで `-X importtime` 付きでimportし、
+「import時に読み込まれてはいけない重い依存」と累積import時間をチェックする。
+時間の予算は絶対値（ms）ではなく、同じマシンで同じ回数だけ計った基準モジュール
+（標準ライブラリの REFERENCE_MODULE）の何倍までかで持つので、CIランナーの速さが
+変わっても結果がぶれにくい。どちらかを超えた場合は終了コード1で終わるので、CIでそのまま使える。
+
+    python benchmarks/import_time.py            # チェック
+    python benchmarks/import_time.py --update   # 予算ファイルを現在値から作り直す
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_budget.json")
+
+# import しただけでは読み込まれてはいけないモジュール
+HEAVY_MODULES = ["google.generativeai", "pandas", "playwright"]
+
+# 時間の基準にする標準ライブラリのモジュール（それ自体も重めで、ばらつきが相対的に小さいもの）
+REFERENCE_MODULE = "asyncio"
+
+# --update で予算を作るときにかける余裕（基準との比のばらつき吸収）
+BUDGET_MARGIN = 1.5
+REPEAT = 5
+
+
+def measure(module: str):
+    """(累積import時間[ms], 読み込まれた重い依存のリスト) を返す"""
+    code = (
+        f"import sys, {module}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1].strip())
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return (cumulative_us or 0) / 1000.0, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold import-time benchmark for entry points")
+    parser.add_argument("--update", action="store_true", help="rewrite the budget file from this run")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, encoding="utf-8") as f:
+        budgets = json.load(f)
+
+    reference_ms = min(measure(REFERENCE_MODULE)[0] for _ in range(REPEAT))
+    print(f"{REFERENCE_MODULE + ' (reference)':<24} {reference_ms:8.1f} ms")
+
+    failed = False
+    results = {}
+    for module, budget_ratio in budgets.items():
+        samples = [measure(module) for _ in range(REPEAT)]
+        best_ms = min(ms for ms, _ in samples)
+        loaded = samples[0][1]
+        ratio = best_ms / reference_ms
+        results[module] = ratio
+
+        status = "OK"
+        if loaded:
+            status = f"FAIL (heavy modules imported: {', '.join(loaded)})"
+            failed = True
+        elif not args.update and ratio > budget_ratio:
+            status = f"FAIL (budget {budget_ratio:.1f}x {REFERENCE_MODULE})"
+            failed = True
+        print(f"{module:<24} {best_ms:8.1f} ms  {ratio:5.1f}x  {status}")
+
+    if args.update:
+        with open(BUDGET_FILE, "w", encoding="utf-8") as f:
+            json.dump({m: round(r * BUDGET_MARGIN + 0.5, 1) for m, r in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"Budget file updated: {BUDGET_FILE}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
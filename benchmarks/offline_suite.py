@@ -0,0 +1,288 @@
+"""
+オフラインのエンドツーエンド・ベンチマーク
+
+本物のサイトや Gemini API を使わずに、各ステージのスループット（件/秒）とピークメモリを測る。
+
+    scraper     Scraper.run()（fixture_server のローカルサイトに対して。Chromium が必要）
+    cleaner     Cleaner.clean_records()（合成の ProductRecord）
+    cleaner_df  Cleaner.process()（同じレコードを DataFrame で整形する従来の経路）
+    storage     Storage.save_records()（Cleaner 済みのレコードを新しいDBへ）
+    generator   ContentGenerator.generate_article()（FakeGeminiModel、重複判定インデックスつき）
+    export      export_article_to_markdown()（合成DBから空の docs/ へ）
+    export_incremental  変更なしでもう一度 export（差分書き出しの確認）
+    snapshot    export_snapshot()（合成DBから Parquet へ。pyarrow が必要）
+
+各ケースは新しいプロセスで実行するので、ピークメモリ（ru_maxrss）がケースごとに分かれる。
+結果は JSON で保存し、--compare で別のコミットの結果と比べられる。
+
+    python benchmarks/offline_suite.py --sizes 1k,100k
+    python benchmarks/offline_suite.py --cases export --sizes 1M --output /tmp/after.json --compare /tmp/before.json
+"""
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+CASES = ["scraper", "cleaner", "cleaner_df", "storage", "generator", "export", "export_incremental", "snapshot"]
+# 行数に依存しないケース（1回だけ実行する）
+UNSIZED_CASES = {"scraper"}
+
+
+def _rss_mb():
+    # Linux の ru_maxrss は KB（macOS はバイト）
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# ==========================================
+# ケース（子プロセスで実行される）
+# ==========================================
+def _case_scraper(size, options):
+    import asyncio
+    from dataclasses import replace
+    from fixture_server import FixtureServer
+    from scrape_sources import load_sources
+    from scraper_pipeline import Scraper, ScraperConfig
+
+    sources = {source.name: source for source in load_sources(os.path.join(REPO_ROOT, "scrape_sources.json"))}
+    with FixtureServer(latency=options["http_latency"]) as server:
+        # 登録簿のセレクタはそのままで、URLだけフィクスチャサーバーに向ける
+        urls = {
+            "FutureTools": server.futuretools_urls(options["scrape_pages"]),
+            "Zenn": [server.zenn_url],
+            "Kakaku": [server.kakaku_url],
+        }
+        config = ScraperConfig(
+            sources=[replace(source, urls=tuple(urls[name])) for name, source in sources.items() if name in urls],
+            delay_range=(0.0, 0.0),
+        )
+        scraper = Scraper(config)
+        yield "start"
+        items = asyncio.run(scraper.run())
+    yield len(items)
+
+
+def _case_cleaner(size, options):
+    import pandas  # noqa: F401  初回importの時間は含めない
+    from scraper_pipeline import Cleaner
+    from synthetic_db import synthetic_records
+
+    records = synthetic_records(size)
+    yield "start"
+    cleaned = Cleaner().clean_records(records)
+    yield len(cleaned)
+
+
+def _case_cleaner_df(size, options):
+    import pandas  # noqa: F401  初回importの時間は含めない
+    from scraper_pipeline import Cleaner
+    from synthetic_db import synthetic_records
+
+    records = synthetic_records(size)
+    yield "start"
+    df = Cleaner().process(records)
+    yield len(df)
+
+
+def _case_storage(size, options):
+    from scraper_pipeline import Cleaner, Storage
+    from synthetic_db import synthetic_records
+
+    cleaned = Cleaner().clean_records(synthetic_records(size))
+    storage = Storage("storage_bench.db")
+    yield "start"
+    storage.save_records(cleaned)
+    yield len(cleaned)
+
+
+def _case_generator(size, options):
+    from content_generator import ContentGenerator
+    from fake_gemini import FakeGeminiModel
+    from synthetic_db import create_db
+
+    create_db("generator_bench.db", size, body_chars=200)
+    generator = ContentGenerator("generator_bench.db", model=FakeGeminiModel(latency=options["gemini_latency"]))
+    # 互いに重複判定されないよう、ランダムな語でキーワードを作る
+    rng = random.Random(0)
+    keywords = [" ".join(f"{rng.getrandbits(32):08x}" for _ in range(3)) for _ in range(options["keywords"])]
+    yield "start"
+    # 重複判定インデックスの構築（初回のみ）も含めて測る
+    saved = sum(1 for keyword in keywords if generator.generate_article(target_keyword=keyword))
+    yield saved
+
+
+def _case_export(size, options, incremental=False):
+    import export_to_site
+    from synthetic_db import create_db
+
+    export_to_site.DB_PATH = create_db("export_bench.db", size, body_chars=options["body_chars"])
+    if incremental:
+        export_to_site.export_article_to_markdown(workers=options["export_workers"])
+    yield "start"
+    export_to_site.export_article_to_markdown(workers=options["export_workers"])
+    yield size
+
+
+def _case_export_incremental(size, options):
+    return _case_export(size, options, incremental=True)
+
+
+def _case_snapshot(size, options):
+    from products_snapshot import export_snapshot
+    from synthetic_db import create_db
+
+    db_path = create_db("snapshot_bench.db", size, body_chars=options["body_chars"])
+    yield "start"
+    yield export_snapshot(db_path, "snapshot_bench")
+
+
+def _run_case(name, size, options, results):
+    """子プロセスの本体: 作業ディレクトリを一時ディレクトリにして1ケースを実行する"""
+    sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    os.chdir(workdir)
+    try:
+        # ログ・進捗表示の出力コストは測定に含めない
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            logging.disable(logging.WARNING)
+            steps = globals()[f"_case_{name}"](size, options)
+            next(steps)  # 準備（合成データ作成など）はここまで
+            rss_before = _rss_mb()
+            started = time.perf_counter()
+            items = next(steps)
+            seconds = time.perf_counter() - started
+        results.put({
+            "status": "ok",
+            "items": items,
+            "seconds": round(seconds, 4),
+            "items_per_sec": round(items / seconds, 2) if seconds else None,
+            "peak_rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+        })
+    except Exception as e:
+        # 依存パッケージやブラウザがない環境ではそのケースを飛ばす
+        missing = isinstance(e, ImportError) or "Executable doesn't exist" in str(e)
+        results.put({"status": "skipped" if missing else "error", "error": f"{type(e).__name__}: {str(e).splitlines()[0]}"})
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_case(name, size, options):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(name, size, options, results))
+    process.start()
+    process.join()
+    if not results.empty():
+        return results.get()
+    return {"status": "error", "error": f"worker exited with code {process.exitcode}"}
+
+
+# ==========================================
+# 結果の保存・比較
+# ==========================================
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result):
+    return f"{result['case']}@{result['size']}"
+
+
+def compare(baseline_path, current):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"] if r.get("status") == "ok"}
+    print(f"\nCompared with {baseline_path}:")
+    for result in current["results"]:
+        before = baseline.get(_key(result))
+        if result.get("status") != "ok" or before is None:
+            continue
+        speed = result["items_per_sec"] / before["items_per_sec"] if before["items_per_sec"] else float("nan")
+        memory = result["peak_rss_mb"] - before["peak_rss_mb"]
+        print(f"  {_key(result):<28} throughput x{speed:5.2f}   peak RSS {memory:+8.1f} MB")
+
+
+def main():
+    from synthetic_db import parse_size
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark suite")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma separated ({', '.join(CASES)})")
+    parser.add_argument("--sizes", default="1k", help="rows per case, e.g. 1k,100k,1M")
+    parser.add_argument("--scrape-pages", type=int, default=30, help="FutureTools pages for the scraper case")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="fixture server latency (seconds)")
+    parser.add_argument("--keywords", type=int, default=20, help="articles to generate in the generator case")
+    parser.add_argument("--gemini-latency", type=float, default=0.05, help="fake Gemini latency (seconds)")
+    parser.add_argument("--body-chars", type=int, default=2000, help="article length in the synthetic DB")
+    parser.add_argument("--export-workers", type=int, default=1)
+    parser.add_argument("--output", help="result JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="print the change against an earlier result")
+    args = parser.parse_args()
+
+    cases = [case.strip() for case in args.cases.split(",") if case.strip()]
+    for case in cases:
+        if case not in CASES:
+            parser.error(f"unknown case '{case}'")
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    options = {
+        "scrape_pages": args.scrape_pages,
+        "http_latency": args.http_latency,
+        "keywords": args.keywords,
+        "gemini_latency": args.gemini_latency,
+        "body_chars": args.body_chars,
+        "export_workers": args.export_workers,
+    }
+
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    report = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": options,
+        "results": [],
+    }
+
+    for case in cases:
+        for size in ([None] if case in UNSIZED_CASES else sizes):
+            result = {"case": case, "size": size, **run_case(case, size, options)}
+            report["results"].append(result)
+            if result["status"] == "ok":
+                print(f"{_key(result):<28} {result['items']:>9} items  {result['seconds']:9.3f} s  "
+                      f"{result['items_per_sec']:>12,.1f} /s  peak {result['peak_rss_mb']:8.1f} MB")
+            else:
+                print(f"{_key(result):<28} {result['status']}: {result['error']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, BENCH_DIR)
+    main()
@@ -0,0 +1,72 @@
+"""
+ページレンダリングのスループット計測（pages/sec）
+
+テンプレートのコンパイル時間（バイトコードキャッシュなし／あり）と、
+記事ページ・一覧ページを繰り返しレンダリングしたときの毎秒ページ数を表示する。
+
+    python benchmarks/render_throughput.py --pages 20000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import site_renderer  # noqa: E402
+from export_to_site import render_article  # noqa: E402
+
+TEMPLATES = ["article.md.j2", "search_buttons.md.j2", "listing.md.j2", "toc.md.j2", "index.md.j2"]
+
+
+def synthetic_rows(count, body_chars):
+    body = ("## 見出し\n\n" + "本文テキスト " * (body_chars // 7) + "\n") if body_chars else ""
+    for i in range(count):
+        yield (f"https://example.com/keyword/{i:032x}.html", f"【入門】サンプル記事 {i}とは？", body, "Tech News")
+
+
+def time_compile(cache_dir):
+    """新しい環境でテンプレート一式を読み込むのにかかる時間"""
+    site_renderer._env = None
+    site_renderer._templates.clear()
+    site_renderer.BYTECODE_CACHE_DIR = cache_dir
+    start = time.perf_counter()
+    for name in TEMPLATES:
+        site_renderer.get_template(name)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pages-per-second benchmark for the Jinja2 renderer")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--body-chars", type=int, default=3000)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="jinja_bench_")
+    try:
+        cold = time_compile(cache_dir)
+        warm = time_compile(cache_dir)
+        print(f"compile templates: {cold * 1000:.1f} ms (no bytecode cache), {warm * 1000:.1f} ms (cached)")
+
+        start = time.perf_counter()
+        for row in synthetic_rows(args.pages, args.body_chars):
+            render_article(row)
+        elapsed = time.perf_counter() - start
+        print(f"article pages:  {args.pages / elapsed:10.0f} pages/sec")
+
+        items = [(f"{i:032x}.md", f"【入門】サンプル記事 {i}とは？", "Tech News") for i in range(100)]
+        start = time.perf_counter()
+        listing_pages = max(1, args.pages // 10)
+        for page in range(listing_pages):
+            site_renderer.render("listing.md.j2", heading=f"新着記事一覧 ({page})", items=items,
+                                 prefix="../", newer="page-2.md", older=None)
+        elapsed = time.perf_counter() - start
+        print(f"listing pages:  {listing_pages / elapsed:10.0f} pages/sec (100 items each)")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
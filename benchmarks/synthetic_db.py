@@ -0,0 +1,109 @@
+"""
+ベンチマーク用の合成DB（products テーブル）を作る
+
+    python benchmarks/synthetic_db.py /tmp/bench.db --rows 100k --body-chars 2000
+
+行数は 1k / 100k / 1M のような表記も使える。スクレイピング結果相当のレコード
+（Cleaner / Storage の入力となる ProductRecord）も synthetic_records() で作れる。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CATEGORIES = ["AI Tool", "Tech News", "Gadget"]
+WORDS = ["Python", "Rust", "Gemini", "Docker", "LLM", "SQLite", "React", "ノートPC", "画像生成", "自動化", "副業", "入門"]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    price TEXT,
+    image_url TEXT,
+    specs TEXT,
+    category TEXT,
+    scraped_at TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    generated_body TEXT,
+    promoted INTEGER DEFAULT 0
+);
+"""
+BATCH_SIZE = 10000
+
+
+def parse_size(text):
+    """'1k' → 1000, '1M' → 1000000"""
+    text = str(text).strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def _title(rng, i):
+    return f"【入門】{rng.choice(WORDS)} {rng.choice(WORDS)} {i}とは？初心者向け徹底解説"
+
+
+def synthetic_records(count, seed=0, duplicate_ratio=0.05):
+    """Scraper.run() が返すのと同じ ProductRecord のリスト（空白の乱れや重複URLを含む）"""
+    from product_record import ProductRecord
+
+    rng = random.Random(seed)
+    now = datetime.now().isoformat()
+    records = []
+    for i in range(count):
+        index = rng.randrange(max(1, i)) if i and rng.random() < duplicate_ratio else i
+        records.append(ProductRecord(
+            url=f"https://example.com/tools/{index:08d}",
+            title=f"  {rng.choice(WORDS)}\n{rng.choice(WORDS)} Tool {index} ",
+            description="  ".join(rng.choice(WORDS) for _ in range(30)),
+            raw_price=f"{rng.randrange(0, 300000)}",
+            image_url="",
+            specs="\t".join(rng.choice(WORDS) for _ in range(5)),
+            category=rng.choice(CATEGORIES),
+            scraped_at=now,
+        ))
+    return records
+
+
+def create_db(path, rows, body_chars=2000, seed=0):
+    """rows 件の記事（本文つき）を持つDBを作る。既存のファイルは作り直す"""
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(seed)
+    body = ("## 見出し\n\n" + "本文テキスト " * (body_chars // 7) + "\n") if body_chars else None
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    for offset in range(0, rows, BATCH_SIZE):
+        batch = []
+        for i in range(offset, min(rows, offset + BATCH_SIZE)):
+            scraped_at = (start + timedelta(minutes=i * 7)).isoformat()
+            batch.append((
+                f"https://example.com/keyword/{i:032x}.html", _title(rng, i), "", "Free", "", "",
+                rng.choice(CATEGORIES), scraped_at, scraped_at.replace("T", " ")[:19], body,
+            ))
+        conn.executemany("""
+            INSERT INTO products (url, title, description, price, image_url, specs, category, scraped_at, updated_at, generated_body)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, batch)
+        conn.commit()
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a synthetic products database")
+    parser.add_argument("path")
+    parser.add_argument("--rows", default="1k")
+    parser.add_argument("--body-chars", type=int, default=2000)
+    args = parser.parse_args()
+    rows = parse_size(args.rows)
+    create_db(args.path, rows, args.body_chars)
+    print(f"Created {args.path} with {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""
+温めておいたブラウザを貸し出すローカルサービス
+
+Chromium の起動はスクレイピングや X 投稿の実行時間の大きな割合を占める。このサービスは
+プロファイル（scrape / x）ごとに Chromium を起動したまま待機させ、
+ローカルの Unix ソケット経由で CDP の接続先を貸し出す。借りた側は connect_over_cdp で繋ぎ、
+終わったら開いたページ数を添えて返却する。1つのブラウザは同時に1人にしか貸さない。
+
+ページ数が BROWSER_MAX_PAGES を超えたか、ブラウザのプロセスツリー全体のメモリ（/proc から読む RSS）が
+BROWSER_MAX_RSS_MB を超えたブラウザは返却時に終了し、代わりを起動し直す。
+
+    python browser_service.py serve --pool-size 2
+    python browser_service.py status
+
+スクレイパー・投稿側は browser_lease() を使う。サービスが動いていなければ（ソケットがなければ）
+従来どおりその場で Chromium を起動する。
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BROWSER_SERVICE = os.getenv("BROWSER_SERVICE", "1") != "0"
+BROWSER_SERVICE_SOCKET = os.getenv("BROWSER_SERVICE_SOCKET", "browser_service.sock")
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+BROWSER_MAX_RSS_MB = float(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+# 貸し出し待ちの上限（秒）。超えたら借りる側はその場で起動する
+BROWSER_LEASE_TIMEOUT = float(os.getenv("BROWSER_LEASE_TIMEOUT", "60"))
+
+# スクレイピング用の起動オプション（自動操作の痕跡を減らす）
+STEALTH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-infobars',
+    '--disable-dev-shm-usage',
+    '--disable-extensions',
+    '--disable-gpu'
+]
+
+# プロファイルごとの起動設定
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "scrape": {"headless": True, "args": STEALTH_ARGS + ["--lang=ja-JP"], "env": {"TZ": "Asia/Tokyo"}},
+    "x": {"headless": os.getenv("X_HEADLESS", "1") != "0", "args": ["--lang=ja-JP"], "env": {}},
+}
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================================
+# メモリ使用量（/proc）
+# ==========================================
+def process_tree_rss_mb(root_pid: int) -> float:
+    """root_pid とその子孫プロセス（レンダラーなど）の RSS の合計（MB）。/proc がなければ 0"""
+    if not os.path.isdir("/proc"):
+        return 0.0
+    children: Dict[int, List[int]] = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", encoding="utf-8") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # comm に空白や括弧が入ることがあるので、最後の ')' の後ろから読む
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(name))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            with open(f"/proc/{pid}/statm", encoding="utf-8") as f:
+                total += int(f.read().split()[1]) * page_size
+        except OSError:
+            pass
+        stack.extend(children.get(pid, ()))
+    return total / (1024 * 1024)
+
+
+# ==========================================
+# サービス本体
+# ==========================================
+@dataclass
+class WarmBrowser:
+    id: int
+    profile: str
+    process: asyncio.subprocess.Process
+    endpoint: str
+    user_data_dir: str
+    started_at: float = field(default_factory=time.time)
+    pages: int = 0
+    leases: int = 0
+    leased: bool = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    def rss_mb(self) -> float:
+        return process_tree_rss_mb(self.process.pid)
+
+
+class BrowserPool:
+    def __init__(self, executable: str, pool_size: int = BROWSER_POOL_SIZE,
+                 max_pages: int = BROWSER_MAX_PAGES, max_rss_mb: float = BROWSER_MAX_RSS_MB):
+        self.executable = executable
+        self.pool_size = max(1, pool_size)
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.browsers: Dict[str, List[WarmBrowser]] = {name: [] for name in PROFILES}
+        self._changed = asyncio.Condition()
+        self._ids = itertools.count(1)
+        self._launching: Dict[str, int] = {name: 0 for name in PROFILES}
+
+    async def _launch(self, profile: str) -> WarmBrowser:
+        settings = PROFILES[profile]
+        user_data_dir = tempfile.mkdtemp(prefix=f"warm_{profile}_")
+        args = [
+            self.executable,
+            "--remote-debugging-address=127.0.0.1",
+            "--remote-debugging-port=0",
+            f"--user-data-dir={user_data_dir}",
+            # Playwright の launch() と同じくサンドボックスは使わない（root で動かす CI 向け）
+            "--no-sandbox",
+            "--no-first-run",
+            "--no-default-browser-check",
+            *settings["args"],
+        ]
+        if settings["headless"]:
+            args.append("--headless=new")
+        args.append("about:blank")
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, **settings["env"]},
+        )
+        # 起動したブラウザは "DevTools listening on ws://..." を標準エラーに出す
+        endpoint = None
+        while endpoint is None:
+            line = await asyncio.wait_for(process.stderr.readline(), timeout=30)
+            if not line:
+                raise RuntimeError(f"Chromium exited while starting (profile={profile})")
+            text = line.decode("utf-8", "replace").strip()
+            if text.startswith("DevTools listening on "):
+                endpoint = text[len("DevTools listening on "):]
+        # 残りの出力を読み捨てる（パイプが詰まるとブラウザが止まる）
+        asyncio.get_running_loop().create_task(self._drain(process))
+
+        browser = WarmBrowser(next(self._ids), profile, process, endpoint, user_data_dir)
+        logger.info(f"Launched {profile} browser #{browser.id} (pid {process.pid})")
+        return browser
+
+    @staticmethod
+    async def _drain(process):
+        while await process.stderr.readline():
+            pass
+
+    async def _stop(self, browser: WarmBrowser, reason: str):
+        logger.info(f"Recycling {browser.profile} browser #{browser.id}: {reason} "
+                    f"({browser.pages} pages, {browser.leases} leases)")
+        if browser.alive:
+            browser.process.terminate()
+            try:
+                await asyncio.wait_for(browser.process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                browser.process.kill()
+                await browser.process.wait()
+        shutil.rmtree(browser.user_data_dir, ignore_errors=True)
+
+    async def warm_up(self, profiles: List[str]):
+        """起動時に各プロファイルのブラウザを pool_size 個ずつ用意する"""
+        for profile in profiles:
+            for _ in range(self.pool_size):
+                self.browsers[profile].append(await self._launch(profile))
+
+    async def lease(self, profile: str) -> WarmBrowser:
+        """空いているブラウザを貸し出す（なければ起動するか、返却を待つ）"""
+        if profile not in PROFILES:
+            raise ValueError(f"unknown profile '{profile}'")
+        async with self._changed:
+            while True:
+                pool = self.browsers[profile]
+                for browser in list(pool):
+                    if not browser.alive:
+                        pool.remove(browser)
+                        await self._stop(browser, "process exited")
+                        continue
+                    if not browser.leased:
+                        browser.leased = True
+                        browser.leases += 1
+                        return browser
+                if len(pool) + self._launching[profile] < self.pool_size:
+                    break
+                await self._changed.wait()
+            self._launching[profile] += 1
+        try:
+            browser = await self._launch(profile)
+        except BaseException:
+            async with self._changed:
+                self._launching[profile] -= 1
+                self._changed.notify_all()
+            raise
+        browser.leased = True
+        browser.leases += 1
+        async with self._changed:
+            self._launching[profile] -= 1
+            self.browsers[profile].append(browser)
+        return browser
+
+    async def release(self, browser: WarmBrowser, pages: Optional[int]):
+        """返却。上限を超えたブラウザ（状態の分からない返却も）は作り直す"""
+        reason = None
+        if pages is None:
+            reason = "client disconnected without releasing"
+        else:
+            browser.pages += pages
+            if browser.pages >= self.max_pages:
+                reason = f"page limit ({self.max_pages})"
+            else:
+                rss = browser.rss_mb()
+                if rss >= self.max_rss_mb:
+                    reason = f"memory {rss:.0f} MB >= {self.max_rss_mb:.0f} MB"
+        if reason:
+            profile = browser.profile
+            async with self._changed:
+                self.browsers[profile].remove(browser)
+                self._launching[profile] += 1
+            replacement = None
+            try:
+                await self._stop(browser, reason)
+                replacement = await self._launch(profile)
+            except Exception as e:
+                # 代わりを用意できなくても返却は終わらせる（次の lease() がその場で起動する）
+                logger.error(f"Failed to relaunch a '{profile}' browser: {e}")
+            finally:
+                async with self._changed:
+                    self._launching[profile] -= 1
+                    if replacement is not None:
+                        self.browsers[profile].append(replacement)
+                    self._changed.notify_all()
+            return
+        async with self._changed:
+            browser.leased = False
+            self._changed.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            profile: [
+                {
+                    "id": b.id,
+                    "pid": b.process.pid,
+                    "leased": b.leased,
+                    "pages": b.pages,
+                    "leases": b.leases,
+                    "rss_mb": round(b.rss_mb(), 1),
+                    "uptime_s": round(time.time() - b.started_at),
+                }
+                for b in browsers
+            ]
+            for profile, browsers in self.browsers.items()
+        }
+
+    async def close(self):
+        for browsers in self.browsers.values():
+            for browser in browsers:
+                await self._stop(browser, "service stopped")
+            browsers.clear()
+
+
+async def _handle_client(pool: BrowserPool, reader, writer):
+    """1接続 = 1回の貸し出し。返却の前に接続が切れたら、そのブラウザは作り直す"""
+    browser = None
+    pages = None
+    try:
+        request = json.loads(await reader.readline() or b"{}")
+        op = request.get("op")
+        if op == "status":
+            writer.write(json.dumps(pool.status()).encode() + b"\n")
+            await writer.drain()
+            return
+        if op != "lease":
+            raise ValueError(f"unknown op '{op}'")
+        browser = await pool.lease(request.get("profile", "scrape"))
+        writer.write(json.dumps({"endpoint": browser.endpoint, "id": browser.id}).encode() + b"\n")
+        await writer.drain()
+
+        line = await reader.readline()
+        if line:
+            pages = int(json.loads(line).get("pages", 0))
+    except Exception as e:
+        logger.warning(f"Client error: {e}")
+        try:
+            writer.write(json.dumps({"error": str(e)}).encode() + b"\n")
+            await writer.drain()
+        except (ConnectionError, RuntimeError):
+            pass
+    finally:
+        try:
+            if browser is not None:
+                await pool.release(browser, pages)
+        finally:
+            writer.close()
+
+
+async def serve(socket_path: str = BROWSER_SERVICE_SOCKET, pool_size: int = BROWSER_POOL_SIZE,
+                profiles: Optional[List[str]] = None):
+    from playwright.async_api import async_playwright
+
+    # Playwright が管理している Chromium を使う（BROWSER_EXECUTABLE で変更可）
+    executable = os.getenv("BROWSER_EXECUTABLE")
+    if not executable:
+        async with async_playwright() as p:
+            executable = p.chromium.executable_path
+
+    pool = BrowserPool(executable, pool_size=pool_size)
+    await pool.warm_up(profiles or ["scrape"])
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(lambda r, w: _handle_client(pool, r, w), path=socket_path)
+    logger.info(f"Browser service listening on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await pool.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# ==========================================
+# 借りる側
+# ==========================================
+class BrowserLease:
+    """借りたブラウザ（またはその場で起動したブラウザ）と、そこで開いたページ数"""
+
+    def __init__(self, browser, warm: bool):
+        self.browser = browser
+        self.warm = warm
+        self.pages = 0
+        self.contexts = []
+
+    def _count_page(self, page):
+        self.pages += 1
+
+    async def new_context(self, **kwargs):
+        context = await self.browser.new_context(**kwargs)
+        context.on("page", self._count_page)
+        self.contexts.append(context)
+        return context
+
+    def new_context_sync(self, **kwargs):
+        context = self.browser.new_context(**kwargs)
+        context.on("page", self._count_page)
+        self.contexts.append(context)
+        return context
+
+
+def _service_available(profile: Optional[str]) -> bool:
+    return BROWSER_SERVICE and profile is not None and os.path.exists(BROWSER_SERVICE_SOCKET)
+
+
+@asynccontextmanager
+async def browser_lease(playwright, profile: Optional[str], launch: Callable[[], Awaitable[Any]]):
+    """サービスからブラウザを借りる（async API 用）
+
+    サービスが使えなければ launch() で起動したブラウザを使い、抜けるときに閉じる。
+    借りたブラウザでは、このリースで作ったコンテキストだけを閉じて接続を切る。
+    """
+    connection = None
+    endpoint = None
+    if _service_available(profile):
+        try:
+            connection = await asyncio.wait_for(asyncio.open_unix_connection(BROWSER_SERVICE_SOCKET), timeout=5)
+            reader, writer = connection
+            writer.write(json.dumps({"op": "lease", "profile": profile}).encode() + b"\n")
+            await writer.drain()
+            reply = json.loads(await asyncio.wait_for(reader.readline(), timeout=BROWSER_LEASE_TIMEOUT) or b"{}")
+            endpoint = reply.get("endpoint")
+            if not endpoint:
+                raise RuntimeError(reply.get("error", "no endpoint"))
+        except (OSError, asyncio.TimeoutError, RuntimeError, ValueError) as e:
+            logger.warning(f"Browser service unavailable ({e}). Launching a local browser.")
+            if connection:
+                connection[1].close()
+            connection = None
+
+    if connection is None:
+        lease = BrowserLease(await launch(), warm=False)
+        try:
+            yield lease
+        finally:
+            await lease.browser.close()
+        return
+
+    reader, writer = connection
+    started = time.perf_counter()
+    try:
+        browser = await playwright.chromium.connect_over_cdp(endpoint)
+    except Exception:
+        # 返却せずに切断すると、サービス側はそのブラウザを作り直す
+        writer.close()
+        raise
+    lease = BrowserLease(browser, warm=True)
+    logger.info(f"Connected to a warm {profile} browser in {time.perf_counter() - started:.2f}s")
+    try:
+        yield lease
+    finally:
+        try:
+            for context in lease.contexts:
+                await context.close()
+            await lease.browser.close()
+        finally:
+            writer.write(json.dumps({"op": "release", "pages": lease.pages}).encode() + b"\n")
+            await writer.drain()
+            writer.close()
+
+
+@contextmanager
+def browser_lease_sync(playwright, profile: Optional[str], launch: Callable[[], Any]):
+    """browser_lease() の sync API 版"""
+    sock = None
+    endpoint = None
+    if _service_available(profile):
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(BROWSER_LEASE_TIMEOUT)
+            sock.connect(BROWSER_SERVICE_SOCKET)
+            sock.sendall(json.dumps({"op": "lease", "profile": profile}).encode() + b"\n")
+            reply = json.loads(sock.makefile("rb").readline() or b"{}")
+            endpoint = reply.get("endpoint")
+            if not endpoint:
+                raise RuntimeError(reply.get("error", "no endpoint"))
+        except (OSError, RuntimeError, ValueError) as e:
+            logger.warning(f"Browser service unavailable ({e}). Launching a local browser.")
+            if sock:
+                sock.close()
+            sock = None
+
+    if sock is None:
+        lease = BrowserLease(launch(), warm=False)
+        try:
+            yield lease
+        finally:
+            lease.browser.close()
+        return
+
+    try:
+        browser = playwright.chromium.connect_over_cdp(endpoint)
+    except Exception:
+        sock.close()
+        raise
+    lease = BrowserLease(browser, warm=True)
+    try:
+        yield lease
+    finally:
+        try:
+            for context in lease.contexts:
+                context.close()
+            lease.browser.close()
+        finally:
+            sock.sendall(json.dumps({"op": "release", "pages": lease.pages}).encode() + b"\n")
+            sock.close()
+
+
+def service_status(socket_path: str = BROWSER_SERVICE_SOCKET) -> Dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(10)
+        sock.connect(socket_path)
+        sock.sendall(b'{"op": "status"}\n')
+        return json.loads(sock.makefile("rb").readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="温めたブラウザを貸し出すローカルサービス")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="サービスを起動する")
+    serve_parser.add_argument("--socket", default=BROWSER_SERVICE_SOCKET)
+    serve_parser.add_argument("--pool-size", type=int, default=BROWSER_POOL_SIZE, help="プロファイルごとのブラウザ数")
+    serve_parser.add_argument("--profiles", default="scrape,x", help=f"起動時に用意するプロファイル ({', '.join(PROFILES)})")
+    status_parser = sub.add_parser("status", help="貸し出し状況を表示する")
+    status_parser.add_argument("--socket", default=BROWSER_SERVICE_SOCKET)
+    args = parser.parse_args()
+
+    from utils.log_setup import setup_logging
+    setup_logging("browser_service")
+    if args.command == "serve":
+        profiles = [name.strip() for name in args.profiles.split(",") if name.strip()]
+        for name in profiles:
+            if name not in PROFILES:
+                parser.error(f"unknown profile '{name}'")
+        try:
+            asyncio.run(serve(args.socket, args.pool_size, profiles))
+        except KeyboardInterrupt:
+            pass
+    else:
+        for profile, browsers in service_status(args.socket).items():
+            for b in browsers:
+                state = "leased" if b["leased"] else "idle"
+                print(f"{profile:<8} #{b['id']:<3} pid {b['pid']:<7} {state:<6} {b['pages']:>5} pages "
+                      f"{b['leases']:>4} leases {b['rss_mb']:>8.1f} MB  up {b['uptime_s']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,11 @@ import os
 import sqlite3
 import logging
 import hashlib
-import google.generativeai as genai
+import time
 from dotenv import load_dotenv
+import generation_metrics
+from utils import metrics, run_context, tracing
+from utils.keyword_index import KeywordIndex, DEFAULT_THRESHOLD
 
 # ==========================================
 # 設定 & セットアップ
@@ -11,69 +14,158 @@ from dotenv import load_dotenv
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set in .env")
-
-genai.configure(api_key=GEMINI_API_KEY)
 
 # 安定版の最新モデルを指定
-model = genai.GenerativeModel("gemini-flash-latest")
+GEMINI_MODEL_NAME = "gemini-flash-latest"
 
 DB_PATH = "seo_content.db"
 SITE_BASE_URL = os.getenv("SITE_BASE_URL", "https://techino35.github.io/ai-tools-db")
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# 既存記事とほぼ同じキーワードの扱い: skip=生成しない / merge=既存記事を再生成 / off=チェックしない
+DEDUPE_MODE = os.getenv("DEDUPE_MODE", "skip")
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", str(DEFAULT_THRESHOLD)))
+
+# レート制限・一時的なエラーのときに再試行する回数と、最初の待ち時間（秒。再試行ごとに倍）
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BACKOFF = float(os.getenv("GEMINI_RETRY_BACKOFF", "5"))
+# 再試行する例外（google.api_core.exceptions の型で判定する。メッセージの文字列は見ない）
+RETRYABLE_ERRORS = ("ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded")
+
+ARTICLES = metrics.counter("seo_articles_total", "記事生成の結果（result: created / updated / failed / duplicate）", ("category", "result"))
+GEMINI_TOKENS = metrics.counter("seo_gemini_tokens_total", "Gemini のトークン数（kind: prompt / output）", ("kind",))
+
 logger = logging.getLogger(__name__)
 
+_model = None
+
+class GenerationError(Exception):
+    """記事を生成・保存できなかった（重複で生成しなかった場合とは区別する）"""
+
+def get_model():
+    """Geminiクライアントを初回利用時に初期化する（import時には読み込まない）"""
+    global _model
+    if _model is None:
+        if not GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY is not set in .env")
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _model
+
 class ContentGenerator:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, dedupe_mode: str = DEDUPE_MODE, model=None):
+        """model を渡すとそれを使う（generate_content(prompt) を持つもの。省略時はGemini）"""
         self.db_path = db_path
+        self.dedupe_mode = dedupe_mode
+        self.model = model
+        self._keyword_index = None
 
     def _get_connection(self):
-        return sqlite3.connect(self.db_path)
+        # seo_pipeline.generate_and_export では書き出しスレッドと同時にDBを使う
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _get_keyword_index(self) -> KeywordIndex:
+        """既存記事の類似度インデックス（初回のみDBから構築）"""
+        if self._keyword_index is None:
+            # 比較対象はキーワード指定で生成した記事だけ（ツール紹介記事は商品名だけのタイトルで誤一致しやすい）
+            self._keyword_index = KeywordIndex.from_db(
+                self.db_path, threshold=DEDUPE_THRESHOLD, url_prefix=f"{SITE_BASE_URL}/keyword/"
+            )
+            logger.info(f"Keyword index loaded: {len(self._keyword_index)} articles")
+        return self._keyword_index
 
-    def _generate_text_with_gemini(self, prompt: str) -> str:
-        """Gemini APIを呼び出してテキストを生成"""
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
         try:
-            response = model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            logger.error(f"Gemini API Error: {e}")
-            return ""
+            from google.api_core import exceptions
+        except ImportError:
+            return False
+        return isinstance(error, tuple(getattr(exceptions, name) for name in RETRYABLE_ERRORS))
+
+    def _generate_text_with_gemini(self, prompt: str, url: str = None, keyword: str = None, category: str = None) -> str:
+        """Gemini APIを呼び出してテキストを生成（呼び出しごとに generation_metrics へ記録する）"""
+        model = self.model or get_model()
+        call = generation_metrics.GenerationCall(
+            url=url, keyword=keyword, category=category,
+            model=GEMINI_MODEL_NAME if self.model is None else type(self.model).__name__,
+        )
+        text = ""
+        started = time.perf_counter()
+        with tracing.span("gemini.generate", prompt_chars=len(prompt)) as sp, run_context.bind(stage="generate", url=url):
+            while True:
+                try:
+                    response = model.generate_content(prompt)
+                    call.set_usage(response)
+                    # ブロックされた応答では text が例外になる（finish_reason は記録済み）
+                    text = response.text
+                    call.error = None
+                    break
+                except Exception as e:
+                    call.error = f"{type(e).__name__}: {e}"[:500]
+                    if call.retries < GEMINI_MAX_RETRIES and self._is_retryable(e):
+                        wait = GEMINI_RETRY_BACKOFF * 2 ** call.retries
+                        call.retries += 1
+                        logger.warning(f"Gemini throttled ({type(e).__name__}). Retry {call.retries}/{GEMINI_MAX_RETRIES} in {wait:.0f}s...")
+                        time.sleep(wait)
+                        continue
+                    logger.error(f"Gemini API Error: {e}")
+                    sp.set(error=type(e).__name__)
+                    break
+            call.latency_ms = (time.perf_counter() - started) * 1000
+            sp.set(prompt_tokens=call.prompt_tokens, output_tokens=call.output_tokens, retries=call.retries,
+                   finish_reason=call.finish_reason, chars=len(text))
+        GEMINI_TOKENS.inc(call.prompt_tokens or 0, kind="prompt")
+        GEMINI_TOKENS.inc(call.output_tokens or 0, kind="output")
+
+        try:
+            generation_metrics.record(self.db_path, call)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to record generation metrics: {e}")
+        return text
 
-    def _save_article(self, url: str, title: str, body: str, category: str):
-        """生成された記事をDBに保存"""
+    def _save_article(self, url: str, title: str, body: str, category: str) -> bool:
+        """生成された記事をDBに保存（保存できたら True）"""
         conn = self._get_connection()
         cursor = conn.cursor()
         try:
-            # 【修正箇所】id ではなく url をチェックする
-            cursor.execute("SELECT url FROM products WHERE url = ?", (url,))
-            row = cursor.fetchone()
+            with tracing.span("db.write", table="products", url=url), run_context.bind(url=url):
+                # 【修正箇所】id ではなく url をチェックする
+                cursor.execute("SELECT url FROM products WHERE url = ?", (url,))
+                row = cursor.fetchone()
 
-            if row:
-                # 更新
-                cursor.execute("""
-                    UPDATE products 
-                    SET generated_body = ?, title = ?, category = ? 
-                    WHERE url = ?
-                """, (body, title, category, url))
-                logger.info(f"Updated article: {title}")
-            else:
-                # 新規作成（テーブル定義に合わせてカラムを指定）
-                cursor.execute("""
-                    INSERT INTO products (url, title, generated_body, category, scraped_at)
-                    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-                """, (url, title, body, category))
-                logger.info(f"Created new article: {title}")
+                if row:
+                    # 更新
+                    cursor.execute("""
+                        UPDATE products 
+                        SET generated_body = ?, title = ?, category = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE url = ?
+                    """, (body, title, category, url))
+                    logger.info(f"Updated article: {title}")
+                    result = "updated"
+                else:
+                    # 新規作成（テーブル定義に合わせてカラムを指定）
+                    cursor.execute("""
+                        INSERT INTO products (url, title, generated_body, category, scraped_at)
+                        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                    """, (url, title, body, category))
+                    logger.info(f"Created new article: {title}")
+                    result = "created"
             
-            conn.commit()
+                conn.commit()
+            ARTICLES.inc(category=category, result=result)
+            return True
         except Exception as e:
             logger.error(f"DB Save Error: {e}")
+            ARTICLES.inc(category=category, result="failed")
+            return False
         finally:
             conn.close()
 
     def generate_article(self, target_keyword: str = None):
-        """記事生成メイン処理"""
+        """記事生成メイン処理（保存した記事のURLを返す。重複で生成しなかった場合は None）
+
+        キーワード指定で生成・保存に失敗したときは GenerationError を投げる。
+        """
         
         # 指名生産モード
         if target_keyword:
@@ -86,6 +178,19 @@ class ContentGenerator:
             url_hash = hashlib.md5(target_keyword.encode()).hexdigest()
             dummy_url = f"{SITE_BASE_URL}/keyword/{url_hash}.html"
 
+            # 既存記事との重複チェック（Gemini呼び出し前）
+            if self.dedupe_mode != "off":
+                match = self._get_keyword_index().find_duplicate(target_keyword)
+                # 同じキーワードの再実行は従来どおり作り直して上書きする
+                if match and match.key != dummy_url:
+                    if self.dedupe_mode == "merge":
+                        logger.info(f"Near-duplicate of '{match.label}' (score={match.score:.2f}). Merging into existing article.")
+                        dummy_url, title = match.key, match.label
+                    else:
+                        logger.info(f"Near-duplicate of '{match.label}' (score={match.score:.2f}). Skipped.")
+                        ARTICLES.inc(category=category, result="duplicate")
+                        return None
+
             prompt = f"""
             あなたはプロのテックライターです。以下のテーマについて、Markdown形式でブログ記事を書いてください。
             
@@ -102,11 +207,16 @@ class ContentGenerator:
             """
             
             logger.info("Generating content via Gemini...")
-            generated_body = self._generate_text_with_gemini(prompt)
+            generated_body = self._generate_text_with_gemini(prompt, url=dummy_url, keyword=target_keyword, category=category)
             
-            if generated_body:
-                self._save_article(dummy_url, title, generated_body, category)
-            return
+            if not generated_body:
+                ARTICLES.inc(category=category, result="failed")
+                raise GenerationError(f"Gemini returned no content for '{target_keyword}'")
+            if not self._save_article(dummy_url, title, generated_body, category):
+                raise GenerationError(f"Failed to save the article for '{target_keyword}'")
+            if self._keyword_index is not None:
+                self._keyword_index.add(dummy_url, title)
+            return dummy_url
 
         # 在庫処理モード（今回は使いませんが残しておきます）
         conn = self._get_connection()
@@ -119,7 +229,7 @@ class ContentGenerator:
                 current_url = row['url']
                 current_title = row['title']
                 prompt = f"トピック: {current_title} について解説記事を書いてください。"
-                generated_body = self._generate_text_with_gemini(prompt)
+                generated_body = self._generate_text_with_gemini(prompt, url=current_url, category="Uncategorized")
                 if generated_body:
                     self._save_article(current_url, current_title, generated_body, "Uncategorized")
         except Exception as e:
@@ -128,4 +238,6 @@ class ContentGenerator:
             conn.close()
 
 if __name__ == "__main__":
+    from utils.log_setup import setup_logging
+    setup_logging("content_generator")
     generator = ContentGenerator(DB_PATH)
\ No newline at end of file
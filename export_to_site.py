@@ -1,109 +1,273 @@
 import sqlite3
 import os
+import json
+import hashlib
 import shutil
-import urllib.parse
+from dataclasses import dataclass
+
+import site_renderer
+from utils import metrics, tracing
+from search_shards import SEARCH_DIR, SearchShards
+from site_pages import ListingPages
 
 # 設定
 DB_PATH = "seo_content.db"
+# 記事生成と並行して書き出すとき、相手の書き込みが終わるのを待つ秒数
+SQLITE_TIMEOUT = 30
 DOCS_DIR = "docs"
 # 記事を格納するサブフォルダ（整理用）
 ARTICLES_DIR = os.path.join(DOCS_DIR, "articles")
+# 前回書き出した内容のハッシュ（MkDocsはドットファイルをビルド対象にしない）
+MANIFEST_PATH = os.path.join(DOCS_DIR, ".export_manifest.json")
+# サイト内検索の分割インデックスは、デプロイされる MkDocs の docs_dir（my_site/mkdocs.yml）に書く。
+# リンク先は docs_dir の中で記事ページを置いているフォルダ
+SITE_DOCS_DIR = os.getenv("SITE_DOCS_DIR", os.path.join("my_site", "docs"))
+SITE_ARTICLES_PATH = os.getenv("SITE_ARTICLES_PATH", "tools")
+# マニフェスト上で SITE_DOCS_DIR のファイルを区別する接頭辞
+SITE_PREFIX = "site:"
+# DBから一度に読み出す件数と、レンダリングのワーカープロセス数（1なら直列）
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(os.cpu_count() or 1)))
+# 記事末尾にアフィリエイト枠を入れるか（utils/affiliate_manager のカタログで照合）
+EXPORT_AFFILIATE = os.getenv("EXPORT_AFFILIATE", "0") == "1"
+
+FILES = metrics.counter("seo_export_files_total", "書き出し対象のファイル（result: written / unchanged / deleted）", ("result",))
+
+@dataclass
+class ExportReport:
+    written: int = 0
+    unchanged: int = 0
+    deleted: int = 0
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH)
+    return sqlite3.connect(DB_PATH, timeout=SQLITE_TIMEOUT)
 
 def init_docs_structure():
     """フォルダ構造の初期化"""
     os.makedirs(ARTICLES_DIR, exist_ok=True)
 
+def load_manifest():
+    """{DOCS_DIRからの相対パス: 内容のsha256} と一覧ページの署名を読み込む"""
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        return data.get("files", {}), data.get("pages", {})
+    except (FileNotFoundError, ValueError):
+        return {}, {}
+
+def save_manifest(manifest, pages):
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": manifest, "pages": pages}, f, ensure_ascii=False, sort_keys=True, indent=0)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def output_path(rel_path):
+    """マニフェストの相対パスから実際のパス（site: で始まるものは SITE_DOCS_DIR から）"""
+    if rel_path.startswith(SITE_PREFIX):
+        return os.path.join(SITE_DOCS_DIR, rel_path[len(SITE_PREFIX):])
+    return os.path.join(DOCS_DIR, rel_path)
+
+def list_existing_files():
+    """書き出し先に今あるファイル（相対パス）の集合。1ファイルずつstatしないで済むようにする"""
+    existing = set()
+    for root, _dirs, files in os.walk(DOCS_DIR):
+        rel_root = os.path.relpath(root, DOCS_DIR)
+        for name in files:
+            existing.add(name if rel_root == "." else os.path.join(rel_root, name))
+    search_root = os.path.join(SITE_DOCS_DIR, SEARCH_DIR)
+    for root, _dirs, files in os.walk(search_root):
+        rel_root = os.path.relpath(root, SITE_DOCS_DIR)
+        for name in files:
+            existing.add(SITE_PREFIX + os.path.join(rel_root, name))
+    return existing
+
+def write_if_changed(rel_path, content, manifest, existing, report, digest=None):
+    """内容が前回と同じならファイルに触らない（mtimeを変えない）"""
+    if digest is None:
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if manifest.get(rel_path) == digest and rel_path in existing:
+        report.unchanged += 1
+        return False
+    path = output_path(rel_path)
+    with tracing.span("export.file", path=rel_path, chars=len(content)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    manifest[rel_path] = digest
+    report.written += 1
+    return True
+
+def remove_orphans(manifest, produced, existing, report):
+    """前回書き出したが今回は生成されなかったファイルを削除する"""
+    for rel_path in [p for p in manifest if p not in produced]:
+        if rel_path in existing:
+            os.remove(output_path(rel_path))
+            print(f"Deleted: {rel_path}")
+        del manifest[rel_path]
+        report.deleted += 1
+
 def create_search_buttons_md(title):
     """記事末尾の検索ボタンMarkdownを作成"""
-    encoded_title = urllib.parse.quote(title)
-    amazon_url = f"https://www.amazon.co.jp/s?k={encoded_title}"
-    rakuten_url = f"https://search.rakuten.co.jp/search/mall/{encoded_title}"
-    yahoo_url = f"https://shopping.yahoo.co.jp/search?p={encoded_title}"
-
-    return f"""
-## 🛍️ この商品をさがす
-<div class="grid cards" markdown>
--   [:material-cart: Amazonで探す]({amazon_url})
--   [:material-store: 楽天市場で探す]({rakuten_url})
--   [:material-shopping: Yahoo!で探す]({yahoo_url})
-</div>
-"""
-
-def update_index_page(articles):
-    """トップページ(index.md)に新着記事リストを書き込む"""
-    index_path = os.path.join(DOCS_DIR, "index.md")
-    
-    # トップページの固定ヘッダー部分
-    header = """# AI Tools & Gadget DB
-ようこそ。ここはAIによって自動生成されたガジェット・ツール情報データベースです。
-
-## 🆕 新着記事一覧
-"""
-    
-    with open(index_path, "w", encoding="utf-8") as f:
-        f.write(header)
-        
-        # 新しい順にリンクを書き込む
-        # articles は (filename, title, category) のリスト想定
-        for filename, title, category in articles:
-            # リンク先は articles/filename
-            link = f"articles/{filename}"
-            f.write(f"- [{title}]({link}) <small>({category})</small>\n")
-
-def export_article_to_markdown():
-    """DBから記事を読み出し、MDファイル生成 ＆ index.md更新"""
-    init_docs_structure()
+    return site_renderer.render("search_buttons.md.j2", title=title)
+
+def article_filename(url):
+    """記事URLから書き出しファイル名を決める"""
+    # ファイル名をURLハッシュやIDから決定（なければタイトルから適当に）
+    # ここでは簡易的にurlのハッシュ値の一部を使うか、既存ロジックに合わせる
+    # DBにurlがある前提
+    url_hash = url.split("/")[-1].replace(".html", "")
+    if not url_hash:
+        # 万が一ハッシュがない場合のバックアップ
+        url_hash = hashlib.md5(url.encode()).hexdigest()
+    return f"{url_hash}.md"
+
+def render_article(row):
+    """1記事分のMarkdownを組み立てる（ワーカープロセスからも呼ばれる純粋関数）
+
+    row は (url, title, generated_body, category)。
+    (filename, title, category, 本文, sha256) を返す。
+    """
+    url, title, body, category = row
+    filename = article_filename(url)
+
+    affiliate_html = None
+    if EXPORT_AFFILIATE:
+        # マッチャーはプロセスごとに一度だけ構築される
+        from utils.affiliate_manager import get_affiliate_html
+        affiliate_html = get_affiliate_html(title)
+
+    # 本文 + アフィリエイト枠 + 検索ボタン（templates/article.md.j2）
+    full_content = site_renderer.render("article.md.j2", title=title, body=body, affiliate_html=affiliate_html)
+    digest = hashlib.sha256(full_content.encode("utf-8")).hexdigest()
+    return filename, title, category, full_content, digest
+
+def iter_article_chunks(conn, chunk_size=EXPORT_CHUNK_SIZE):
+    """本文のある記事を新しい順に chunk_size 件ずつ読み出す（全件をメモリに載せない）"""
+    cursor = conn.execute("""
+        SELECT url, title, generated_body, category
+        FROM products
+        WHERE generated_body IS NOT NULL AND generated_body != ''
+        ORDER BY scraped_at DESC
+    """)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+class SiteExport:
+    """1回の書き出しの状態（マニフェスト・既存ファイル・集計）をまとめて持つ"""
+
+    def __init__(self):
+        init_docs_structure()
+        self.manifest, self.page_state = load_manifest()
+        self.existing = list_existing_files()
+        self.report = ExportReport()
+        self.produced = set()
+
+    def write_articles(self, rendered):
+        for filename, title, category, full_content, digest in rendered:
+            rel_path = f"articles/{filename}"
+            if write_if_changed(rel_path, full_content, self.manifest, self.existing, self.report, digest=digest):
+                print(f"Exported: {filename}")
+            self.produced.add(rel_path)
+
+    def write_page(self, rel_path, content):
+        if write_if_changed(rel_path, content, self.manifest, self.existing, self.report):
+            print(f"Updated page: {rel_path}")
+
+    def update_pages(self, conn):
+        """トップページ・一覧ページと検索インデックスを更新する（影響のあるページだけ）"""
+        with tracing.span("export.pages"):
+            listing = ListingPages(conn, article_filename, self.write_page, self.existing.__contains__)
+            self.produced |= listing.update(self.page_state)
+
+        # サイト内検索の分割インデックス（変わった記事のシャードだけ）
+        with tracing.span("export.search_index"):
+            search = SearchShards(
+                conn, article_filename,
+                lambda rel_path, content: self.write_page(SITE_PREFIX + rel_path, content),
+                lambda rel_path: SITE_PREFIX + rel_path in self.existing,
+                article_path=SITE_ARTICLES_PATH,
+            )
+            self.produced |= {SITE_PREFIX + rel_path for rel_path in search.update()}
+
+    def finish(self, remove_stale=True):
+        """remove_stale が False のとき（一部の記事だけ書き出した場合）は削除を行わない"""
+        if remove_stale:
+            remove_orphans(self.manifest, self.produced, self.existing, self.report)
+        save_manifest(self.manifest, self.page_state)
+        report = self.report
+        FILES.inc(report.written, result="written")
+        FILES.inc(report.unchanged, result="unchanged")
+        FILES.inc(report.deleted, result="deleted")
+        print(f"📦 Export finished: {report.written} written, {report.unchanged} unchanged, {report.deleted} deleted")
+        return report
+
+def export_article_to_markdown(workers=EXPORT_WORKERS):
+    """DBから記事を読み出し、変更のあったMDファイルだけ書き出し ＆ 一覧ページ更新
+
+    workers > 1 のときは記事のレンダリングをプロセスプールで並列化する。
+    出力は workers=1（直列）のときとバイト単位で同じになる。
+    """
+    export = SiteExport()
     conn = get_db_connection()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT * FROM products ORDER BY scraped_at DESC")
-    rows = cursor.fetchall()
-
-    exported_articles = []
-
-    for row in rows:
-        title = row["title"]
-        body = row["generated_body"]
-        category = row["category"]
-        
-        # ファイル名をURLハッシュやIDから決定（なければタイトルから適当に）
-        # ここでは簡易的にurlのハッシュ値の一部を使うか、既存ロジックに合わせる
-        # DBにurlがある前提
-        url_hash = row["url"].split("/")[-1].replace(".html", "")
-        if not url_hash:
-             # 万が一ハッシュがない場合のバックアップ
-             import hashlib
-             url_hash = hashlib.md5(row["url"].encode()).hexdigest()
-             
-        filename = f"{url_hash}.md"
-        filepath = os.path.join(ARTICLES_DIR, filename)
-
-        # 本文がない場合はスキップ
-        if not body:
-            continue
-
-        # 検索ボタンを追加
-        search_buttons = create_search_buttons_md(title)
-        
-        full_content = f"# {title}\n\n{body}\n\n{search_buttons}"
-
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(full_content)
-        
-        print(f"Exported: {filename}")
-        exported_articles.append((filename, title, category))
-
-    # 最後にトップページを更新
-    update_index_page(exported_articles)
-    print("✅ index.md has been updated with new articles.")
-
-    conn.close()
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # 次のチャンクのレンダリングを投げてから、前のチャンクを書き込む
+        # （同時に抱えるのは最大2チャンク分なので、メモリは記事数に依存しない）
+        pending = None
+        for rows in iter_article_chunks(conn):
+            if executor:
+                rendered = executor.map(render_article, rows, chunksize=max(1, len(rows) // (workers * 4)))
+            else:
+                rendered = map(render_article, rows)
+            if pending is not None:
+                export.write_articles(pending)
+            pending = rendered
+        if pending is not None:
+            export.write_articles(pending)
+        # 最後にトップページ・一覧ページを更新
+        export.update_pages(conn)
+    finally:
+        if executor:
+            executor.shutdown()
+        conn.close()
+
+    return export.finish()
+
+def export_streaming(url_queue):
+    """キューから届いた記事URLを、届いた順にその場でレンダリングして書き出す
+
+    記事生成と並行して別スレッドで動かす。None が届いたら一覧ページ・検索インデックスを
+    更新して終わる。今回の記事以外は見ていないので、孤立ファイルの削除は行わない。
+    """
+    export = SiteExport()
+    conn = get_db_connection()
+    try:
+        while True:
+            url = url_queue.get()
+            if url is None:
+                break
+            row = conn.execute("""
+                SELECT url, title, generated_body, category
+                FROM products
+                WHERE url = ? AND generated_body IS NOT NULL AND generated_body != ''
+            """, (url,)).fetchone()
+            if row:
+                export.write_articles([render_article(row)])
+        export.update_pages(conn)
+    finally:
+        conn.close()
+
+    return export.finish(remove_stale=False)
 
 def main():
+    from utils.log_setup import setup_logging
+    setup_logging("export_to_site")
     export_article_to_markdown()
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+"""
+Gemini 呼び出しの記録（トークン数・待ち時間・リトライ・終了理由・概算コスト）
+
+ContentGenerator は Gemini を1回呼ぶたびに generation_metrics テーブルへ1行書く。
+行は記事の url で products と結びつき、run_id（utils.run_context.RUN_ID。ログの run_id と同じ）で
+実行ごとにまとまる。
+
+コストは usage_metadata のトークン数に 100万トークンあたりの単価を掛けた概算
+（GEMINI_INPUT_PRICE_PER_M / GEMINI_OUTPUT_PRICE_PER_M、米ドル）。請求額そのものではない。
+
+    python generation_metrics.py runs --last 10        # 実行ごとの合計と p50/p95 待ち時間
+    python generation_metrics.py categories --run <run_id>
+"""
+import argparse
+import os
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from utils.run_context import RUN_ID
+
+DB_PATH = "seo_content.db"
+# 100万トークンあたりの単価（米ドル）
+GEMINI_INPUT_PRICE_PER_M = float(os.getenv("GEMINI_INPUT_PRICE_PER_M", "0.30"))
+GEMINI_OUTPUT_PRICE_PER_M = float(os.getenv("GEMINI_OUTPUT_PRICE_PER_M", "2.50"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generation_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    url TEXT,
+    keyword TEXT,
+    category TEXT,
+    model TEXT,
+    prompt_tokens INTEGER,
+    output_tokens INTEGER,
+    total_tokens INTEGER,
+    latency_ms REAL,
+    retries INTEGER DEFAULT 0,
+    finish_reason TEXT,
+    cost_usd REAL,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_generation_metrics_run ON generation_metrics (run_id);
+CREATE INDEX IF NOT EXISTS idx_generation_metrics_url ON generation_metrics (url);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+@dataclass
+class GenerationCall:
+    """Gemini 呼び出し1回分（リトライを含む）"""
+    url: Optional[str] = None
+    keyword: Optional[str] = None
+    category: Optional[str] = None
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+    latency_ms: float = 0.0
+    retries: int = 0
+    finish_reason: Optional[str] = None
+    cost_usd: Optional[float] = None
+    error: Optional[str] = None
+    run_id: str = RUN_ID
+
+    def set_usage(self, response):
+        """レスポンスの usage_metadata と candidates[0].finish_reason を取り込み、コストを見積もる"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_token_count", None)
+            self.output_tokens = getattr(usage, "candidates_token_count", None)
+            self.total_tokens = getattr(usage, "total_token_count", None)
+            if self.total_tokens is None and self.prompt_tokens is not None:
+                self.total_tokens = self.prompt_tokens + (self.output_tokens or 0)
+        candidates = getattr(response, "candidates", None)
+        if candidates:
+            reason = getattr(candidates[0], "finish_reason", None)
+            # 本物のクライアントは列挙型を返す
+            self.finish_reason = getattr(reason, "name", None) or (str(reason) if reason is not None else None)
+        self.cost_usd = estimate_cost(self.prompt_tokens, self.output_tokens)
+
+
+def estimate_cost(prompt_tokens: Optional[int], output_tokens: Optional[int]) -> Optional[float]:
+    if prompt_tokens is None and output_tokens is None:
+        return None
+    return ((prompt_tokens or 0) * GEMINI_INPUT_PRICE_PER_M + (output_tokens or 0) * GEMINI_OUTPUT_PRICE_PER_M) / 1e6
+
+
+def ensure_table(conn: sqlite3.Connection):
+    conn.executescript(SCHEMA)
+
+
+def record(db_path: str, call: GenerationCall):
+    """1回分を generation_metrics に書く（テーブルはDBごとに初回だけ作る）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        if db_path not in _initialized:
+            with _init_lock:
+                ensure_table(conn)
+                _initialized.add(db_path)
+        values = asdict(call)
+        conn.execute(
+            f"INSERT INTO generation_metrics ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+            tuple(values.values()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ==========================================
+# 集計
+# ==========================================
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """最近接順位法のパーセンタイル（q は 0〜100）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))  # ceil
+    return ordered[int(rank) - 1]
+
+
+def _rollup(db_path: str, key: str, run_id: Optional[str] = None, last: Optional[int] = None) -> List[Dict[str, Any]]:
+    conn = sqlite3.connect(db_path)
+    try:
+        ensure_table(conn)
+        where, params = "", []
+        if run_id is not None:
+            where, params = "WHERE run_id = ?", [run_id]
+        elif last is not None:
+            where = "WHERE run_id IN (SELECT run_id FROM generation_metrics GROUP BY run_id ORDER BY MAX(id) DESC LIMIT ?)"
+            params = [last]
+        rows = conn.execute(f"""
+            SELECT {key}, latency_ms, retries, error, prompt_tokens, output_tokens, cost_usd, created_at
+            FROM generation_metrics {where} ORDER BY id
+        """, params).fetchall()
+    finally:
+        conn.close()
+
+    groups: Dict[Any, Dict[str, Any]] = {}
+    latencies: Dict[Any, List[float]] = {}
+    for group, latency_ms, retries, error, prompt_tokens, output_tokens, cost_usd, created_at in rows:
+        g = groups.setdefault(group, {
+            key: group, "calls": 0, "failed": 0, "retries": 0, "prompt_tokens": 0, "output_tokens": 0,
+            "cost_usd": 0.0, "started_at": created_at, "finished_at": created_at,
+        })
+        g["calls"] += 1
+        g["failed"] += 1 if error else 0
+        g["retries"] += retries or 0
+        g["prompt_tokens"] += prompt_tokens or 0
+        g["output_tokens"] += output_tokens or 0
+        g["cost_usd"] += cost_usd or 0.0
+        g["finished_at"] = created_at
+        latencies.setdefault(group, []).append(latency_ms or 0.0)
+    for group, g in groups.items():
+        g["p50_ms"] = percentile(latencies[group], 50)
+        g["p95_ms"] = percentile(latencies[group], 95)
+    return list(groups.values())
+
+
+def run_rollup(db_path: str = DB_PATH, run_id: Optional[str] = None, last: Optional[int] = None) -> List[Dict[str, Any]]:
+    """実行（run_id）ごとの呼び出し数・失敗・リトライ・トークン・コスト・p50/p95 待ち時間"""
+    return _rollup(db_path, "run_id", run_id, last)
+
+
+def category_rollup(db_path: str = DB_PATH, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """カテゴリごとの集計（run_id を指定するとその実行だけ）"""
+    return _rollup(db_path, "category", run_id)
+
+
+def _print_rollup(rows: List[Dict[str, Any]], key: str):
+    print(f"{key:<28} {'calls':>6} {'failed':>6} {'retries':>7} {'prompt':>9} {'output':>9} {'cost $':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(f"{str(row[key]):<28} {row['calls']:>6} {row['failed']:>6} {row['retries']:>7} {row['prompt_tokens']:>9} "
+              f"{row['output_tokens']:>9} {row['cost_usd']:>9.4f} {row['p50_ms'] or 0:>8.0f} {row['p95_ms'] or 0:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini 呼び出しの集計")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    runs_parser = sub.add_parser("runs", help="実行ごとの集計")
+    runs_parser.add_argument("--last", type=int, default=10, help="新しい順に何回分を表示するか")
+    categories_parser = sub.add_parser("categories", help="カテゴリごとの集計")
+    categories_parser.add_argument("--run", help="この run_id だけを集計する")
+    args = parser.parse_args()
+
+    if args.command == "runs":
+        _print_rollup(run_rollup(args.db, last=args.last), "run_id")
+    else:
+        _print_rollup(category_rollup(args.db, args.run), "category")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+/*
+ * 分割検索インデックスのクライアント
+ *
+ * search_shards.py が書き出した search/ 以下のシャードのうち、
+ * 入力された語に対応するものだけを読み込んで検索する。
+ */
+(function () {
+  "use strict";
+
+  // search_shards.py の _TOKEN_RE / tokenize() と同じ定義にすること
+  var TOKEN_RE = /[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+/g;
+  var MAX_RESULTS = 20;
+
+  // このファイルは <サイトのルート>/javascripts/ に置かれる
+  var ROOT = new URL("..", document.currentScript.src).href;
+  var INDEX_URL = ROOT + "search/";
+  var cache = {};
+
+  function fetchJSON(path) {
+    if (!(path in cache)) {
+      cache[path] = fetch(INDEX_URL + path)
+        .then(function (res) { return res.ok ? res.json() : null; })
+        .catch(function () { return null; });
+    }
+    return cache[path];
+  }
+
+  function isHiragana(ch) {
+    return ch >= "\u3040" && ch <= "\u309f";
+  }
+
+  function tokenize(text) {
+    var tokens = [];
+    var runs = (text || "").normalize("NFKC").toLowerCase().match(TOKEN_RE) || [];
+    runs.forEach(function (run) {
+      if (run[0] < "\u3040") {
+        if (run.length >= 2) tokens.push(run);
+      } else if (run.length === 1) {
+        if (!isHiragana(run)) tokens.push(run);
+      } else {
+        for (var i = 0; i < run.length - 1; i++) {
+          if (!(isHiragana(run[i]) && isHiragana(run[i + 1]))) tokens.push(run.slice(i, i + 2));
+        }
+      }
+    });
+    return tokens;
+  }
+
+  function shardFile(term, asciiPrefix) {
+    var key = term[0] < "\u3040" ? term.slice(0, asciiPrefix) : term[0];
+    return Array.from(key).map(function (ch) { return ch.codePointAt(0).toString(16); }).join("-") + ".json";
+  }
+
+  // 1語ぶんのヒット {doc_id: score}。入力途中の最後の語と1文字の語は前方一致で探す
+  function matchToken(shard, token, prefix, docCount) {
+    var hits = new Map();
+    if (!shard) return hits;
+    Object.keys(shard.terms).forEach(function (term) {
+      if (term !== token && !(prefix && term.indexOf(token) === 0)) return;
+      var postings = shard.terms[term];
+      var idf = Math.log(1 + docCount / (postings.length / 2));
+      for (var i = 0; i < postings.length; i += 2) {
+        var score = postings[i + 1] * idf;
+        if (score > (hits.get(postings[i]) || 0)) hits.set(postings[i], score);
+      }
+    });
+    return hits;
+  }
+
+  async function search(query) {
+    var meta = await fetchJSON("meta.json");
+    var tokens = tokenize(query);
+    if (!meta || !tokens.length) return [];
+
+    var shards = await Promise.all(tokens.map(function (token) {
+      return fetchJSON("shards/" + shardFile(token, meta.ascii_prefix));
+    }));
+
+    // すべての語を含む記事だけを残す（AND検索）
+    var scores = null;
+    tokens.forEach(function (token, i) {
+      var prefix = i === tokens.length - 1 || token.length === 1;
+      var hits = matchToken(shards[i], token, prefix, meta.doc_count);
+      if (scores === null) {
+        scores = hits;
+        return;
+      }
+      var next = new Map();
+      scores.forEach(function (score, docId) {
+        if (hits.has(docId)) next.set(docId, score + hits.get(docId));
+      });
+      scores = next;
+    });
+
+    var top = Array.from(scores.entries())
+      .sort(function (a, b) { return b[1] - a[1]; })
+      .slice(0, MAX_RESULTS);
+    var blocks = await Promise.all(top.map(function (entry) {
+      return fetchJSON("docs/" + Math.floor(entry[0] / meta.block_size) + ".json");
+    }));
+    return top.map(function (entry, i) {
+      var doc = blocks[i] && blocks[i].docs[String(entry[0])];
+      return doc && { title: doc[0], url: ROOT + meta.article_path + "/" + doc[1] + "/", category: doc[2] };
+    }).filter(Boolean);
+  }
+
+  function render(container, results, query) {
+    container.textContent = "";
+    if (!query) return;
+    if (!results.length) {
+      container.textContent = "該当する記事が見つかりませんでした。";
+      return;
+    }
+    var list = document.createElement("ul");
+    results.forEach(function (result) {
+      var item = document.createElement("li");
+      var link = document.createElement("a");
+      link.href = result.url;
+      link.textContent = result.title;
+      var category = document.createElement("small");
+      category.textContent = " (" + result.category + ")";
+      item.appendChild(link);
+      item.appendChild(category);
+      list.appendChild(item);
+    });
+    container.appendChild(list);
+  }
+
+  // search プラグインを外したのでテーマのヘッダーに検索欄が出ない。
+  // 代わりに search.md のページへ ?q= で送るフォームを置く
+  function mountHeaderForm() {
+    var header = document.querySelector(".md-header__inner");
+    if (!header || document.getElementById("sharded-search-header")) return;
+    var form = document.createElement("form");
+    form.id = "sharded-search-header";
+    form.action = ROOT + "search/";
+    form.method = "get";
+    form.setAttribute("role", "search");
+    form.style.cssText = "margin: 0 0.4rem;";
+    var field = document.createElement("input");
+    field.type = "search";
+    field.name = "q";
+    field.placeholder = "検索";
+    field.setAttribute("aria-label", "サイト内検索");
+    field.style.cssText = "width: 9rem; padding: 0.2rem 0.5rem; border: 0; border-radius: 0.1rem;" +
+      " background: rgba(255, 255, 255, 0.15); color: inherit; font: inherit;";
+    form.appendChild(field);
+    header.insertBefore(form, header.querySelector(".md-header__source"));
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    mountHeaderForm();
+    var input = document.getElementById("sharded-search-input");
+    var container = document.getElementById("sharded-search-results");
+    if (!input || !container) return;
+
+    var timer = null;
+    var latest = 0;
+    function run() {
+      var query = input.value.trim();
+      var ticket = ++latest;
+      search(query).then(function (results) {
+        if (ticket === latest) render(container, results, query);
+      });
+    }
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(run, 200);
+    });
+
+    var initial = new URLSearchParams(location.search).get("q");
+    if (initial) {
+      input.value = initial;
+      run();
+    }
+  });
+})();
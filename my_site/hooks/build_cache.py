@@ -0,0 +1,202 @@
+"""
+MkDocs ビルドキャッシュ（mkdocs.yml の hooks で読み込む）
+
+ページのソース（Markdown + front matter）、そのページの URL とリンク先ページの URL、
+テーマ・設定（nav を含む）のハッシュをキーに、
+Markdown → HTML の変換結果（本文HTML・目次・タイトル）と検索インデックスのエントリを
+my_site/.build_cache/ に保存する。次回のビルドでソースが変わっていないページは
+Markdownの変換と検索用のHTML解析を省略し、保存しておいた結果を使う。
+本文HTMLの相対リンクはリンク先のページの有無と URL で変わるので、リンク先が追加・削除・
+移動されたページは作り直す。
+
+ナビゲーションは全ページ共通なので、テーマのテンプレート適用（ページ全体のHTML出力）は
+毎回行う。省略するのは1ページあたりで最も重いMarkdown変換と検索インデックス作成。
+"""
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import re
+import types
+
+import mkdocs
+from mkdocs.plugins import event_priority
+from mkdocs.structure.toc import get_toc
+
+log = logging.getLogger("mkdocs.hooks.build_cache")
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".build_cache")
+CACHE_FILE = os.path.join(CACHE_DIR, "pages.json")
+# キャッシュの形式・キーを変えたら上げる
+CACHE_VERSION = 2
+
+# Markdown 中の他ページへの参照（[..](x.md#a), [id]: x.md, <a href="x.md"> など）
+_MD_LINK_RE = re.compile(r"""[^\s()<>\[\]"'#]+\.md\b""")
+
+_state = {
+    "config_hash": None,
+    "previous": {},  # 前回のビルドで保存したページ {src_uri: entry}
+    "current": {},   # 今回のビルドで使った/作ったページ
+    "hits": 0,
+    "misses": 0,
+}
+
+
+def _stable_default(obj):
+    """設定値に含まれる関数などを、実行ごとに変わらない文字列にする"""
+    name = getattr(obj, "__qualname__", type(obj).__name__)
+    return f"{getattr(obj, '__module__', '')}.{name}"
+
+
+def _config_hash(config):
+    try:
+        import material
+        material_version = getattr(material, "__version__", "")
+    except ImportError:
+        material_version = ""
+    key = {
+        "cache_version": CACHE_VERSION,
+        "mkdocs": mkdocs.__version__,
+        "material": material_version,
+        "theme": config["theme"].name,
+        "markdown_extensions": config["markdown_extensions"],
+        "mdx_configs": config["mdx_configs"],
+        "use_directory_urls": config["use_directory_urls"],
+        "nav": config["nav"],
+        "site_url": config["site_url"],
+    }
+    raw = json.dumps(key, sort_keys=True, default=_stable_default)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _link_targets(page, files):
+    """本文から参照しているページの {参照先のパス: URL}（存在しないページは None）"""
+    base = posixpath.dirname(page.file.src_uri)
+    targets = {}
+    for target in set(_MD_LINK_RE.findall(page.markdown)):
+        if "://" in target:
+            continue
+        path = posixpath.normpath(target.lstrip("/") if target.startswith("/") else posixpath.join(base, target))
+        linked = files.get_file_from_path(path)
+        targets[path] = linked.url if linked is not None else None
+    return targets
+
+
+def _source_hash(page, files):
+    raw = json.dumps(
+        [page.markdown, page.meta, page.file.url, _link_targets(page, files)], sort_keys=True, default=str
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _toc_tokens(items):
+    """TableOfContents を get_toc() に渡せる形（JSONにできる形）に戻す"""
+    return [
+        {"name": item.title, "id": item.id, "level": item.level, "children": _toc_tokens(item.children)}
+        for item in items
+    ]
+
+
+def _cached_render(entry):
+    """Page.render の代わりにキャッシュ済みの結果を設定する"""
+    def render(page, config, files):
+        page.content = entry["content"]
+        page.toc = get_toc(entry["toc"])
+        page._title_from_render = entry["title"]
+        page.present_anchor_ids = set(entry["anchors"])
+    return render
+
+
+# ---------------------------------------------------------
+# 検索インデックス: 変更のないページは保存しておいたエントリを追加する
+# ---------------------------------------------------------
+def _search_entries(search_index):
+    # mkdocs標準の search は _entries、Material の search は entries
+    return search_index.entries if hasattr(search_index, "entries") else search_index._entries
+
+
+def _wrap_search_index(search_index):
+    original = search_index.add_entry_from_context
+
+    def add_entry_from_context(page):
+        entry = _state["current"].get(page.file.src_uri)
+        entries = _search_entries(search_index)
+        if entry is not None and entry.get("search") is not None and entry.get("from_cache"):
+            entries.extend(entry["search"])
+            return
+        start = len(entries)
+        original(page)
+        if entry is not None:
+            entry["search"] = entries[start:]
+
+    search_index.add_entry_from_context = add_entry_from_context
+
+
+# ---------------------------------------------------------
+# MkDocs イベント
+# ---------------------------------------------------------
+def on_config(config):
+    _state["config_hash"] = _config_hash(config)
+    _state["current"] = {}
+    _state["hits"] = _state["misses"] = 0
+    try:
+        with open(CACHE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        data = {}
+    if data.get("config_hash") == _state["config_hash"]:
+        _state["previous"] = data.get("pages", {})
+    else:
+        if data:
+            log.info("Build cache invalidated (theme or config changed)")
+        _state["previous"] = {}
+    return config
+
+
+@event_priority(-100)  # search プラグインが SearchIndex を作った後に差し替える
+def on_pre_build(config):
+    search = config.plugins.get("search") or config.plugins.get("material/search")
+    search_index = getattr(search, "search_index", None)
+    if search_index is not None:
+        _wrap_search_index(search_index)
+
+
+@event_priority(-100)  # 他のプラグインが Markdown を書き換えた後の内容でハッシュを取る
+def on_page_markdown(markdown, page, config, files):
+    source_hash = _source_hash(page, files)
+    cached = _state["previous"].get(page.file.src_uri)
+    if cached is not None and cached.get("source_hash") == source_hash:
+        entry = dict(cached, from_cache=True)
+        page.render = types.MethodType(_cached_render(entry), page)
+        _state["hits"] += 1
+    else:
+        entry = {"source_hash": source_hash, "from_cache": False}
+        _state["misses"] += 1
+    _state["current"][page.file.src_uri] = entry
+    return markdown
+
+
+@event_priority(100)  # 他のプラグインが本文HTMLを書き換える前の変換結果を保存する
+def on_page_content(html, page, config, files):
+    entry = _state["current"].get(page.file.src_uri)
+    if entry is not None and not entry["from_cache"]:
+        entry["content"] = html
+        entry["toc"] = _toc_tokens(page.toc)
+        entry["title"] = getattr(page, "_title_from_render", None)
+        entry["anchors"] = sorted(page.present_anchor_ids or ())
+    return html
+
+
+def on_post_build(config):
+    # 今回のビルドに存在したページだけを保存する（削除されたページは消える）
+    pages = {}
+    for src_uri, entry in _state["current"].items():
+        if "content" in entry:
+            pages[src_uri] = {k: v for k, v in entry.items() if k != "from_cache"}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CACHE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"config_hash": _state["config_hash"], "pages": pages}, f, ensure_ascii=False)
+    os.replace(tmp_path, CACHE_FILE)
+    log.info(f"Build cache: {_state['hits']} pages reused, {_state['misses']} pages rendered")
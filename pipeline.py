@@ -0,0 +1,491 @@
+"""
+パイプライン全体を1プロセスで実行するオーケストレーター
+
+ステージ（scrape → clean → store, generate, export, snapshot, build, promote）を依存関係つきで宣言し、
+依存が終わったステージから順にスレッドで並列実行する。スクレイピングと記事生成のように
+互いに依存しないステージは同時に進む。
+
+各ステージは「入力のフィンガープリント」を持ち、前回成功したときと同じなら実行を省く。
+フィンガープリントはDBの pipeline_stages テーブルに保存するので、次回の実行にも引き継がれる。
+
+    python pipeline.py run                       # 全ステージ
+    python pipeline.py run --skip build promote  # GitHub Actions（デプロイは別ステップ）
+    python pipeline.py run --only export --force
+    python pipeline.py run --dry-run             # 実行するステージ・省くステージの表示だけ
+    python pipeline.py status
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from product_record import ProductRecord
+from utils import metrics, run_context, tracing
+
+DB_PATH = "seo_content.db"
+MKDOCS_CONFIG = os.path.join("my_site", "mkdocs.yml")
+TEMPLATE_DIR = "templates"
+# スクレイピングはこの時間内に成功していれば省く（外部サイトの内容は入力から判断できないため）
+SCRAPE_INTERVAL_HOURS = float(os.getenv("SCRAPE_INTERVAL_HOURS", "20"))
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+
+logger = logging.getLogger(__name__)
+
+# ステージの結果
+DONE = "done"
+UNCHANGED = "skipped (unchanged)"
+NO_INPUT = "skipped (no input)"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+STAGE_SECONDS = metrics.histogram("seo_pipeline_stage_duration_seconds", "実行したステージの所要時間", ("stage",))
+STAGE_RESULTS = metrics.counter(
+    "seo_pipeline_stage_results_total",
+    "ステージの結果（result: done / unchanged / no_input / failed / blocked）",
+    ("stage", "result"),
+)
+_RESULT_LABELS = {DONE: "done", UNCHANGED: "unchanged", NO_INPUT: "no_input", FAILED: "failed", BLOCKED: "blocked"}
+
+
+def _digest(*parts) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _tree_digest(*roots) -> str:
+    """ディレクトリ以下のファイルの (パス, サイズ, 更新時刻) から作るハッシュ（中身は読まない）"""
+    entries = []
+    for root in roots:
+        if os.path.isfile(root):
+            st = os.stat(root)
+            entries.append((root, st.st_size, st.st_mtime_ns))
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                st = os.stat(path)
+                entries.append((path, st.st_size, st.st_mtime_ns))
+    return _digest(entries)
+
+
+@dataclass
+class PipelineContext:
+    """ステージ間で受け渡すデータ"""
+    db_path: str = DB_PATH
+    keywords: List[str] = field(default_factory=list)
+    raw_data: Optional[List[ProductRecord]] = None
+    cleaned: Optional[List[ProductRecord]] = None
+
+
+@dataclass
+class Stage:
+    """name: ステージ名 / run: 本体 / deps: 先に終わっている必要があるステージ
+
+    soft_deps は「終わるのは待つが、失敗していても実行する」ステージ
+    （export はスクレイピング側が失敗しても、生成できた記事を書き出す）。
+
+    fingerprint は入力のフィンガープリントを返す関数。前回成功時と同じなら実行を省き、
+    None を返したら入力なしとして省く。fingerprint 自体が None のステージは毎回実行する。
+    run が False を返したら（一部だけ失敗した場合）、後続は進めるがフィンガープリントは保存せず、
+    次回も実行する。
+    """
+    name: str
+    run: Callable[[PipelineContext], Any]
+    deps: Tuple[str, ...] = ()
+    fingerprint: Optional[Callable[[PipelineContext], Optional[str]]] = None
+    soft_deps: Tuple[str, ...] = ()
+
+
+# ==========================================
+# ステージの実装
+# ==========================================
+def _scrape(ctx):
+    from scraper_pipeline import CONFIG, SCRAPE_WORKERS, Scraper
+    if SCRAPE_WORKERS > 1:
+        # 複数プロセスで取得する場合は run_sharded がこのプロセスで整形・保存まで済ませるので、
+        # clean / store に渡すものはない（どちらも入力なしとして省かれる）
+        from sharded_scraper import run_sharded
+        result = run_sharded(CONFIG, SCRAPE_WORKERS)
+        ctx.raw_data = None
+        logger.info(f"Scraped and stored {result['saved']} items with {SCRAPE_WORKERS} workers")
+        if any(stats.error for stats in result["workers"].values()):
+            # 落ちたワーカーの分は取れていないので、次回もスクレイピングする
+            return False
+        return
+    ctx.raw_data = asyncio.run(Scraper(CONFIG).run())
+    logger.info(f"Scraped {len(ctx.raw_data)} items")
+
+
+def _scrape_fingerprint(ctx):
+    from scraper_pipeline import CONFIG
+    from scrape_sources import get_sources
+    bucket = int(time.time() // (SCRAPE_INTERVAL_HOURS * 3600))
+    return _digest(CONFIG.sources if CONFIG.sources is not None else get_sources(), bucket)
+
+
+def _clean(ctx):
+    from scraper_pipeline import Cleaner
+    ctx.cleaned = Cleaner().clean_records(ctx.raw_data)
+
+
+def _clean_fingerprint(ctx):
+    if not ctx.raw_data:
+        return None
+    # 取得時刻は毎回変わるので除く（内容が前回と同じなら整形を省き、store は取得時刻の更新だけ行う）
+    # （as_row の最後が scraped_at）
+    return _digest([record.as_row()[:-1] for record in ctx.raw_data])
+
+
+def _store(ctx):
+    from scraper_pipeline import Storage
+    if ctx.cleaned is not None:
+        Storage(ctx.db_path).save_records(ctx.cleaned)
+    else:
+        # clean が省かれた（取得内容が前回と同じ）: 内容は書き換えず、最終取得時刻だけ更新する
+        Storage(ctx.db_path).touch_records(ctx.raw_data)
+
+
+def _store_fingerprint(ctx):
+    if not ctx.raw_data:
+        return None
+    # 取得時刻も含める（scraped_at / updated_at は「最後に取得した時刻」なので、取得し直したら必ず保存する）
+    return _digest([(record.url, record.scraped_at) for record in ctx.raw_data])
+
+
+def _generate(ctx):
+    # 生成できた記事から順に書き出しておく（export ステージの差分書き出しでは残りがなければ何もしない）
+    from seo_pipeline import PIPELINED_EXPORT, generate_and_export, generate_articles
+    failed = []
+    if PIPELINED_EXPORT:
+        generate_and_export(ctx.keywords, on_failed=failed.append)
+    else:
+        generate_articles(ctx.keywords, on_failed=failed.append)
+    if failed:
+        # 記事がないまま「生成済み」として次回から省かれないようにする
+        logger.warning(f"Generation failed for {len(failed)} keyword(s): {', '.join(failed)}")
+        return False
+
+
+def _generate_fingerprint(ctx):
+    if not ctx.keywords:
+        return None
+    from content_generator import DEDUPE_MODE, GEMINI_MODEL_NAME
+    return _digest(ctx.keywords, DEDUPE_MODE, GEMINI_MODEL_NAME)
+
+
+def _export(ctx):
+    from export_to_site import export_article_to_markdown
+    export_article_to_markdown()
+
+
+def _export_fingerprint(ctx):
+    from export_to_site import EXPORT_AFFILIATE, MANIFEST_PATH
+    conn = sqlite3.connect(ctx.db_path)
+    try:
+        signature = conn.execute("""
+            SELECT COUNT(*), MAX(updated_at), MAX(scraped_at), SUM(LENGTH(generated_body)), SUM(LENGTH(title))
+            FROM products WHERE generated_body IS NOT NULL AND generated_body != ''
+        """).fetchone()
+    finally:
+        conn.close()
+    # マニフェストは書き出し結果そのもの（消されたら書き出し直す）
+    outputs = [MANIFEST_PATH] if os.path.exists(MANIFEST_PATH) else []
+    return _digest(signature, _tree_digest(TEMPLATE_DIR, *outputs), EXPORT_AFFILIATE)
+
+
+def _snapshot(ctx):
+    from products_snapshot import export_snapshot
+    export_snapshot(ctx.db_path)
+
+
+def _snapshot_fingerprint(ctx):
+    from products_snapshot import SNAPSHOT_DIR, pyarrow_available
+    if not pyarrow_available():
+        # pyarrow は任意の依存（入っていなければスナップショットは作らない）
+        logger.info("pyarrow is not installed; skipping the Parquet snapshot.")
+        return None
+    conn = sqlite3.connect(ctx.db_path)
+    try:
+        columns = {info[1] for info in conn.execute("PRAGMA table_info(products)")}
+        if not columns:
+            return None
+        # generated_body / promoted は後のステージが追加する列
+        aggregates = ["COUNT(*)", "MAX(updated_at)", "MAX(scraped_at)"]
+        if "generated_body" in columns:
+            aggregates.append("SUM(LENGTH(generated_body))")
+        if "promoted" in columns:
+            aggregates.append("SUM(promoted)")
+        signature = conn.execute(f"SELECT {', '.join(aggregates)} FROM products").fetchone()
+    finally:
+        conn.close()
+    return _digest(signature, os.path.isdir(SNAPSHOT_DIR))
+
+
+def _build(ctx):
+    from mkdocs.commands.build import build
+    from mkdocs.config import load_config
+    build(load_config(config_file=MKDOCS_CONFIG))
+
+
+def _build_fingerprint(ctx):
+    site_dir = os.path.dirname(MKDOCS_CONFIG)
+    return _tree_digest(MKDOCS_CONFIG, os.path.join(site_dir, "docs"), os.path.join(site_dir, "hooks"))
+
+
+def _promote(ctx):
+    # 投稿するかどうか・何件かは promotion_scheduler の投稿枠で決まるので毎回実行する
+    from promote_on_x import main as promote_main
+    asyncio.run(promote_main())
+
+
+STAGES = [
+    Stage("scrape", _scrape, fingerprint=_scrape_fingerprint),
+    Stage("clean", _clean, ("scrape",), _clean_fingerprint),
+    Stage("store", _store, ("clean",), _store_fingerprint),
+    Stage("generate", _generate, fingerprint=_generate_fingerprint),
+    Stage("export", _export, ("generate",), _export_fingerprint, soft_deps=("store",)),
+    Stage("snapshot", _snapshot, ("generate",), _snapshot_fingerprint, soft_deps=("store",)),
+    Stage("build", _build, ("export",), _build_fingerprint),
+    Stage("promote", _promote, ("export",)),
+]
+
+
+# ==========================================
+# オーケストレーター
+# ==========================================
+class Pipeline:
+    def __init__(self, stages: List[Stage], db_path: str = DB_PATH, workers: int = PIPELINE_WORKERS, force: bool = False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = self._topological_order(stages)
+        self.db_path = db_path
+        self.workers = workers
+        self.force = force
+        self._state_lock = threading.Lock()
+        self._ensure_state_table()
+
+    @staticmethod
+    def _topological_order(stages: List[Stage]) -> List[str]:
+        names = {stage.name for stage in stages}
+        order, visiting, visited = [], set(), set()
+        by_name = {stage.name: stage for stage in stages}
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a cycle at stage '{name}'")
+            visiting.add(name)
+            for dep in by_name[name].deps + by_name[name].soft_deps:
+                if dep not in names:
+                    raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for stage in stages:
+            visit(stage.name)
+        return order
+
+    # ---------------------------------------------------------
+    # フィンガープリントの保存
+    # ---------------------------------------------------------
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure_state_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pipeline_stages (
+                    stage TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    duration REAL,
+                    finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def saved_state(self) -> Dict[str, Tuple[str, float, str]]:
+        conn = self._connect()
+        try:
+            return {
+                stage: (fingerprint, duration, finished_at)
+                for stage, fingerprint, duration, finished_at in conn.execute(
+                    "SELECT stage, fingerprint, duration, finished_at FROM pipeline_stages"
+                )
+            }
+        finally:
+            conn.close()
+
+    def _save_fingerprint(self, name, fingerprint, duration):
+        with self._state_lock:
+            conn = self._connect()
+            try:
+                conn.execute("""
+                    INSERT INTO pipeline_stages (stage, fingerprint, duration, finished_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(stage) DO UPDATE SET
+                        fingerprint=excluded.fingerprint,
+                        duration=excluded.duration,
+                        finished_at=excluded.finished_at
+                """, (name, fingerprint, duration))
+                conn.commit()
+            finally:
+                conn.close()
+
+    # ---------------------------------------------------------
+    # 実行
+    # ---------------------------------------------------------
+    def _execute(self, stage: Stage, ctx: PipelineContext, previous: Optional[str]) -> str:
+        if stage.fingerprint is not None and not self.force:
+            fingerprint = stage.fingerprint(ctx)
+            if fingerprint is None:
+                return NO_INPUT
+            if fingerprint == previous:
+                return UNCHANGED
+
+        logger.info(f"▶ Stage '{stage.name}' started")
+        started = time.perf_counter()
+        with tracing.span("pipeline.stage", stage=stage.name), STAGE_SECONDS.time(stage=stage.name), \
+                run_context.bind(stage=stage.name):
+            complete = stage.run(ctx) is not False
+        duration = time.perf_counter() - started
+        if not complete:
+            logger.warning(f"⚠ Stage '{stage.name}' finished in {duration:.1f}s with failures; it will run again next time")
+            return DONE
+        # ステージ自身が入力を書き換えることがあるので（export のマニフェストなど）、実行後の値を保存する
+        fingerprint = stage.fingerprint(ctx) if stage.fingerprint is not None else None
+        self._save_fingerprint(stage.name, fingerprint, duration)
+        logger.info(f"✔ Stage '{stage.name}' finished in {duration:.1f}s")
+        return DONE
+
+    def run(self, ctx: PipelineContext, selected: Optional[List[str]] = None) -> Dict[str, str]:
+        """選ばれたステージを依存順に実行し、{ステージ名: 結果} を返す
+
+        選ばれていないステージへの依存は満たされているものとして扱う。
+        失敗したステージに依存するステージは実行しない（blocked）。soft_deps の失敗では止めない。
+        """
+        selected = [name for name in self.order if selected is None or name in selected]
+        previous = {name: state[0] for name, state in self.saved_state().items()}
+        results: Dict[str, str] = {}
+        pending = list(selected)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while pending or running:
+                for name in list(pending):
+                    stage = self.stages[name]
+                    deps = [dep for dep in stage.deps if dep in selected]
+                    soft_deps = [dep for dep in stage.soft_deps if dep in selected]
+                    if any(results.get(dep) in (FAILED, BLOCKED) for dep in deps):
+                        results[name] = BLOCKED
+                        pending.remove(name)
+                    elif all(dep in results for dep in deps + soft_deps):
+                        pending.remove(name)
+                        future = pool.submit(self._execute, stage, ctx, previous.get(name))
+                        running[future] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"✖ Stage '{name}' failed: {e}")
+                        results[name] = FAILED
+                    if results[name] != DONE and results[name] != FAILED:
+                        logger.info(f"Stage '{name}' {results[name]}")
+        for name, result in results.items():
+            STAGE_RESULTS.inc(stage=name, result=_RESULT_LABELS[result])
+        return results
+
+    def dry_run(self, ctx: PipelineContext, selected: Optional[List[str]] = None) -> Dict[str, str]:
+        """実行せずに、各ステージを実行するか省くかを表示用に返す"""
+        previous = {name: state[0] for name, state in self.saved_state().items()}
+        upstream_runtime = {"clean", "store"}  # 上流の実行結果が入力になるステージ
+        plan = {}
+        for name in self.order:
+            if selected is not None and name not in selected:
+                continue
+            stage = self.stages[name]
+            if self.force or stage.fingerprint is None:
+                plan[name] = "run"
+            elif name in upstream_runtime:
+                plan[name] = "depends on upstream output"
+            else:
+                fingerprint = stage.fingerprint(ctx)
+                plan[name] = NO_INPUT if fingerprint is None else (UNCHANGED if fingerprint == previous.get(name) else "run")
+        return plan
+
+
+def main():
+    from utils.log_setup import setup_logging
+    setup_logging("pipeline")
+    parser = argparse.ArgumentParser(description="パイプライン全体を1プロセスで実行する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="ステージを依存順に実行する")
+    run_parser.add_argument("--only", nargs="+", metavar="STAGE", help="指定したステージだけ実行する")
+    run_parser.add_argument("--skip", nargs="+", metavar="STAGE", default=[], help="指定したステージを実行しない")
+    run_parser.add_argument("--keywords", nargs="+", help="記事を生成するキーワード（既定は seo_pipeline.DEFAULT_KEYWORDS）")
+    run_parser.add_argument("--force", action="store_true", help="フィンガープリントが同じでも実行する")
+    run_parser.add_argument("--dry-run", action="store_true", help="実行するステージを表示するだけ")
+    run_parser.add_argument("--workers", type=int, default=PIPELINE_WORKERS)
+    sub.add_parser("status", help="各ステージの前回の実行結果を表示する")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        pipeline = Pipeline(STAGES)
+        state = pipeline.saved_state()
+        for name in pipeline.order:
+            fingerprint, duration, finished_at = state.get(name, (None, None, None))
+            if finished_at is None:
+                print(f"{name:<10} never run")
+            else:
+                print(f"{name:<10} {finished_at}  {duration:7.1f}s  {(fingerprint or '-')[:12]}")
+        return
+
+    names = [stage.name for stage in STAGES]
+    for name in (args.only or []) + args.skip:
+        if name not in names:
+            parser.error(f"unknown stage '{name}' (choose from {', '.join(names)})")
+    selected = [name for name in (args.only or names) if name not in args.skip]
+
+    if args.keywords is None:
+        from seo_pipeline import DEFAULT_KEYWORDS
+        keywords = DEFAULT_KEYWORDS
+    else:
+        keywords = args.keywords
+
+    pipeline = Pipeline(STAGES, workers=args.workers, force=args.force)
+    ctx = PipelineContext(db_path=DB_PATH, keywords=keywords)
+
+    if args.dry_run:
+        for name, action in pipeline.dry_run(ctx, selected).items():
+            print(f"{name:<10} {action}")
+        return
+
+    started = time.perf_counter()
+    results = pipeline.run(ctx, selected)
+    logger.info(f"🏁 Pipeline finished in {time.perf_counter() - started:.1f}s")
+    for name in pipeline.order:
+        if name in results:
+            logger.info(f"  {name:<10} {results[name]}")
+    if any(result in (FAILED, BLOCKED) for result in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+スクレイピング結果の1件（Scraper → Cleaner → Storage で共通に使う）
+
+以前は1件ごとに8つのキーを持つ dict を作り、DataFrame に変換してから to_dict で dict に戻していた。
+__slots__ つきの dataclass にすると1件あたりのメモリが dict の半分以下になり、
+Storage は as_row() のタプルをそのまま executemany に渡せる（DataFrame を経由しない）。
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, ClassVar, Dict, Tuple
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    url: str
+    title: str
+    description: str = ""
+    raw_price: str = ""
+    image_url: str = ""
+    specs: str = ""
+    category: str = "Uncategorized"
+    scraped_at: str = ""
+
+    # products テーブルに書き込む列と順序（price には raw_price を入れる）
+    COLUMNS: ClassVar[Tuple[str, ...]] = ("url", "title", "description", "price", "image_url", "specs", "category", "scraped_at")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def as_row(self) -> Tuple[str, ...]:
+        """Storage の INSERT に渡すタプル（COLUMNS の順）"""
+        return (self.url, self.title, self.description, self.raw_price, self.image_url, self.specs,
+                self.category, self.scraped_at)
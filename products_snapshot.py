@@ -0,0 +1,278 @@
+"""
+products テーブルの列指向スナップショット（Parquet）と、分析用の読み込み API
+
+分析で seo_content.db に SELECT * をすると、価格やカテゴリを集計するだけでも全記事の
+generated_body を読み込むことになる。ここでは products を Parquet に書き出し、
+カテゴリと取得日（scraped_at の日付）で Hive 形式のディレクトリに分ける。
+
+    snapshots/products/category=Gadget/date=2026-10-19/part-0.parquet
+
+列には型をつける（scraped_at / updated_at はタイムスタンプ、price_num は数字だけの価格を整数にしたもの、
+body_chars は本文の文字数）。読み込み時の category は辞書型（カテゴリ値の表と番号）になる。
+load_products() は必要な列だけを読み（列の射影）、カテゴリ・日付の条件に合わないディレクトリは
+開かず、それ以外の条件も行グループの統計で読み飛ばす（述語のプッシュダウン）。
+
+    from products_snapshot import load_products
+    df = load_products(columns=["price_num", "category"], categories=["Gadget"], since="2026-10-01")
+
+書き出しは一時ディレクトリに行ってから差し替えるので、読み込み中に中途半端な状態は見えない。
+pyarrow は任意の依存で、書き出し・読み込みのときだけ読み込む。
+
+    python products_snapshot.py export
+    python products_snapshot.py query --columns title price_num --category Gadget --since 2026-10-01
+"""
+import argparse
+import logging
+import os
+import re
+import shutil
+import sqlite3
+from datetime import date, datetime
+from typing import Iterator, List, Optional, Sequence
+
+from utils import tracing
+
+DB_PATH = "seo_content.db"
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("snapshots", "products"))
+# DBから一度に読み出す件数（= 書き出すレコードバッチの大きさ）。本文を含むので小さめにする
+# （書き出し側が数バッチ先まで読むため、ピークメモリはこの値にほぼ比例する）
+SNAPSHOT_BATCH_ROWS = int(os.getenv("SNAPSHOT_BATCH_ROWS", "5000"))
+# 1ファイル内の行グループの最大行数（述語のプッシュダウンで読み飛ばす単位）
+SNAPSHOT_ROW_GROUP_ROWS = int(os.getenv("SNAPSHOT_ROW_GROUP_ROWS", "100000"))
+
+# 分割に使う列（ファイルには書かず、ディレクトリ名になる）
+PARTITION_COLUMNS = ("category", "date")
+# ファイルに書く列（DBにない列は NULL になる）
+SOURCE_COLUMNS = ("url", "title", "description", "price", "image_url", "specs", "category",
+                  "scraped_at", "updated_at", "generated_body", "promoted")
+
+_PRICE_NOISE = re.compile(r"[¥￥,\s円]")
+
+logger = logging.getLogger(__name__)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("pyarrow is required for Parquet snapshots (pip install pyarrow)") from None
+
+
+def pyarrow_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def file_schema():
+    """Parquet ファイルに書く列の型（分割に使う列を除く）"""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("url", pa.string()),
+        ("title", pa.string()),
+        ("description", pa.string()),
+        ("price", pa.string()),
+        ("price_num", pa.int64()),
+        ("image_url", pa.string()),
+        ("specs", pa.string()),
+        ("scraped_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("s")),
+        ("promoted", pa.bool_()),
+        ("body_chars", pa.int32()),
+        ("generated_body", pa.string()),
+    ])
+
+
+def partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([("category", pa.string()), ("date", pa.date32())]), flavor="hive")
+
+
+# ==========================================
+# 書き出し
+# ==========================================
+def _parse_price(price) -> Optional[int]:
+    """"¥128,000" → 128000。数字以外を含む価格（"Free" など）は None"""
+    if not price:
+        return None
+    digits = _PRICE_NOISE.sub("", str(price))
+    return int(digits) if digits.isdigit() else None
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _record_batches(conn: sqlite3.Connection, batch_rows: int) -> Iterator:
+    """products を batch_rows 件ずつ型つきのレコードバッチにする（全件をメモリに載せない）"""
+    import pyarrow as pa
+
+    existing = {info[1] for info in conn.execute("PRAGMA table_info(products)")}
+    select = ", ".join(name if name in existing else f"NULL AS {name}" for name in SOURCE_COLUMNS)
+    schema = file_schema().append(pa.field("category", pa.string())).append(pa.field("date", pa.date32()))
+    cursor = conn.execute(f"SELECT {select} FROM products")
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        url, title, description, price, image_url, specs, category, scraped_at, updated_at, body, promoted = zip(*rows)
+        scraped = [_parse_timestamp(value) for value in scraped_at]
+        yield pa.RecordBatch.from_arrays([
+            pa.array(url, pa.string()),
+            pa.array(title, pa.string()),
+            pa.array(description, pa.string()),
+            pa.array(price, pa.string()),
+            pa.array([_parse_price(value) for value in price], pa.int64()),
+            pa.array(image_url, pa.string()),
+            pa.array(specs, pa.string()),
+            pa.array(scraped, pa.timestamp("us")),
+            pa.array([_parse_timestamp(value) for value in updated_at], pa.timestamp("s")),
+            pa.array([None if value is None else bool(value) for value in promoted], pa.bool_()),
+            pa.array([len(value) if value else 0 for value in body], pa.int32()),
+            pa.array(body, pa.string()),
+            pa.array([value or "Uncategorized" for value in category], pa.string()),
+            pa.array([value.date() if value else None for value in scraped], pa.date32()),
+        ], schema=schema)
+
+
+def export_snapshot(db_path: str = DB_PATH, out_dir: str = SNAPSHOT_DIR, batch_rows: int = SNAPSHOT_BATCH_ROWS) -> int:
+    """products を out_dir に Parquet で書き出し、書き出した行数を返す（前回のスナップショットは置き換える）"""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    tmp_dir = out_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    rows = 0
+
+    def counted(batches):
+        nonlocal rows
+        for batch in batches:
+            rows += batch.num_rows
+            yield batch
+
+    # write_dataset は別スレッドからバッチを取り出す（同時に使うのは1スレッドだけ）
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        with tracing.span("snapshot.write", db=db_path, out=out_dir) as sp:
+            batches = _record_batches(conn, batch_rows)
+            first = next(batches, None)
+            if first is None:
+                logger.info("No products to snapshot.")
+                return 0
+            ds.write_dataset(
+                counted(_chain(first, batches)),
+                tmp_dir,
+                schema=first.schema,
+                format="parquet",
+                partitioning=partitioning(),
+                basename_template="part-{i}.parquet",
+                max_rows_per_group=SNAPSHOT_ROW_GROUP_ROWS,
+                file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            )
+            sp.set(rows=rows)
+    finally:
+        conn.close()
+
+    # 差し替え（古いスナップショットは書き出しが終わってから消す）
+    old_dir = out_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old_dir)
+    os.makedirs(os.path.dirname(os.path.abspath(out_dir)), exist_ok=True)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info(f"Snapshot of {rows} products written to {out_dir}")
+    return rows
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+# ==========================================
+# 読み込み
+# ==========================================
+def open_dataset(path: str = SNAPSHOT_DIR):
+    """スナップショットを pyarrow.dataset として開く（category は辞書型、date は日付型）"""
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partition_schema = pa.schema([("category", pa.dictionary(pa.int32(), pa.string())), ("date", pa.date32())])
+    return ds.dataset(path, format="parquet", partitioning=ds.HivePartitioning.discover(schema=partition_schema))
+
+
+def _as_date(value) -> date:
+    return value if isinstance(value, date) and not isinstance(value, datetime) else date.fromisoformat(str(value)[:10])
+
+
+def build_filter(categories: Optional[Sequence[str]] = None, since=None, until=None, where=None):
+    """カテゴリ・取得日（since 以上 until 以下）と任意の式 where を AND でつないだ条件（なければ None）"""
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if categories:
+        conditions.append(ds.field("category").isin(list(categories)))
+    if since is not None:
+        conditions.append(ds.field("date") >= _as_date(since))
+    if until is not None:
+        conditions.append(ds.field("date") <= _as_date(until))
+    if where is not None:
+        conditions.append(where)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def load_products(columns: Optional[List[str]] = None, categories: Optional[Sequence[str]] = None,
+                  since=None, until=None, where=None, path: str = SNAPSHOT_DIR, as_pandas: bool = True):
+    """スナップショットから必要な列・行だけを読む
+
+    columns を省くと generated_body 以外の全列。where には pyarrow.dataset.field() の式を渡せる
+    （例: ds.field("price_num") < 100000）。as_pandas=False なら pyarrow.Table を返す。
+    """
+    dataset = open_dataset(path)
+    if columns is None:
+        columns = [name for name in dataset.schema.names if name != "generated_body"]
+    with tracing.span("snapshot.read", path=path, columns=len(columns)) as sp:
+        table = dataset.to_table(columns=columns, filter=build_filter(categories, since, until, where))
+        sp.set(rows=table.num_rows)
+    return table.to_pandas() if as_pandas else table
+
+
+def main():
+    from utils.log_setup import setup_logging
+    setup_logging("products_snapshot")
+    parser = argparse.ArgumentParser(description="products テーブルの Parquet スナップショット")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="DBからスナップショットを書き出す")
+    export_parser.add_argument("--db", default=DB_PATH)
+    export_parser.add_argument("--out", default=SNAPSHOT_DIR)
+    query_parser = sub.add_parser("query", help="スナップショットを読み込んで先頭の行を表示する")
+    query_parser.add_argument("--path", default=SNAPSHOT_DIR)
+    query_parser.add_argument("--columns", nargs="+")
+    query_parser.add_argument("--category", nargs="+", dest="categories")
+    query_parser.add_argument("--since", help="取得日の下限（YYYY-MM-DD）")
+    query_parser.add_argument("--until", help="取得日の上限（YYYY-MM-DD）")
+    query_parser.add_argument("--head", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(args.db, args.out)
+        return
+    table = load_products(args.columns, args.categories, args.since, args.until, path=args.path, as_pandas=False)
+    print(f"{table.num_rows} rows")
+    print(table.slice(0, args.head).to_pandas().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,22 @@
+from __future__ import annotations
+
 import asyncio
 import sqlite3
 import os
 import logging
 import hashlib
-from typing import Optional, Dict, Any
+import json
+import time
+from typing import Optional, Dict, Any, List, Callable, TYPE_CHECKING
 from dotenv import load_dotenv
-from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
+
+from browser_service import browser_lease
+from promotion_scheduler import PromotionScheduler
+from utils import metrics, run_context, tracing
+
+# Playwright はブラウザを起動するときだけ読み込む
+if TYPE_CHECKING:
+    from playwright.async_api import BrowserContext, Page
 
 # ==========================================
 # 0. Configuration & Setup
@@ -21,18 +32,27 @@ X_PASSWORD = os.getenv("X_PASSWORD")
 X_EMAIL = os.getenv("X_EMAIL")
 SITE_BASE_URL = os.getenv("SITE_BASE_URL", "https://example.com")
 COOKIE_FILE = "x_cookies.json"  # Cookie保存用ファイル
-
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("promotion.log", mode='a', encoding='utf-8')
-    ]
-)
+# セッション確認結果のキャッシュ（TTL内で Cookie が変わっていなければホーム画面での確認を省く）
+SESSION_CACHE_FILE = "x_session_cache.json"
+SESSION_TTL = int(os.getenv("X_SESSION_TTL", "21600"))
+# 画面を表示する場合は X_HEADLESS=0
+X_HEADLESS = os.getenv("X_HEADLESS", "1") != "0"
+# 1回の実行で投稿する記事数の上限（何件投稿するかは promotion_scheduler の投稿枠で決まる）と、投稿の間隔（秒）
+PROMOTE_BATCH_SIZE = int(os.getenv("PROMOTE_BATCH_SIZE", "10"))
+POST_INTERVAL = float(os.getenv("X_POST_INTERVAL", "2"))
+
+HOME_URL = "https://x.com/home"
+COMPOSE_URL = "https://x.com/compose/post"
+NEW_TWEET_BUTTON = '[data-testid="SideNav_NewTweet_Button"]'
+TEXTAREA_SELECTOR = '[data-testid="tweetTextarea_0"]'
+POST_BUTTON_SELECTOR = '[data-testid="tweetButton"]:not([aria-disabled="true"])'
+TWEET_TEXT_SELECTOR = '[data-testid="tweetText"]'
+
+# ログ（出力先は utils.log_setup。実行時に setup_logging で設定する）
 logger = logging.getLogger(__name__)
 
+POSTS = metrics.counter("seo_x_posts_total", "X への投稿（result: posted / failed / unconfirmed）", ("result",))
+
 # ==========================================
 # 1. Database Class
 # ==========================================
@@ -62,7 +82,7 @@ class DatabaseHandler:
         finally:
             conn.close()
 
-    def fetch_candidate_article(self) -> Optional[Dict[str, Any]]:
+    def fetch_candidate_articles(self, limit: int) -> List[Dict[str, Any]]:
         conn = self._get_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
@@ -72,17 +92,20 @@ class DatabaseHandler:
             FROM products 
             WHERE generated_body IS NOT NULL AND generated_body != '' AND promoted = 0
             ORDER BY scraped_at ASC
-            LIMIT 1
+            LIMIT ?
             """
-            cursor.execute(query)
-            row = cursor.fetchone()
-            return dict(row) if row else None
+            cursor.execute(query, (limit,))
+            return [dict(row) for row in cursor.fetchall()]
         except Exception as e:
             logger.error(f"Failed to fetch candidate: {e}")
-            return None
+            return []
         finally:
             conn.close()
 
+    def fetch_candidate_article(self) -> Optional[Dict[str, Any]]:
+        articles = self.fetch_candidate_articles(1)
+        return articles[0] if articles else None
+
     def mark_as_promoted(self, url: str):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -96,125 +119,245 @@ class DatabaseHandler:
             conn.close()
 
 # ==========================================
-# 2. X (Twitter) Promoter Class
+# 2. Session Validation Cache
+# ==========================================
+def _cookie_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(COOKIE_FILE)
+    except OSError:
+        return None
+
+def _session_recently_validated() -> bool:
+    """TTL内に確認済みで、その後 Cookie ファイルが変わっていなければ True"""
+    try:
+        with open(SESSION_CACHE_FILE, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return False
+    return (
+        cache.get("cookie_mtime") == _cookie_mtime()
+        and time.time() - cache.get("validated_at", 0) < SESSION_TTL
+    )
+
+def _remember_session_validated():
+    with open(SESSION_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"validated_at": time.time(), "cookie_mtime": _cookie_mtime()}, f)
+
+def _forget_session_validation():
+    try:
+        os.remove(SESSION_CACHE_FILE)
+    except FileNotFoundError:
+        pass
+
+# ==========================================
+# 3. X (Twitter) Promoter Class
 # ==========================================
+class SessionInvalidError(Exception):
+    """投稿画面の入力欄が出てこなかった（セッション切れ）。まだ何も送信していないので再試行してよい"""
+
+
+class PostUnconfirmedError(Exception):
+    """投稿ボタンを押した後、送信完了を確認できなかった。送信済みかもしれないので再試行してはいけない"""
+
+
 class XPromoter:
-    def __init__(self):
+    def __init__(self, headless: bool = X_HEADLESS):
         if not X_USERNAME or not X_PASSWORD:
             raise ValueError("X_USERNAME or X_PASSWORD not set in .env")
+        self.headless = headless
 
     def generate_article_url(self, original_url: str) -> str:
         hash_id = hashlib.md5(original_url.encode('utf-8')).hexdigest()
         base = SITE_BASE_URL.rstrip("/")
         return f"{base}/tools/{hash_id}.html"
 
-    async def post_to_x(self, article: Dict[str, Any]):
-        """Playwrightを使ってXに投稿する（Cookie対応版）"""
-        
+    def build_post_text(self, article: Dict[str, Any]) -> str:
         target_url = self.generate_article_url(article['url'])
-        title = article['title']
-        
-        post_text = f"""【新着記事】
-{title}
+        return f"""【新着記事】
+{article['title']}
 
 #AI #Tech #ガジェット
 {target_url}"""
 
-        logger.info(f"Starting X promotion for: {title}")
+    async def post_to_x(self, article: Dict[str, Any]) -> bool:
+        """Playwrightを使ってXに投稿する（Cookie対応版）"""
+        posted = await self.post_batch([article])
+        return bool(posted)
+
+    async def post_batch(
+        self,
+        articles: List[Dict[str, Any]],
+        on_posted: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_unconfirmed: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """1つのブラウザ・1回のセッション確認で複数記事を投稿し、投稿できた記事を返す
+
+        on_posted は1件投稿するたびに呼ばれる（途中で失敗しても投稿済みの記録が残るように）。
+        on_unconfirmed は投稿ボタンを押した後に投稿を確認できなかった記事ごとに呼ばれる
+        （投稿されている可能性があるので、失敗として再投稿してはいけない）。
+        """
+        from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+        posted: List[Dict[str, Any]] = []
+        if not articles:
+            return posted
 
         async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=False, slow_mo=50)
+            # browser_service が動いていれば温まったブラウザを借りる（画面表示ありのときは自前で起動）
+            launch = lambda: p.chromium.launch(headless=self.headless)
+            async with browser_lease(p, "x" if self.headless else None, launch) as lease:
+                # ---------------------------------------------------------
+                # 1. コンテキスト作成 (Cookieがあれば読み込む)
+                # ---------------------------------------------------------
+                context_args = {
+                    "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                    "locale": "ja-JP"
+                }
             
-            # ---------------------------------------------------------
-            # 1. コンテキスト作成 (Cookieがあれば読み込む)
-            # ---------------------------------------------------------
-            context_args = {
-                "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "locale": "ja-JP"
-            }
+                if os.path.exists(COOKIE_FILE):
+                    logger.info(f"Cookie file found ({COOKIE_FILE}). Loading session...")
+                    context = await lease.new_context(storage_state=COOKIE_FILE, **context_args)
+                    has_cookie = True
+                else:
+                    logger.info("No cookie file found. Starting fresh session.")
+                    context = await lease.new_context(**context_args)
+                    has_cookie = False
+
+                context.set_default_timeout(60000)
+                page = await context.new_page()
+
+                try:
+                    # ---------------------------------------------------------
+                    # 2. ログイン状態の確認（バッチ全体で1回）
+                    # ---------------------------------------------------------
+                    with tracing.span("x.session_check", has_cookie=has_cookie) as sp:
+                        verified = await self._ensure_session(page, context, has_cookie)
+                        sp.set(verified=verified)
+
+                    # ---------------------------------------------------------
+                    # 3. 投稿処理 (記事ごと)
+                    # ---------------------------------------------------------
+                    for index, article in enumerate(articles):
+                        if index:
+                            await asyncio.sleep(POST_INTERVAL)
+                        logger.info(f"Starting X promotion for: {article['title']} ({index + 1}/{len(articles)})")
+                        started = time.perf_counter()
+                        try:
+                            with tracing.span("x.post", url=article["url"]) as sp, \
+                                    run_context.bind(stage="promote", url=article["url"]):
+                                try:
+                                    await self._compose_and_post(page, self.build_post_text(article))
+                                except SessionInvalidError:
+                                    if verified:
+                                        raise
+                                    # キャッシュ上は有効だったセッションが切れていた: 確認し直して1回だけ再試行
+                                    # （投稿ボタンを押す前なので、二重投稿にはならない）
+                                    logger.warning("Cached session looks invalid. Re-checking session...")
+                                    sp.set(retried=True)
+                                    verified = await self._ensure_session(page, context, has_cookie)
+                                    await self._compose_and_post(page, self.build_post_text(article))
+                        except PostUnconfirmedError as e:
+                            # 押した後のタイムアウトは再試行せず、実際に投稿されたかをタイムラインで確かめる
+                            await page.screenshot(path="debug_error.png")
+                            if not await self._find_recent_post(page, article):
+                                logger.error(f"Post was not confirmed. Needs a manual check: {e}")
+                                POSTS.inc(result="unconfirmed")
+                                if on_unconfirmed:
+                                    on_unconfirmed(article)
+                                continue
+                            logger.warning("Post dialog did not close, but the post is on the timeline.")
+                        except (PlaywrightTimeoutError, SessionInvalidError) as te:
+                            logger.error(f"Timeout Error: {te}")
+                            POSTS.inc(result="failed")
+                            await page.screenshot(path="debug_error.png")
+                            continue
+                        logger.info(f"Successfully posted to X! ({time.perf_counter() - started:.1f}s)")
+                        POSTS.inc(result="posted")
+                        posted.append(article)
+                        if on_posted:
+                            on_posted(article)
+
+                except PlaywrightTimeoutError as te:
+                    logger.error(f"Timeout Error: {te}")
+                    await page.screenshot(path="debug_error.png")
+                except Exception as e:
+                    logger.error(f"Unexpected Error: {e}")
+                    await page.screenshot(path="debug_error.png")
+
+        return posted
+
+    async def _ensure_session(self, page: Page, context: BrowserContext, has_cookie: bool) -> bool:
+        """ログイン済みの状態にする（TTL内に確認済みのCookieならホーム画面での確認を省く）
+
+        実際に確認した場合は True、キャッシュを信用して省いた場合は False を返す。
+        """
+        if has_cookie and _session_recently_validated():
+            logger.info("Session was validated recently. Skipped session check.")
+            return False
+
+        logged_in = False
+        if has_cookie:
+            logger.info("Navigating to Home page with cookies...")
+            await page.goto(HOME_URL, wait_until="domcontentloaded")
             
-            if os.path.exists(COOKIE_FILE):
-                logger.info(f"Cookie file found ({COOKIE_FILE}). Loading session...")
-                context = await browser.new_context(storage_state=COOKIE_FILE, **context_args)
-                has_cookie = True
-            else:
-                logger.info("No cookie file found. Starting fresh session.")
-                context = await browser.new_context(**context_args)
-                has_cookie = False
-
-            context.set_default_timeout(60000)
-            page = await context.new_page()
-
             try:
-                # ---------------------------------------------------------
-                # 2. ログイン状態の確認
-                # ---------------------------------------------------------
+                # 投稿ボタンが表示されればログイン成功とみなす
+                await page.wait_for_selector(NEW_TWEET_BUTTON, timeout=10000)
+                logger.info("Session is valid. Skipped login process.")
+                logged_in = True
+            except Exception:
+                logger.warning("Session expired or invalid. Falling back to manual login.")
                 logged_in = False
-                
-                if has_cookie:
-                    logger.info("Navigating to Home page with cookies...")
-                    await page.goto("https://x.com/home", wait_until="domcontentloaded")
-                    
-                    try:
-                        # 投稿ボタンが表示されればログイン成功とみなす
-                        await page.wait_for_selector('[data-testid="SideNav_NewTweet_Button"]', timeout=10000)
-                        logger.info("Session is valid. Skipped login process.")
-                        logged_in = True
-                    except Exception:
-                        logger.warning("Session expired or invalid. Falling back to manual login.")
-                        logged_in = False
-                
-                # ---------------------------------------------------------
-                # 3. 未ログインならログイン処理を実行 (従来フロー)
-                # ---------------------------------------------------------
-                if not logged_in:
-                    logger.info("Starting manual login process...")
-                    await self._perform_login(page)
-                    
-                    # ログイン成功後、Cookieを保存しておく
-                    logger.info(f"Login successful. Saving cookies to {COOKIE_FILE}...")
-                    await context.storage_state(path=COOKIE_FILE)
+        
+        # 未ログインならログイン処理を実行 (従来フロー)
+        if not logged_in:
+            logger.info("Starting manual login process...")
+            await self._perform_login(page)
+            
+            # ログイン成功後、Cookieを保存しておく
+            logger.info(f"Login successful. Saving cookies to {COOKIE_FILE}...")
+            await context.storage_state(path=COOKIE_FILE)
 
-                # ---------------------------------------------------------
-                # 4. 投稿処理 (共通フロー)
-                # ---------------------------------------------------------
-                logger.info("Proceeding to tweet composition...")
-                
-                # ツイート作成ボタンクリック
-                await page.click('[data-testid="SideNav_NewTweet_Button"]')
-                
-                # ダイアログ待機
-                textarea_selector = '[data-testid="tweetTextarea_0"]'
-                await page.wait_for_selector(textarea_selector, state='visible')
-                
-                # テキスト入力
-                logger.info("Typing tweet content...")
-                await page.click(textarea_selector)
-                await page.keyboard.type(post_text, delay=50) 
-                await asyncio.sleep(2)
-
-                # 投稿ボタン押下
-                logger.info("Clicking post button...")
-                post_button_selector = '[data-testid="tweetButton"]'
-                await page.wait_for_selector(post_button_selector, state='visible')
-                await page.click(post_button_selector)
-                
-                # 送信完了待機
-                await asyncio.sleep(5)
-                logger.info("Successfully posted to X!")
-                
-                return True
-
-            except PlaywrightTimeoutError as te:
-                logger.error(f"Timeout Error: {te}")
-                await page.screenshot(path="debug_error.png")
-                return False
-            except Exception as e:
-                logger.error(f"Unexpected Error: {e}")
-                await page.screenshot(path="debug_error.png")
-                return False
-            finally:
-                await browser.close()
+        _remember_session_validated()
+        return True
+
+    async def _compose_and_post(self, page: Page, post_text: str):
+        """投稿画面を直接開き、本文をまとめて入力して投稿する
+
+        入力欄が出てこなければ SessionInvalidError、投稿ボタンを押した後に送信完了を
+        確認できなければ PostUnconfirmedError を投げる。
+        """
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        await page.goto(COMPOSE_URL, wait_until="domcontentloaded")
+        try:
+            await page.wait_for_selector(TEXTAREA_SELECTOR, state='visible', timeout=15000)
+        except PlaywrightTimeoutError as e:
+            # キャッシュ上は有効でもセッションが切れていた場合
+            _forget_session_validation()
+            raise SessionInvalidError(str(e)) from e
+
+        # 1文字ずつのキー入力ではなく、テキストを一度に挿入する
+        await page.click(TEXTAREA_SELECTOR)
+        await page.keyboard.insert_text(post_text)
+
+        # 投稿ボタンが有効になったら押し、ダイアログが閉じる（＝送信完了）まで待つ
+        await page.click(POST_BUTTON_SELECTOR)
+        try:
+            await page.wait_for_selector(TEXTAREA_SELECTOR, state='detached', timeout=15000)
+        except PlaywrightTimeoutError as e:
+            raise PostUnconfirmedError(str(e)) from e
+
+    async def _find_recent_post(self, page: Page, article: Dict[str, Any]) -> bool:
+        """自分のプロフィールのタイムラインに、この記事のタイトルを含む投稿があるか"""
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        try:
+            await page.goto(f"https://x.com/{X_USERNAME.lstrip('@')}", wait_until="domcontentloaded")
+            await page.wait_for_selector(TWEET_TEXT_SELECTOR, timeout=15000)
+            return await page.locator(TWEET_TEXT_SELECTOR, has_text=article["title"]).count() > 0
+        except PlaywrightTimeoutError:
+            return False
 
     async def _perform_login(self, page: Page):
         """ログイン処理の実装 (未ログイン時のみ呼ばれる)"""
@@ -258,37 +401,62 @@ class XPromoter:
         await page.wait_for_selector('[data-testid="SideNav_NewTweet_Button"]', timeout=30000)
 
 # ==========================================
-# 3. Main Execution Flow
+# 4. Main Execution Flow
 # ==========================================
-async def main():
+async def main(batch_size: int = PROMOTE_BATCH_SIZE):
     logger.info("Starting X Promotion Pipeline...")
 
     # DBハンドラの初期化
     db = DatabaseHandler(DB_PATH)
-    
-    # 投稿候補の取得
-    article = db.fetch_candidate_article()
-    
-    if not article:
-        logger.info("No articles available for promotion. Exiting.")
-        return
-
-    logger.info(f"Candidate article found: {article['title']}")
+    scheduler = PromotionScheduler(DB_PATH)
 
-    # Xへの投稿処理
     try:
-        promoter = XPromoter()
-        success = await promoter.post_to_x(article)
+        # 投稿候補の取得: キューを更新して空いている枠を埋め、時刻を過ぎた枠の記事を取り出す
+        scheduler.sync()
+        scheduler.plan()
+        articles = scheduler.due(batch_size)
+        
+        if not articles:
+            logger.info("No articles scheduled for promotion at this time. Exiting.")
+            return
 
-        if success:
+        logger.info(f"{len(articles)} scheduled article(s) found: {articles[0]['title']}")
+
+        # Xへの投稿処理（1つのブラウザセッションでまとめて投稿）
+        def on_posted(article: Dict[str, Any]):
             db.mark_as_promoted(article['url'])
-        else:
-            logger.error("Promotion failed. Check debug_error.png.")
+            scheduler.mark_posted(article['url'])
+
+        # 投稿されたか分からない記事は再投稿しない（二重投稿を避ける）。手で確かめるまで止めておく
+        unconfirmed_urls = set()
+
+        def on_unconfirmed(article: Dict[str, Any]):
+            unconfirmed_urls.add(article['url'])
+            scheduler.mark_unconfirmed(article['url'])
+
+        promoter = XPromoter()
+        posted = await promoter.post_batch(articles, on_posted=on_posted, on_unconfirmed=on_unconfirmed)
+
+        done_urls = {article['url'] for article in posted} | unconfirmed_urls
+        failed = [article for article in articles if article['url'] not in done_urls]
+        for article in failed:
+            scheduler.mark_failed(article['url'])
+        if failed:
+            logger.error(f"Promotion failed for {len(failed)} article(s). Check debug_error.png.")
+        if unconfirmed_urls:
+            logger.error(
+                f"{len(unconfirmed_urls)} post(s) could not be confirmed and will not be retried. "
+                "Check the timeline, then run: python promotion_scheduler.py resolve <url> posted|retry"
+            )
 
     except ValueError as e:
         logger.error(f"Configuration error: {e}")
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
+    finally:
+        scheduler.close()
 
 if __name__ == "__main__":
+    from utils.log_setup import setup_logging
+    setup_logging("promote_on_x")
     asyncio.run(main())
\ No newline at end of file
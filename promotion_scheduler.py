@@ -0,0 +1,333 @@
+"""
+X 投稿のスケジューラ
+
+投稿待ちの記事に優先度スコア（新しさ・カテゴリ・本文の長さ）を付けて promotion_queue テーブルに
+積み、1日の投稿枠（時刻と件数）に割り当てた計画を promotion_plan テーブルに保存する。
+promote_on_x.py は実行のたびに「時刻を過ぎた枠」の記事だけを投稿するので、
+1日に何回実行しても前回の続きから投稿される。
+
+キューの取り出しはスコア順の部分インデックスを使うので、待ち記事が何千件あっても
+O(log n) で済む（全件ソートしない）。
+
+    python promotion_scheduler.py plan --dry-run   # 計画だけ表示（DBは変えない）
+    python promotion_scheduler.py plan             # 計画を作って保存
+    python promotion_scheduler.py show             # 保存済みの計画を表示
+    python promotion_scheduler.py resolve URL posted  # 投稿を確認できなかった記事を手で確かめた結果を記録
+"""
+import argparse
+import math
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+DB_PATH = "seo_content.db"
+
+# 投稿枠 "HH:MM=件数" のカンマ区切り（PROMOTION_TZ_OFFSET 時間のタイムゾーン、既定は日本時間）
+PROMOTION_SLOTS = os.getenv("PROMOTION_SLOTS", "09:00=2,12:30=1,18:00=2,21:00=1")
+PROMOTION_TZ_OFFSET = int(os.getenv("PROMOTION_TZ_OFFSET", "9"))
+# 何日先まで計画を立てるか
+PLAN_HORIZON_DAYS = int(os.getenv("PROMOTION_PLAN_DAYS", "2"))
+# 投稿に失敗した記事を何回まで計画し直すか
+MAX_ATTEMPTS = 3
+
+# スコアの重み: 新しさ（半減期つき）・カテゴリ・本文の長さ
+FRESHNESS_HALF_LIFE_HOURS = 72
+CATEGORY_WEIGHTS = {"AI Tool": 1.0, "Tech News": 0.8, "Gadget": 0.7}
+DEFAULT_CATEGORY_WEIGHT = 0.5
+# この文字数以上の記事は長さの点で満点
+LENGTH_TARGET = 4000
+SCORE_WEIGHTS = {"freshness": 0.5, "category": 0.3, "length": 0.2}
+
+ARTICLE_FILTER = "p.generated_body IS NOT NULL AND p.generated_body != ''"
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+
+def score_article(scraped_at, category, body_length, now=None):
+    """0〜1 の優先度スコア（大きいほど先に投稿する）"""
+    now = now or datetime.now()
+    try:
+        age_hours = max(0.0, (now - datetime.fromisoformat(scraped_at)).total_seconds() / 3600)
+        freshness = math.pow(0.5, age_hours / FRESHNESS_HALF_LIFE_HOURS)
+    except (TypeError, ValueError):
+        freshness = 0.0
+    category_weight = CATEGORY_WEIGHTS.get(category, DEFAULT_CATEGORY_WEIGHT)
+    length = min(1.0, (body_length or 0) / LENGTH_TARGET)
+    return (
+        SCORE_WEIGHTS["freshness"] * freshness
+        + SCORE_WEIGHTS["category"] * category_weight
+        + SCORE_WEIGHTS["length"] * length
+    )
+
+
+def parse_slots(spec=PROMOTION_SLOTS):
+    """"09:00=2,18:00=1" → [((9, 0), 2), ((18, 0), 1)]"""
+    slots = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        clock, _, quota = item.partition("=")
+        hour, minute = (int(part) for part in clock.split(":"))
+        slots.append(((hour, minute), int(quota or 1)))
+    return sorted(slots)
+
+
+def upcoming_slots(now_utc, days=PLAN_HORIZON_DAYS, spec=PROMOTION_SLOTS):
+    """今日から days 日分の投稿枠を (UTCの時刻文字列, 件数) で時刻順に返す（過ぎた枠も今日の分は含む）"""
+    tz = timezone(timedelta(hours=PROMOTION_TZ_OFFSET))
+    today = now_utc.astimezone(tz).date()
+    slots = []
+    for offset in range(days):
+        day = today + timedelta(days=offset)
+        for (hour, minute), quota in parse_slots(spec):
+            local = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+            slots.append((local.astimezone(timezone.utc).strftime(TIME_FORMAT), quota))
+    return slots
+
+
+def _utc_now():
+    return datetime.now(timezone.utc)
+
+
+class PromotionScheduler:
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.create_function("promotion_score", 3, score_article)
+        self._ensure_tables()
+
+    def close(self):
+        self.conn.close()
+
+    def _ensure_tables(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS promotion_queue (
+                url TEXT PRIMARY KEY,
+                score REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',  -- pending / planned / posted / failed / unconfirmed
+                attempts INTEGER NOT NULL DEFAULT 0,
+                enqueued_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            -- 待ち記事をスコア順に取り出すための部分インデックス
+            CREATE INDEX IF NOT EXISTS idx_promotion_queue_pending
+                ON promotion_queue(score DESC, url) WHERE status = 'pending';
+            CREATE TABLE IF NOT EXISTS promotion_plan (
+                slot_at TEXT NOT NULL,  -- UTC の YYYY-MM-DDTHH:MM
+                position INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'planned',  -- planned / posted / failed / unconfirmed
+                PRIMARY KEY (slot_at, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_promotion_plan_due
+                ON promotion_plan(slot_at, position) WHERE status = 'planned';
+        """)
+        self.conn.commit()
+
+    # ---------------------------------------------------------
+    # キュー
+    # ---------------------------------------------------------
+    def sync(self, commit=True):
+        """products の投稿待ち記事をキューに反映し、待ち記事のスコアを付け直す"""
+        # 新しく記事になったものを追加（スコアはSQLiteに登録した関数で計算）
+        added = self.conn.execute(f"""
+            INSERT OR IGNORE INTO promotion_queue (url, score)
+            SELECT p.url, promotion_score(p.scraped_at, p.category, LENGTH(p.generated_body))
+            FROM products p
+            WHERE {ARTICLE_FILTER} AND COALESCE(p.promoted, 0) = 0
+        """).rowcount
+        # 他の経路で投稿済み・削除済みになった記事は外す
+        self.conn.execute("""
+            UPDATE promotion_queue SET status = 'posted'
+            WHERE status IN ('pending', 'planned')
+              AND url IN (SELECT url FROM products WHERE promoted = 1)
+        """)
+        self.conn.execute("""
+            DELETE FROM promotion_queue
+            WHERE status IN ('pending', 'planned')
+              AND url NOT IN (SELECT url FROM products WHERE generated_body IS NOT NULL AND generated_body != '')
+        """)
+        self.conn.execute("""
+            DELETE FROM promotion_plan
+            WHERE status = 'planned'
+              AND url NOT IN (SELECT url FROM promotion_queue WHERE status = 'planned')
+        """)
+        # 新しさは時間とともに下がるので、待ち記事のスコアを今の時刻で計算し直す
+        self.conn.execute("""
+            UPDATE promotion_queue
+            SET score = (
+                SELECT promotion_score(p.scraped_at, p.category, LENGTH(p.generated_body))
+                FROM products p WHERE p.url = promotion_queue.url
+            )
+            WHERE status = 'pending'
+        """)
+        if commit:
+            self.conn.commit()
+        return added
+
+    def pop(self, count):
+        """スコアの高い待ち記事を count 件取り出す（インデックスの先頭から読むだけ）"""
+        return self.conn.execute("""
+            SELECT url, score FROM promotion_queue
+            WHERE status = 'pending'
+            ORDER BY score DESC, url LIMIT ?
+        """, (count,)).fetchall()
+
+    # ---------------------------------------------------------
+    # 計画
+    # ---------------------------------------------------------
+    def plan(self, now_utc=None, days=PLAN_HORIZON_DAYS, dry_run=False):
+        """これからの投稿枠の空きに、スコアの高い記事から割り当てる
+
+        保存済みの計画は変えずに空いている分だけ埋める。(枠, url, スコア) のリストを返す。
+        dry_run なら DB を変更しない。
+        """
+        now_utc = now_utc or _utc_now()
+        now_key = now_utc.strftime(TIME_FORMAT)
+        # 枠ごとの使用中の position（sync() が計画を消すと間が空くので、件数ではなく番号で見る）
+        used = {}
+        for slot_at, position in self.conn.execute(
+            "SELECT slot_at, position FROM promotion_plan WHERE slot_at >= ?", (now_key,)
+        ):
+            used.setdefault(slot_at, set()).add(position)
+
+        openings = []
+        for slot_at, quota in upcoming_slots(now_utc, days):
+            # 過ぎた枠には新しく割り当てない（割り当て済みの分は due() で拾われる）
+            if slot_at < now_key:
+                continue
+            taken = used.get(slot_at, set())
+            free = [position for position in range(quota) if position not in taken]
+            openings.extend((slot_at, position) for position in free[:max(0, quota - len(taken))])
+
+        candidates = self.pop(len(openings))
+        assignments = [
+            (slot_at, position, url, score)
+            for (slot_at, position), (url, score) in zip(openings, candidates)
+        ]
+        if not dry_run and assignments:
+            self.conn.executemany(
+                "INSERT INTO promotion_plan (slot_at, position, url) VALUES (?, ?, ?)",
+                [(slot_at, position, url) for slot_at, position, url, _ in assignments],
+            )
+            self.conn.executemany(
+                "UPDATE promotion_queue SET status = 'planned' WHERE url = ?",
+                [(url,) for _, _, url, _ in assignments],
+            )
+            self.conn.commit()
+        return [(slot_at, url, score) for slot_at, _, url, score in assignments]
+
+    def due(self, limit, now_utc=None):
+        """時刻を過ぎた枠の記事を、古い枠から limit 件返す（前回の実行で残った分も含む）"""
+        now_key = (now_utc or _utc_now()).strftime(TIME_FORMAT)
+        rows = self.conn.execute("""
+            SELECT pl.url, p.title, p.category
+            FROM promotion_plan pl JOIN products p ON p.url = pl.url
+            WHERE pl.status = 'planned' AND pl.slot_at <= ?
+            ORDER BY pl.slot_at, pl.position LIMIT ?
+        """, (now_key, limit)).fetchall()
+        return [{"url": url, "title": title, "category": category} for url, title, category in rows]
+
+    def mark_posted(self, url):
+        self.conn.execute(
+            "UPDATE promotion_plan SET status = 'posted' WHERE url = ? AND status IN ('planned', 'unconfirmed')", (url,)
+        )
+        self.conn.execute("UPDATE promotion_queue SET status = 'posted' WHERE url = ?", (url,))
+        self.conn.commit()
+
+    def mark_failed(self, url):
+        """失敗した記事は枠から外し、上限回数まではキューに戻して次の計画で割り当て直す"""
+        self.conn.execute("UPDATE promotion_plan SET status = 'failed' WHERE url = ? AND status = 'planned'", (url,))
+        self.conn.execute("""
+            UPDATE promotion_queue
+            SET attempts = attempts + 1,
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+            WHERE url = ?
+        """, (MAX_ATTEMPTS, url))
+        self.conn.commit()
+
+    def mark_unconfirmed(self, url):
+        """投稿ボタンを押したが投稿を確認できなかった記事は、二重投稿を避けるため計画し直さない
+
+        この状態は sync() / plan() では変わらない。実際に投稿されたかを確かめてから resolve() で戻す。
+        """
+        self.conn.execute("UPDATE promotion_plan SET status = 'unconfirmed' WHERE url = ? AND status = 'planned'", (url,))
+        self.conn.execute("UPDATE promotion_queue SET status = 'unconfirmed' WHERE url = ?", (url,))
+        self.conn.commit()
+
+    def unconfirmed(self):
+        """投稿を確認できずに止めている記事 (url, タイトル)"""
+        return self.conn.execute("""
+            SELECT q.url, p.title
+            FROM promotion_queue q LEFT JOIN products p ON p.url = q.url
+            WHERE q.status = 'unconfirmed'
+            ORDER BY q.url
+        """).fetchall()
+
+    def resolve(self, url, posted):
+        """確認待ちの記事を手で確かめた結果を記録する（posted=False ならキューに戻して計画し直す）"""
+        if posted:
+            self.conn.execute("UPDATE products SET promoted = 1 WHERE url = ?", (url,))
+            self.mark_posted(url)
+            return
+        self.conn.execute("UPDATE promotion_plan SET status = 'failed' WHERE url = ? AND status = 'unconfirmed'", (url,))
+        self.conn.execute("UPDATE promotion_queue SET status = 'pending' WHERE url = ? AND status = 'unconfirmed'", (url,))
+        self.conn.commit()
+
+    def saved_plan(self):
+        """まだ投稿していない保存済みの計画 (枠, url, タイトル)"""
+        return self.conn.execute("""
+            SELECT pl.slot_at, pl.url, p.title
+            FROM promotion_plan pl LEFT JOIN products p ON p.url = pl.url
+            WHERE pl.status = 'planned'
+            ORDER BY pl.slot_at, pl.position
+        """).fetchall()
+
+
+def _format_slot(slot_at):
+    tz = timezone(timedelta(hours=PROMOTION_TZ_OFFSET))
+    utc = datetime.strptime(slot_at, TIME_FORMAT).replace(tzinfo=timezone.utc)
+    return utc.astimezone(tz).strftime("%m/%d %H:%M")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="X 投稿のスケジューラ")
+    sub = parser.add_subparsers(dest="command", required=True)
+    plan_parser = sub.add_parser("plan", help="投稿枠に記事を割り当てる")
+    plan_parser.add_argument("--dry-run", action="store_true", help="保存せずに表示だけする")
+    plan_parser.add_argument("--days", type=int, default=PLAN_HORIZON_DAYS)
+    sub.add_parser("show", help="保存済みの計画と、投稿を確認できなかった記事を表示する")
+    resolve_parser = sub.add_parser("resolve", help="投稿を確認できなかった記事を手で確かめた結果を記録する")
+    resolve_parser.add_argument("url")
+    resolve_parser.add_argument("result", choices=("posted", "retry"),
+                                help="posted: 投稿されていた / retry: 投稿されていなかったので計画し直す")
+    args = parser.parse_args()
+
+    scheduler = PromotionScheduler(DB_PATH)
+    try:
+        if args.command == "plan":
+            # dry-run ではキューの同期も最後に巻き戻す
+            scheduler.sync(commit=not args.dry_run)
+            assignments = scheduler.plan(days=args.days, dry_run=args.dry_run)
+            for slot_at, url, score in assignments:
+                print(f"{_format_slot(slot_at)}  {score:.3f}  {url}")
+            pending = scheduler.conn.execute(
+                "SELECT COUNT(*) FROM promotion_queue WHERE status = 'pending'"
+            ).fetchone()[0]
+            label = "would be planned" if args.dry_run else "planned"
+            print(f"📅 {len(assignments)} article(s) {label}, {pending} still waiting")
+            if args.dry_run:
+                scheduler.conn.rollback()
+        elif args.command == "resolve":
+            scheduler.resolve(args.url, posted=args.result == "posted")
+            print(f"✅ {args.url}: {args.result}")
+        else:
+            for slot_at, url, title in scheduler.saved_plan():
+                print(f"{_format_slot(slot_at)}  {title or url}")
+            for url, title in scheduler.unconfirmed():
+                print(f"⚠️ unconfirmed  {title or url}  ({url})")
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+スクレイピング対象サイトの登録簿（宣言的なソース定義）
+
+サイトごとに「どのURLを開くか・どの要素を1件とみなすか・各項目をどのセレクタで取るか」を
+scrape_sources.json（SCRAPE_SOURCES で変更可）に書く。サイトを増やすときはコードではなく
+この JSON に1項目足せばよい。読み込みと検証はプロセスごとに1回だけ行う。
+
+    {"sources": [{
+        "name": "Kakaku",
+        "category": "Gadget",
+        "urls": ["https://kakaku.com/pc/note-pc/ranking_0020/"],
+        "item": ".rkgBox",
+        "limit": 5,
+        "wait_for": ".rkgBox",
+        "fields": {
+            "title": {"selectors": ["a.ckitemLink", "td.textL a"], "required": true, "normalize": true},
+            "url": {"selectors": ["a.ckitemLink", "td.textL a"], "attr": "href", "required": true},
+            "raw_price": {"selectors": [".rkgPrice .yen", ".price"], "remove": ["¥", ","], "default": "Unknown"},
+            "description": {"template": "価格.com ノートPCランキング上位: {title}"},
+            "specs": {"template": "Kakaku.com Ranking #{rank}"}
+        }
+    }]}
+
+item を省くとページ全体を1件として扱う（詳細ページを並べる場合）。
+項目の書き方:
+    selectors  上から順に試し、最初に見つかった要素を使う（querySelector で使える CSS のみ）
+    attr       テキストの代わりに属性値を取る（url の href は開いたページ基準の絶対URLにする）
+    required   見つからなければその1件を捨てる（省略時は default の値になる）
+    remove     取り除く文字列（除去後に前後の空白も落とす）
+    normalize  空白・改行をまとめて1つの空白にする
+    template   取得済みの項目と {rank}（1始まりの順位）・{page_url} から組み立てる
+文字列だけを書いた項目は固定値になる。url を書かなければ開いたページのURLが入る。
+"enabled": false を書いたソースは読み込まない。
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from product_record import ProductRecord
+
+SCRAPE_SOURCES = os.getenv("SCRAPE_SOURCES", "scrape_sources.json")
+
+# ProductRecord に入れる項目（category と scraped_at はエンジンが入れる。それ以外の項目はテンプレート用）
+RECORD_FIELDS = ("url", "title", "description", "raw_price", "image_url", "specs")
+# テンプレートで項目以外に使える値
+TEMPLATE_KEYS = ("rank", "page_url")
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    name: str
+    selectors: Tuple[str, ...] = ()
+    attr: Optional[str] = None
+    required: bool = False
+    default: str = ""
+    remove: Tuple[str, ...] = ()
+    normalize: bool = False
+    template: Optional[str] = None
+
+    def clean(self, value: str, page_url: str) -> str:
+        for text in self.remove:
+            value = value.replace(text, "")
+        if self.remove:
+            value = value.strip()
+        if self.normalize:
+            value = re.sub(r"\s+", " ", value).strip()
+        if self.attr == "href":
+            value = urljoin(page_url, value)
+        return value
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    name: str
+    category: str
+    urls: Tuple[str, ...]
+    fields: Tuple[FieldSpec, ...]
+    item: Optional[str] = None
+    limit: Optional[int] = None
+    wait_for: Optional[str] = None
+    wait_timeout: int = 20000
+    timeout: int = 30000
+
+    @property
+    def extract_plan(self) -> List[Tuple[str, Tuple[str, ...], Optional[str]]]:
+        """ブラウザ側で取る項目: (項目名, セレクタ候補, 属性)"""
+        return [(f.name, f.selectors, f.attr) for f in self.fields if f.selectors]
+
+    def build_record(self, values: Dict[str, Optional[str]], rank: int, page_url: str, scraped_at: str):
+        """ブラウザで取った値から1件分のレコードを作る
+
+        (ProductRecord, None) を返す。必須項目がなければ (None, 見つからなかった項目名)。
+        scraped_at は呼び出し側でまとめて1回だけ作った値を渡す。
+        """
+        record: Dict[str, Any] = {}
+        for f in self.fields:
+            if not f.selectors:
+                continue
+            value = values.get(f.name)
+            if value is None:
+                if f.required:
+                    return None, f.name
+                record[f.name] = f.default
+            else:
+                record[f.name] = f.clean(value, page_url)
+        for f in self.fields:
+            if f.template is not None:
+                record[f.name] = f.template.format(rank=rank, page_url=page_url, **record)
+            elif not f.selectors:
+                record[f.name] = f.default
+
+        return ProductRecord(
+            **{name: record.get(name, page_url if name == "url" else "") for name in RECORD_FIELDS},
+            category=self.category,
+            scraped_at=scraped_at,
+        ), None
+
+
+# ==========================================
+# 読み込み・検証
+# ==========================================
+def _compile_field(source: str, name: str, raw) -> FieldSpec:
+    where = f"source '{source}', field '{name}'"
+    if name in TEMPLATE_KEYS:
+        raise ValueError(f"{where}: '{name}' is reserved for templates")
+    if isinstance(raw, str):
+        return FieldSpec(name=name, default=raw)
+    if not isinstance(raw, dict):
+        raise ValueError(f"{where}: must be a string or an object")
+    unknown = set(raw) - {"selectors", "attr", "required", "default", "remove", "normalize", "template"}
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}")
+
+    selectors = raw.get("selectors", ())
+    if isinstance(selectors, str):
+        selectors = [selectors]
+    template = raw.get("template")
+    if bool(selectors) == (template is not None):
+        raise ValueError(f"{where}: needs either 'selectors' or 'template'")
+    remove = raw.get("remove", ())
+    if isinstance(remove, str):
+        remove = [remove]
+    return FieldSpec(
+        name=name,
+        selectors=tuple(selectors),
+        attr=raw.get("attr"),
+        required=bool(raw.get("required", False)),
+        default=str(raw.get("default", "")),
+        remove=tuple(remove),
+        normalize=bool(raw.get("normalize", False)),
+        template=template,
+    )
+
+
+def compile_source(raw: Dict[str, Any]) -> SourceSpec:
+    """JSON の1項目を検証して SourceSpec にする（誤りは ValueError）"""
+    name = raw.get("name")
+    if not name:
+        raise ValueError(f"source without a name: {raw}")
+    urls = raw.get("urls")
+    if isinstance(urls, str):
+        urls = [urls]
+    if not urls:
+        raise ValueError(f"source '{name}': 'urls' is empty")
+    if not raw.get("category"):
+        raise ValueError(f"source '{name}': 'category' is required")
+
+    fields = tuple(_compile_field(name, field_name, value) for field_name, value in raw.get("fields", {}).items())
+    extracted = {f.name for f in fields if f.selectors}
+    for f in fields:
+        if f.template is None:
+            continue
+        try:
+            keys = {key for _, key, _, _ in Formatter().parse(f.template) if key is not None}
+        except ValueError as e:
+            raise ValueError(f"source '{name}', field '{f.name}': bad template ({e})")
+        unknown = keys - extracted - set(TEMPLATE_KEYS)
+        if unknown:
+            raise ValueError(f"source '{name}', field '{f.name}': template uses unknown fields {sorted(unknown)}")
+
+    limit = raw.get("limit")
+    if limit is not None and int(limit) < 1:
+        raise ValueError(f"source '{name}': 'limit' must be 1 or more")
+    return SourceSpec(
+        name=name,
+        category=raw["category"],
+        urls=tuple(urls),
+        fields=fields,
+        item=raw.get("item"),
+        limit=int(limit) if limit is not None else None,
+        wait_for=raw.get("wait_for"),
+        wait_timeout=int(raw.get("wait_timeout", 20000)),
+        timeout=int(raw.get("timeout", 30000)),
+    )
+
+
+def load_sources(path: str = SCRAPE_SOURCES) -> List[SourceSpec]:
+    """JSON ファイルからソース一覧を読み込んで検証する"""
+    with open(path, encoding="utf-8") as f:
+        raw_sources = json.load(f).get("sources", [])
+    sources = [compile_source(raw) for raw in raw_sources if raw.get("enabled", True)]
+    names = [s.name for s in sources]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate source names in {path}: {duplicates}")
+    return sources
+
+
+_sources = None
+
+
+def get_sources() -> List[SourceSpec]:
+    """登録済みのソース（初回のみ読み込む）"""
+    global _sources
+    if _sources is None:
+        _sources = load_sources()
+    return _sources
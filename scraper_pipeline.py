@@ -1,54 +1,81 @@
+from __future__ import annotations
+
 import asyncio
+import math
+import os
 import random
 import logging
 import sqlite3
-import re
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
-import pandas as pd
-from playwright.async_api import async_playwright, Page, TimeoutError as PlaywrightTimeoutError
+
+from browser_service import STEALTH_ARGS, browser_lease
+from product_record import ProductRecord
+from scrape_sources import SourceSpec, get_sources
+from utils import metrics, run_context, tracing
+
+# pandas / Playwright は重いので、実際に使うステージで読み込む
+if TYPE_CHECKING:
+    import pandas as pd
+    from playwright.async_api import BrowserContext, Page
 
 # ==========================================
 # 0. Configuration & Logging Setup
+# （ログの出力先は utils.log_setup。実行時に setup_logging で設定する）
 # ==========================================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("pipeline_error.log", mode='a', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+# 2以上なら URL をホストごとに振り分けて複数プロセス（それぞれ別のブラウザ）で取得する
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "1"))
+
+# ページ内で全項目を取り出すスクリプト（セレクタ候補は上から順に試す）
+# 戻り値: [item に一致した要素数, limit 件分の {項目名: テキスト or 属性値 or null}]
+EXTRACT_JS = """
+([itemSelector, limit, plan]) => {
+    const roots = itemSelector ? Array.from(document.querySelectorAll(itemSelector)) : [document];
+    const items = roots.slice(0, limit || roots.length).map((root) => {
+        const values = {};
+        for (const [name, selectors, attr] of plan) {
+            values[name] = null;
+            for (const selector of selectors) {
+                const el = root.querySelector(selector);
+                if (el) {
+                    values[name] = attr ? el.getAttribute(attr) : el.innerText;
+                    break;
+                }
+            }
+        }
+        return values;
+    });
+    return [roots.length, items];
+}
+"""
+
 @dataclass
 class ScraperConfig:
-    base_url: str
-    target_urls: List[str]
-    selectors: Dict[str, str]
+    # None なら登録簿（scrape_sources.json）のソースを使う
+    sources: Optional[List[SourceSpec]] = None
     db_path: str = "seo_content.db"
     max_retries: int = 3
-
-# FutureTools用の設定（既存維持）
-CONFIG = ScraperConfig(
-    base_url="https://www.futuretools.io",
-    target_urls=[
-        "https://www.futuretools.io/tools/chatgpt",
-        "https://www.futuretools.io/tools/midjourney",
-        "https://www.futuretools.io/tools/notion-ai",
-    ],
-    selectors={
-        "title": "h1",
-        "description": ".rich-text-block",
-        "price": ".pricing-category",
-        "image": ".main-image",
-        "specs_table": ".tags-container",
-        "product_container": "body",
-        "link": "a",
-        "next_pagination": ".next"
-    }
+    # ページ遷移後の待機時間（秒）の範囲
+    delay_range: Tuple[float, float] = (1.0, 3.0)
+    # 同時に開くページ数（ソース単位で並行に取得する）
+    concurrency: int = SCRAPE_CONCURRENCY
+
+CONFIG = ScraperConfig()
+
+PAGES = metrics.counter("seo_scrape_pages_total", "開いたページ数（status: ok / failed）", ("source", "status"))
+BYTES = metrics.counter("seo_scrape_bytes_total", "ダウンロードしたページ本文のバイト数", ("source",))
+ITEMS = metrics.counter("seo_scrape_items_total", "抽出した件数（status: ok / skipped）", ("source", "status"))
+SELECTOR_FAILURES = metrics.counter(
+    "seo_scrape_selector_failures_total",
+    "セレクタ候補のどれにも一致しなかった回数（field=wait_for は一覧の待機タイムアウト）",
+    ("source", "field"),
 )
+PAGE_SECONDS = metrics.histogram("seo_scrape_page_duration_seconds", "1ページの取得にかかった時間", ("source",))
+ROWS = metrics.counter("seo_storage_rows_total", "保存したレコード（result: changed / unchanged）", ("table", "result"))
 
 # ---------------------------------------------------------
 # Security Evasion: Modern User-Agents List
@@ -66,296 +93,149 @@ USER_AGENTS = [
 # 1. Scraper Class (Playwright / Async)
 # ==========================================
 class Scraper:
-    def __init__(self, config: ScraperConfig):
+    def __init__(self, config: ScraperConfig, on_records: Optional[Callable[[List[ProductRecord]], None]] = None):
+        """on_records を渡すと、ページごとの結果をその場で渡し data_buffer には溜めない"""
         self.config = config
-        self.data_buffer: List[Dict[str, Any]] = []
+        self.sources = config.sources if config.sources is not None else get_sources()
+        self.on_records = on_records
+        self.data_buffer: List[ProductRecord] = []
+        # 取得日時は run() ごとに1回だけ作り、全レコードで同じ文字列を共有する
+        self.scraped_at = ""
+        self.pages_done = 0
+        self.pages_failed = 0
+        self._slots: Optional[asyncio.Semaphore] = None
 
     def _get_random_ua(self) -> str:
         return random.choice(USER_AGENTS)
 
     async def _human_like_delay(self):
         """1秒〜3秒のランダム待機で人間らしさを演出"""
-        await asyncio.sleep(random.uniform(1.0, 3.0))
-
-    # ---------------------------------------------------------
-    # 既存機能 1: FutureTools
-    # ---------------------------------------------------------
-    async def extract_future_tools(self, page: Page, url: str) -> Optional[Dict[str, Any]]:
-        try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            await self._human_like_delay()
-
-            s = self.config.selectors
-
-            if await page.locator(s["title"]).count() > 0:
-                title = await page.locator(s["title"]).first.inner_text()
-            else:
-                logger.warning(f"[FutureTools] Title not found for {url}")
-                return None
-
-            description = ""
-            if await page.locator(s["description"]).count() > 0:
-                description = await page.locator(s["description"]).first.inner_text()
-
-            price_text = ""
-            if await page.locator(s["price"]).count() > 0:
-                price_text = await page.locator(s["price"]).first.inner_text()
-            
-            specs = ""
-            if await page.locator(s["specs_table"]).count() > 0:
-                specs = await page.locator(s["specs_table"]).first.inner_text()
-
-            logger.info(f"[FutureTools] Scraped: {title}")
-
-            return {
-                "url": url,
-                "title": title,
-                "description": description,
-                "raw_price": price_text,
-                "image_url": "",
-                "specs": specs,
-                "category": "AI Tool",
-                "scraped_at": datetime.now().isoformat()
-            }
-
-        except Exception as e:
-            logger.error(f"[FutureTools] Failed to scrape {url}: {e}")
-            return None
+        await asyncio.sleep(random.uniform(*self.config.delay_range))
+
+    async def _navigate(self, page: Page, url: str, source: str, timeout: int):
+        """ページ遷移（トレースのスパンつき）"""
+        with tracing.span("scrape.navigate", url=url, source=source) as sp:
+            response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+            if response is not None:
+                size = int(response.headers.get("content-length") or 0)
+                if not size:
+                    # chunked 転送などで Content-Length がないときは実際に受け取った大きさ
+                    try:
+                        size = (await response.request.sizes())["responseBodySize"]
+                    except Exception:
+                        size = 0
+                sp.set(status=response.status, bytes=size)
+                BYTES.inc(size, source=source)
 
     # ---------------------------------------------------------
-    # 既存機能 2: Zenn
+    # ソースごとの取得（scrape_sources の定義に従う汎用エンジン）
     # ---------------------------------------------------------
-    async def scrape_zenn_trends(self, page: Page) -> List[Dict[str, Any]]:
-        zenn_url = "https://zenn.dev"
-        zenn_data = []
-        
-        try:
-            logger.info("[Zenn] Starting trend scraping...")
-            await page.goto(zenn_url, wait_until="domcontentloaded", timeout=30000)
-            await self._human_like_delay()
-
-            articles = page.locator("article")
-            count = await articles.count()
-            logger.info(f"[Zenn] Found {count} articles.")
-
-            for i in range(min(count, 10)):
-                try:
-                    article_row = articles.nth(i)
-                    
-                    title_el = article_row.locator("h2")
-                    if await title_el.count() == 0:
-                        continue
-                    title = await title_el.first.inner_text()
-
-                    link_el = article_row.locator("a[href^='/']").first
-                    if await link_el.count() == 0:
+    async def scrape_source(self, context: BrowserContext, source: SourceSpec) -> List[ProductRecord]:
+        """1つのソースの全URLを専用のページで順に取得する（失敗したURLは飛ばす）"""
+        records: List[ProductRecord] = []
+        async with self._slots:
+            page = await context.new_page()
+            try:
+                for url in source.urls:
+                    try:
+                        with run_context.bind(stage="scrape", url=url), PAGE_SECONDS.time(source=source.name):
+                            page_records = await self._scrape_page(page, source, url)
+                    except Exception as e:
+                        with run_context.bind(stage="scrape", url=url):
+                            logger.error(f"[{source.name}] Failed to scrape {url}: {e}")
+                        self.pages_failed += 1
+                        PAGES.inc(source=source.name, status="failed")
                         continue
-                    
-                    href = await link_el.get_attribute("href")
-                    full_url = f"https://zenn.dev{href}"
-
-                    description = f"Zennのトレンド記事: {title}"
-
-                    zenn_data.append({
-                        "url": full_url,
-                        "title": title,
-                        "description": description,
-                        "raw_price": "Free",
-                        "image_url": "",
-                        "specs": "Tech Trend",
-                        "category": "Tech News",
-                        "scraped_at": datetime.now().isoformat()
-                    })
-                    logger.info(f"[Zenn] Picked: {title[:20]}...")
-
-                except Exception as e:
-                    logger.warning(f"[Zenn] Error scraping article index {i}: {e}")
-                    continue
-
-        except Exception as e:
-            logger.error(f"[Zenn] Top page scraping failed: {e}")
-
-        return zenn_data
-
-    # ---------------------------------------------------------
-    # 新機能 3: 価格.com ノートPCランキング (セレクタ強化版)
-    # ---------------------------------------------------------
-    async def scrape_kakaku_ranking(self, page: Page) -> List[Dict[str, Any]]:
-        """
-        価格.comのノートPCランキングからデータを取得する。
-        URL: https://kakaku.com/pc/note-pc/ranking_0020/
-        
-        【修正点】
-        - 複数のセレクタを順次試して、リンクと価格を確実に取得する
-        - エラーがあってもスキップして続行する
-        """
-        kakaku_url = "https://kakaku.com/pc/note-pc/ranking_0020/"
-        gadget_data = []
-
-        try:
-            logger.info("[Kakaku] Visiting Note PC Ranking...")
-            
-            # ページ遷移
-            await page.goto(kakaku_url, wait_until="domcontentloaded", timeout=60000)
-            
-            # 商品ボックス (.rkgBox) が表示されるまで待機
+                    self.pages_done += 1
+                    PAGES.inc(source=source.name, status="ok")
+                    if self.on_records is not None:
+                        self.on_records(page_records)
+                    else:
+                        records.extend(page_records)
+            finally:
+                await page.close()
+        return records
+
+    async def _scrape_page(self, page: Page, source: SourceSpec, url: str) -> List[ProductRecord]:
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+        await self._navigate(page, url, source.name, source.timeout)
+        if source.wait_for:
+            # 一覧の要素が描画されるまで待つ
             try:
-                await page.wait_for_selector(".rkgBox", timeout=20000)
+                with tracing.span("scrape.wait_for_selector", url=url, selector=source.wait_for):
+                    await page.wait_for_selector(source.wait_for, timeout=source.wait_timeout)
             except PlaywrightTimeoutError:
                 title = await page.title()
-                logger.error(f"[Kakaku] Wait timeout. Page structure might be different. Title: {title}")
+                logger.error(f"[{source.name}] Wait timeout. Page structure might be different. Title: {title}")
+                SELECTOR_FAILURES.inc(source=source.name, field="wait_for")
                 return []
-
-            await self._human_like_delay()
-
-            # 商品ボックスを全て取得
-            boxes = page.locator(".rkgBox")
-            count = await boxes.count()
-            limit = min(count, 5) # 上位5件
-            
-            logger.info(f"[Kakaku] Found {count} items. Fetching top {limit}...")
-
-            for i in range(limit):
-                try:
-                    # i番目のボックスを取得
-                    box = boxes.nth(i)
-
-                    # -------------------------------------------------
-                    # 1. 商品名とリンクの取得 (Multi-Selector Trial)
-                    # -------------------------------------------------
-                    link_el = None
-                    
-                    # 候補リスト: 上から順に試す
-                    selectors_to_try = [
-                        "a.ckitemLink",         # パターン1: 一般的な商品リンク
-                        ".rankingItemName a",   # パターン2: ランキング用クラス
-                        ".ranking-read a",      # パターン3: 別レイアウト
-                        "td.textL a",           # パターン4: テーブル構造
-                        "a[href*='/item/']"     # パターン5: 最終手段 (URLの一部)
-                    ]
-
-                    for sel in selectors_to_try:
-                        candidate = box.locator(sel).first
-                        if await candidate.count() > 0:
-                            link_el = candidate
-                            # logger.info(f"[Kakaku] Rank {i+1}: Found link via '{sel}'")
-                            break
-                    
-                    if not link_el:
-                        logger.warning(f"[Kakaku] Rank {i+1}: Link element not found (Skipping).")
-                        continue
-                        
-                    raw_title = await link_el.inner_text()
-                    href = await link_el.get_attribute("href")
-                    
-                    # テキストクリーニング
-                    title = raw_title.replace('\n', ' ').strip()
-                    title = re.sub(r'\s+', ' ', title)
-
-                    # -------------------------------------------------
-                    # 2. 価格の取得 (Multi-Selector Trial)
-                    # -------------------------------------------------
-                    price_el = None
-                    price_selectors = [
-                        ".rkgPrice .yen",
-                        ".price .yen",
-                        "span.yen",
-                        ".price"
-                    ]
-                    
-                    raw_price = "Unknown"
-                    for sel in price_selectors:
-                        candidate = box.locator(sel).first
-                        if await candidate.count() > 0:
-                            price_text = await candidate.inner_text()
-                            # ¥マークやカンマを除去
-                            raw_price = price_text.replace("¥", "").replace(",", "").strip()
-                            break
-
-                    description = f"価格.com ノートPCランキング上位: {title}"
-
-                    gadget_data.append({
-                        "url": href,
-                        "title": title,
-                        "description": description,
-                        "raw_price": raw_price,
-                        "image_url": "",
-                        "specs": f"Kakaku.com Ranking #{i+1}",
-                        "category": "Gadget",
-                        "scraped_at": datetime.now().isoformat()
-                    })
-                    
-                    logger.info(f"[Kakaku] Picked Rank {i+1}: {title[:30]}...")
-
-                except Exception as e:
-                    logger.warning(f"[Kakaku] Error scraping rank {i+1}: {e}")
+        await self._human_like_delay()
+
+        with tracing.span("scrape.extract", url=url, source=source.name) as sp:
+            # 全項目をブラウザ側で1回の呼び出しで取る（要素ごとの往復をしない）
+            found, items = await page.evaluate(EXTRACT_JS, [source.item, source.limit, source.extract_plan])
+            records = []
+            plan = source.extract_plan
+            for rank, values in enumerate(items, start=1):
+                for name, _selectors, _attr in plan:
+                    if values.get(name) is None:
+                        SELECTOR_FAILURES.inc(source=source.name, field=name)
+                record, missing = source.build_record(values, rank, url, self.scraped_at)
+                if record is None:
+                    logger.warning(f"[{source.name}] Item {rank} on {url}: '{missing}' not found (Skipping).")
                     continue
+                records.append(record)
+            sp.set(found=found, items=len(records), skipped=len(items) - len(records))
+            ITEMS.inc(len(records), source=source.name, status="ok")
+            ITEMS.inc(len(items) - len(records), source=source.name, status="skipped")
 
-        except Exception as e:
-            logger.error(f"[Kakaku] Scraping failed: {e}")
-
-        return gadget_data
+        logger.info(f"[{source.name}] Scraped {len(records)} of {found} items from {url}")
+        return records
 
     # ---------------------------------------------------------
     # パイプライン実行メインフロー
     # ---------------------------------------------------------
-    async def run(self) -> List[Dict[str, Any]]:
+    async def run(self) -> List[ProductRecord]:
+        from playwright.async_api import async_playwright
+
+        self.scraped_at = datetime.now().isoformat()
         async with async_playwright() as p:
             # -----------------------------------------------------
             # Advanced Stealth Configuration
+            # （browser_service が動いていれば温まったブラウザを借りる）
             # -----------------------------------------------------
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--no-sandbox',
-                    '--disable-infobars',
-                    '--disable-dev-shm-usage',
-                    '--disable-extensions',
-                    '--disable-gpu'
-                ]
-            )
-            
-            context = await browser.new_context(
-                user_agent=self._get_random_ua(),
-                locale='ja-JP',
-                timezone_id='Asia/Tokyo',
-                viewport={'width': 1280, 'height': 720},
-                java_script_enabled=True,
-                extra_http_headers={
-                    'referer': 'https://www.google.com/'
-                },
-                permissions=['geolocation']
-            )
-            
-            await context.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                });
-            """)
-
-            page = await context.new_page()
-
-            # 1. FutureTools
-            for target_url in self.config.target_urls:
-                try:
-                    data = await self.extract_future_tools(page, target_url)
-                    if data:
-                        self.data_buffer.append(data)
-                except Exception as e:
-                    logger.error(f"Critical error processing {target_url}: {e}")
-
-            # 2. Zenn
-            zenn_articles = await self.scrape_zenn_trends(page)
-            self.data_buffer.extend(zenn_articles)
-
-            # 3. Kakaku.com Gadgets
-            kakaku_gadgets = await self.scrape_kakaku_ranking(page)
-            self.data_buffer.extend(kakaku_gadgets)
-
-            await browser.close()
+            launch = lambda: p.chromium.launch(headless=True, args=STEALTH_ARGS)
+            async with browser_lease(p, "scrape", launch) as lease:
+                await self._run_sources(lease)
             return self.data_buffer
 
+    async def _run_sources(self, lease):
+        """スクレイピング用のコンテキストを作り、登録済みのソースを取得する"""
+        context = await lease.new_context(
+            user_agent=self._get_random_ua(),
+            locale='ja-JP',
+            timezone_id='Asia/Tokyo',
+            viewport={'width': 1280, 'height': 720},
+            java_script_enabled=True,
+            extra_http_headers={
+                'referer': 'https://www.google.com/'
+            },
+            permissions=['geolocation']
+        )
+        
+        await context.add_init_script("""
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined
+            });
+        """)
+
+        # 登録済みのソースを並行に取得する（ソース内のURLは順番に）
+        self._slots = asyncio.Semaphore(max(1, self.config.concurrency))
+        results = await asyncio.gather(*(self.scrape_source(context, source) for source in self.sources))
+        for records in results:
+            self.data_buffer.extend(records)
+
 # ==========================================
 # 2. Cleaner Class (Pandas)
 # ==========================================
@@ -364,35 +244,81 @@ class Cleaner:
         pass
 
     def normalize_text(self, text: str) -> str:
-        if pd.isna(text):
+        # セルごとに呼ばれるので pandas は使わない（pd.isna と同じく None / NaN は空文字）
+        if text is None or (isinstance(text, float) and math.isnan(text)):
             return ""
         return " ".join(str(text).split())
 
-    def process(self, raw_data: List[Dict[str, Any]]) -> pd.DataFrame:
+    def clean_records(self, records: List[ProductRecord]) -> List[ProductRecord]:
+        """ProductRecord のまま整形する（process と同じ規則。DataFrame を作らない）
+
+        タイトルのないものを捨て、同じ URL は後のものを残し、テキスト項目の空白をまとめる。
+        整形した新しいレコードを返し、渡された records は変更しない
+        （pipeline は整形前の内容でフィンガープリントを取るため）。
+        """
+        if not records:
+            logger.warning("No data to clean.")
+            return []
+
+        with tracing.span("clean.batch", rows_in=len(records)) as sp:
+            by_url: Dict[str, ProductRecord] = {}
+            for record in records:
+                if record.title is None:
+                    continue
+                # keep='last' と同じく、後に出たものをその位置に残す
+                by_url.pop(record.url, None)
+                by_url[record.url] = record
+
+            cleaned = [
+                ProductRecord(
+                    url=record.url,
+                    title=_normalize(record.title),
+                    description=_normalize(record.description),
+                    raw_price=_normalize(record.raw_price),
+                    image_url=record.image_url,
+                    specs=_normalize(record.specs),
+                    category=record.category or "Uncategorized",
+                    scraped_at=record.scraped_at,
+                )
+                for record in by_url.values()
+            ]
+            sp.set(rows=len(cleaned))
+
+        return cleaned
+
+    def process(self, raw_data: List[Dict[str, Any]] | List[ProductRecord]) -> pd.DataFrame:
+        """DataFrame で整形する（ProductRecord のリストも渡せる）"""
+        import pandas as pd
+
         if not raw_data:
             logger.warning("No data to clean.")
             return pd.DataFrame()
 
-        df = pd.DataFrame(raw_data)
+        with tracing.span("clean.batch", rows_in=len(raw_data)) as sp:
+            df = pd.DataFrame(raw_data)
         
-        if 'title' in df.columns:
-            df.dropna(subset=['title'], inplace=True)
+            if 'title' in df.columns:
+                df.dropna(subset=['title'], inplace=True)
 
-        df.drop_duplicates(subset=['url'], keep='last', inplace=True)
+            df.drop_duplicates(subset=['url'], keep='last', inplace=True)
 
-        text_columns = ['title', 'description', 'specs', 'raw_price']
-        for col in text_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(self.normalize_text)
+            text_columns = ['title', 'description', 'specs', 'raw_price']
+            for col in text_columns:
+                if col in df.columns:
+                    df[col] = df[col].apply(self.normalize_text)
 
-        if 'raw_price' in df.columns:
-            df['price'] = df['raw_price'] 
+            if 'raw_price' in df.columns:
+                df['price'] = df['raw_price'] 
             
-        if 'category' not in df.columns:
-             df['category'] = 'Uncategorized'
+            if 'category' not in df.columns:
+                 df['category'] = 'Uncategorized'
+            sp.set(rows=len(df))
 
         return df
 
+def _normalize(value) -> str:
+    return " ".join(str(value).split()) if value else ""
+
 # ==========================================
 # 3. Storage Class (SQLite)
 # ==========================================
@@ -432,6 +358,91 @@ class Storage:
             
         conn.close()
 
+    # 既存の行もすべて更新する（scraped_at / updated_at は「最後に取得した時刻」）
+    ON_CONFLICT = """
+    ON CONFLICT(url) DO UPDATE SET
+        title=excluded.title,
+        description=excluded.description,
+        price=excluded.price,
+        image_url=excluded.image_url,
+        specs=excluded.specs,
+        category=excluded.category,
+        scraped_at=excluded.scraped_at,
+        updated_at=CURRENT_TIMESTAMP;
+    """
+    UPSERT_SQL = f"""
+    INSERT INTO products ({", ".join(ProductRecord.COLUMNS)})
+    VALUES ({", ".join("?" * len(ProductRecord.COLUMNS))})
+    {ON_CONFLICT}"""
+    # 内容の比較に使う列（url と scraped_at を除く。as_row() の 1〜6 番目）
+    CONTENT_COLUMNS = ProductRecord.COLUMNS[1:-1]
+    # 既存の行を一度に読み出す件数（SQLite のパラメータ数の上限より小さく）
+    COMPARE_CHUNK_SIZE = 500
+
+    def _count_changed(self, conn, rows: List[Tuple]) -> int:
+        """書き込む前に既存の行と比べて、新規または内容の変わる行の数を返す（メトリクス用）"""
+        existing = {}
+        for start in range(0, len(rows), self.COMPARE_CHUNK_SIZE):
+            chunk = rows[start:start + self.COMPARE_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            for url, *content in conn.execute(
+                f"SELECT url, {', '.join(self.CONTENT_COLUMNS)} FROM products WHERE url IN ({placeholders})",
+                [row[0] for row in chunk],
+            ):
+                existing[url] = tuple(content)
+        return sum(1 for row in rows if existing.get(row[0]) != tuple(row[1:-1]))
+
+    def _log_changes(self, total: int, changed: int):
+        ROWS.inc(changed, table="products", result="changed")
+        ROWS.inc(total - changed, table="products", result="unchanged")
+        logger.info(f"Successfully upserted {total} records into SQLite ({changed} new or changed, {total - changed} unchanged).")
+
+    def save_records(self, records: List[ProductRecord]):
+        """ProductRecord をそのまま保存する（タプルを順に executemany へ渡すので、全件分の dict を作らない）"""
+        if not records:
+            logger.info("No data to save.")
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with tracing.span("db.write", table="products", rows=len(records)) as sp:
+                # チャンクごとに比較してから書き込む（全件分のタプルを一度に作らない）
+                changed = 0
+                for start in range(0, len(records), self.COMPARE_CHUNK_SIZE):
+                    rows = [record.as_row() for record in records[start:start + self.COMPARE_CHUNK_SIZE]]
+                    changed += self._count_changed(conn, rows)
+                    conn.executemany(self.UPSERT_SQL, rows)
+                conn.commit()
+                sp.set(changed=changed)
+            self._log_changes(len(records), changed)
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
+    TOUCH_SQL = "UPDATE products SET scraped_at = ?, updated_at = CURRENT_TIMESTAMP WHERE url = ?"
+
+    def touch_records(self, records: List[ProductRecord]):
+        """内容が前回と同じレコードの取得時刻だけ更新する（pipeline で clean / 内容の保存を省いたとき）"""
+        if not records:
+            return
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with tracing.span("db.write", table="products", rows=len(records), touch_only=True):
+                conn.executemany(
+                    self.TOUCH_SQL,
+                    ((record.scraped_at, record.url) for record in records if record.title is not None),
+                )
+                conn.commit()
+            self._log_changes(len(records), 0)
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            conn.rollback()
+        finally:
+            conn.close()
+
     def save(self, df: pd.DataFrame):
         if df.empty:
             logger.info("No data to save.")
@@ -443,23 +454,19 @@ class Storage:
         try:
             records = df.to_dict(orient='records')
             
-            upsert_sql = """
+            upsert_sql = f"""
             INSERT INTO products (url, title, description, price, image_url, specs, category, scraped_at)
             VALUES (:url, :title, :description, :price, :image_url, :specs, :category, :scraped_at)
-            ON CONFLICT(url) DO UPDATE SET
-                title=excluded.title,
-                description=excluded.description,
-                price=excluded.price,
-                image_url=excluded.image_url,
-                specs=excluded.specs,
-                category=excluded.category,
-                scraped_at=excluded.scraped_at,
-                updated_at=CURRENT_TIMESTAMP;
-            """
+            {self.ON_CONFLICT}"""
             
-            cursor.executemany(upsert_sql, records)
-            conn.commit()
-            logger.info(f"Successfully upserted {len(records)} records into SQLite.")
+            with tracing.span("db.write", table="products", rows=len(records)) as sp:
+                changed = self._count_changed(conn, [
+                    tuple(record.get(column) for column in ProductRecord.COLUMNS) for record in records
+                ])
+                cursor.executemany(upsert_sql, records)
+                conn.commit()
+                sp.set(changed=changed)
+            self._log_changes(len(records), changed)
             
         except Exception as e:
             logger.error(f"Database error: {e}")
@@ -471,9 +478,15 @@ class Storage:
 # 4. Main Pipeline Execution
 # ==========================================
 async def main():
-    logger.info("Starting SEO Data Pipeline (FutureTools, Zenn, Kakaku.com)...")
+    if SCRAPE_WORKERS > 1:
+        # 複数プロセスで分担して取得し、このプロセスが書き込みを担当する
+        from sharded_scraper import run_sharded
+        run_sharded(CONFIG, SCRAPE_WORKERS)
+        return
 
     scraper = Scraper(CONFIG)
+    logger.info(f"Starting SEO Data Pipeline ({', '.join(source.name for source in scraper.sources)})...")
+
     raw_data = await scraper.run()
 
     if not raw_data:
@@ -481,12 +494,14 @@ async def main():
         return
 
     cleaner = Cleaner()
-    cleaned_df = cleaner.process(raw_data)
+    cleaned = cleaner.clean_records(raw_data)
 
     storage = Storage(CONFIG.db_path)
-    storage.save(cleaned_df)
+    storage.save_records(cleaned)
 
     logger.info("Pipeline completed successfully.")
 
 if __name__ == "__main__":
+    from utils.log_setup import setup_logging
+    setup_logging("scraper_pipeline")
     asyncio.run(main())
\ No newline at end of file
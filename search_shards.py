@@ -0,0 +1,245 @@
+"""
+分割・遅延読み込み型のサイト内検索インデックス
+
+MkDocs の search プラグインはサイト全体を1つの search_index.json にまとめるため、
+記事が増えるほど閲覧者のダウンロード量が増える。ここでは転置インデックスを
+語の先頭文字（英数字は先頭2文字）ごとのシャードに分けて書き出し、ブラウザ側
+（my_site/docs/javascripts/sharded_search.js）は入力された語のシャードだけを読み込む。
+
+日本語は形態素解析器を使わず、漢字・カナの連続を文字bigramに分解する
+（ひらがなだけのbigramは助詞などのノイズが多いので捨てる）。
+
+転置インデックス本体はDB（search_docs / search_postings テーブル）に持ち、
+前回から変わった記事だけをトークン化し直して、影響を受けたシャードだけを書き出す。
+"""
+import json
+import re
+import unicodedata
+from collections import Counter
+
+SEARCH_DIR = "search"
+# 記事メタデータ（タイトル・リンク）を何件ずつのファイルにまとめるか
+DOC_BLOCK_SIZE = 500
+# 1記事あたりインデックスに載せる語の上限と、タイトル中の語の重み
+MAX_TERMS_PER_DOC = 120
+TITLE_WEIGHT = 5
+# トークン化する本文の長さの上限（冒頭に要点がある記事構成なので十分）
+MAX_BODY_CHARS = 4000
+ASCII_PREFIX = 2
+# 本文を一度に読み出す記事数
+INDEX_CHUNK_SIZE = 500
+
+ARTICLE_FILTER = "p.generated_body IS NOT NULL AND p.generated_body != ''"
+SIGNATURE_EXPR = (
+    "COALESCE(p.updated_at, '') || ':' || LENGTH(p.generated_body) || ':' "
+    "|| COALESCE(p.title, '') || ':' || COALESCE(p.category, '')"
+)
+
+# sharded_search.js の TOKEN_RE と同じ定義にすること
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+
+
+def _is_hiragana(ch):
+    return "\u3040" <= ch <= "\u309f"
+
+
+def tokenize(text):
+    """英数字は単語、漢字・カナは文字bigram（1文字だけならその1文字）に分解する"""
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if run[0] < "\u3040":
+            if len(run) >= 2:
+                tokens.append(run)
+        elif len(run) == 1:
+            if not _is_hiragana(run):
+                tokens.append(run)
+        else:
+            for i in range(len(run) - 1):
+                bigram = run[i:i + 2]
+                if not (_is_hiragana(bigram[0]) and _is_hiragana(bigram[1])):
+                    tokens.append(bigram)
+    return tokens
+
+
+def shard_key(term):
+    return term[:ASCII_PREFIX] if term[0] < "\u3040" else term[0]
+
+
+def shard_filename(key):
+    # ファイル名に使えない文字を避けるため、コードポイントの16進表記にする
+    return "-".join(f"{ord(c):x}" for c in key) + ".json"
+
+
+def document_terms(title, body):
+    """記事の (語, 重み付き出現数) を重みの大きい順に MAX_TERMS_PER_DOC 件"""
+    counts = Counter(tokenize((body or "")[:MAX_BODY_CHARS]))
+    for term in tokenize(title):
+        counts[term] += TITLE_WEIGHT
+    return counts.most_common(MAX_TERMS_PER_DOC)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True) + "\n"
+
+
+class SearchShards:
+    """検索インデックスのシャード群を差分更新する
+
+    filename_for / write / exists は site_pages.ListingPages と同じ役割。
+    article_path はサイトのルートから記事ページのフォルダまでのパス（検索結果のリンクに使う）。
+    """
+
+    def __init__(self, conn, filename_for, write, exists, article_path="tools"):
+        self.conn = conn
+        self.filename_for = filename_for
+        self.write = write
+        self.exists = exists
+        self.article_path = article_path.strip("/")
+
+    def _ensure_tables(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS search_docs (
+                doc_id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE NOT NULL,
+                signature TEXT
+            );
+            CREATE TABLE IF NOT EXISTS search_postings (
+                shard TEXT NOT NULL,
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (shard, term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_search_postings_doc ON search_postings(doc_id);
+            -- 転置インデックスには反映済みで、まだファイルに書き出していないシャード・記事ブロック
+            CREATE TABLE IF NOT EXISTS search_dirty (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (kind, name)
+            ) WITHOUT ROWID;
+        """)
+
+    def _drop_postings(self, doc_id, dirty_shards):
+        dirty_shards.update(
+            shard for (shard,) in self.conn.execute(
+                "SELECT DISTINCT shard FROM search_postings WHERE doc_id = ?", (doc_id,)
+            )
+        )
+        self.conn.execute("DELETE FROM search_postings WHERE doc_id = ?", (doc_id,))
+
+    def _sync_postings(self):
+        """DBの記事と転置インデックスの差分を反映し、(変わったシャード, 変わった記事ブロック) を返す"""
+        dirty_shards, dirty_blocks = set(), set()
+
+        # 1. 追加・更新された記事だけをトークン化する（本文はチャンクごとに読む）
+        changed = self.conn.execute(f"""
+            SELECT p.url, {SIGNATURE_EXPR}, d.doc_id
+            FROM products p LEFT JOIN search_docs d ON d.url = p.url
+            WHERE {ARTICLE_FILTER} AND (d.doc_id IS NULL OR d.signature IS NOT {SIGNATURE_EXPR})
+        """).fetchall()
+        for start in range(0, len(changed), INDEX_CHUNK_SIZE):
+            chunk = changed[start:start + INDEX_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            contents = {
+                url: (title, body) for url, title, body in self.conn.execute(
+                    f"SELECT url, title, generated_body FROM products WHERE url IN ({placeholders})",
+                    [url for url, _, _ in chunk],
+                )
+            }
+            for url, signature, doc_id in chunk:
+                title, body = contents[url]
+                if doc_id is None:
+                    doc_id = self.conn.execute(
+                        "INSERT INTO search_docs (url, signature) VALUES (?, ?)", (url, signature)
+                    ).lastrowid
+                else:
+                    self._drop_postings(doc_id, dirty_shards)
+                    self.conn.execute("UPDATE search_docs SET signature = ? WHERE doc_id = ?", (signature, doc_id))
+                postings = [(shard_key(term), term, doc_id, tf) for term, tf in document_terms(title, body)]
+                self.conn.executemany(
+                    "INSERT INTO search_postings (shard, term, doc_id, tf) VALUES (?, ?, ?, ?)", postings
+                )
+                dirty_shards.update(shard for shard, _, _, _ in postings)
+                dirty_blocks.add(doc_id // DOC_BLOCK_SIZE)
+
+        # 2. 削除された（本文がなくなった）記事を外す
+        removed = self.conn.execute(f"""
+            SELECT d.doc_id FROM search_docs d
+            WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.url = d.url AND {ARTICLE_FILTER})
+        """).fetchall()
+        for (doc_id,) in removed:
+            self._drop_postings(doc_id, dirty_shards)
+            self.conn.execute("DELETE FROM search_docs WHERE doc_id = ?", (doc_id,))
+            dirty_blocks.add(doc_id // DOC_BLOCK_SIZE)
+
+        # 書き出し前に落ちても次回書き直せるよう、変わったものを転置インデックスと一緒にコミットする
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO search_dirty (kind, name) VALUES (?, ?)",
+            [("shard", shard) for shard in dirty_shards] + [("block", str(block)) for block in dirty_blocks],
+        )
+        self.conn.commit()
+        if changed or removed:
+            print(f"🔎 Search index: {len(changed)} documents re-indexed, {len(removed)} removed")
+
+        # 前回書き出しきれなかった分も含めて返す
+        for kind, name in self.conn.execute("SELECT kind, name FROM search_dirty"):
+            if kind == "shard":
+                dirty_shards.add(name)
+            else:
+                dirty_blocks.add(int(name))
+        return dirty_shards, dirty_blocks
+
+    def _render_shard(self, shard):
+        terms = {}
+        for term, doc_id, tf in self.conn.execute(
+            "SELECT term, doc_id, tf FROM search_postings WHERE shard = ? ORDER BY term, doc_id", (shard,)
+        ):
+            # [doc_id, tf, doc_id, tf, ...] のフラットな配列にしてサイズを抑える
+            terms.setdefault(term, []).extend((doc_id, tf))
+        return _dumps({"terms": terms})
+
+    def _render_block(self, block):
+        docs = {}
+        for doc_id, url, title, category in self.conn.execute("""
+            SELECT d.doc_id, p.url, p.title, p.category
+            FROM search_docs d JOIN products p ON p.url = d.url
+            WHERE d.doc_id >= ? AND d.doc_id < ?
+        """, (block * DOC_BLOCK_SIZE, (block + 1) * DOC_BLOCK_SIZE)):
+            # リンクは記事ページ（<article_path>/<name>/）の <name> 部分だけを持つ
+            docs[str(doc_id)] = [title, self.filename_for(url)[:-len(".md")], category]
+        return _dumps({"docs": docs})
+
+    def update(self):
+        """変わったシャード・記事ブロックだけ書き出し、今回の出力対象の相対パス集合を返す"""
+        self._ensure_tables()
+        dirty_shards, dirty_blocks = self._sync_postings()
+        produced = set()
+
+        shards = [shard for (shard,) in self.conn.execute("SELECT DISTINCT shard FROM search_postings")]
+        for shard in shards:
+            rel_path = f"{SEARCH_DIR}/shards/{shard_filename(shard)}"
+            produced.add(rel_path)
+            if shard in dirty_shards or not self.exists(rel_path):
+                self.write(rel_path, self._render_shard(shard))
+
+        blocks = [block for (block,) in self.conn.execute(
+            "SELECT DISTINCT doc_id / ? FROM search_docs", (DOC_BLOCK_SIZE,)
+        )]
+        for block in blocks:
+            rel_path = f"{SEARCH_DIR}/docs/{block}.json"
+            produced.add(rel_path)
+            if block in dirty_blocks or not self.exists(rel_path):
+                self.write(rel_path, self._render_block(block))
+
+        doc_count = self.conn.execute("SELECT COUNT(*) FROM search_docs").fetchone()[0]
+        meta = {
+            "version": 2, "doc_count": doc_count, "block_size": DOC_BLOCK_SIZE, "ascii_prefix": ASCII_PREFIX,
+            "article_path": self.article_path,
+        }
+        self.write(f"{SEARCH_DIR}/meta.json", _dumps(meta))
+        produced.add(f"{SEARCH_DIR}/meta.json")
+
+        # すべて書き出せたので未書き出しの記録を消す
+        self.conn.execute("DELETE FROM search_dirty")
+        self.conn.commit()
+        return produced
@@ -1,11 +1,12 @@
+import os
 import time
 import logging
+import queue
 import subprocess
 import sys
-from typing import List
-
-# ★修正点1: クラスと設定値を明示的にインポート
-from content_generator import ContentGenerator, DB_PATH
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional
 
 # ==========================================
 # デフォルトのキーワードリスト
@@ -15,12 +16,10 @@ DEFAULT_KEYWORDS = [
     "Gemini API 活用事例",
 ]
 
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[logging.StreamHandler()]
-)
+# 生成と書き出しを並行させるか（0 にすると全記事の生成後にまとめて書き出す）
+PIPELINED_EXPORT = os.getenv("PIPELINED_EXPORT", "1") == "1"
+
+# ログ（出力先は utils.log_setup。実行時に setup_logging で設定する）
 logger = logging.getLogger(__name__)
 
 def git_push_changes(count):
@@ -35,44 +34,141 @@ def git_push_changes(count):
     except Exception as e:
         logger.error(f"❌ Git操作エラー: {e}")
 
-def run_factory():
-    """記事量産工場のメインプロセス"""
-    
-    # コマンド引数のチェック
-    if len(sys.argv) > 1:
-        target_list = sys.argv[1:]
-        logger.info(f"🎯 コマンドライン引数を検出しました: {target_list}")
-    else:
-        target_list = DEFAULT_KEYWORDS
-        logger.info("📂 コマンド指定がないため、ファイル内のデフォルトリストを使用します。")
+def generate_articles(
+    target_list: List[str],
+    on_saved: Optional[Callable[[str], None]] = None,
+    on_failed: Optional[Callable[[str], None]] = None,
+) -> List[str]:
+    """キーワードごとに記事を生成し、保存した記事のURLを返す
 
-    logger.info("🏭 記事量産工場を稼働させます...")
-    
+    on_saved は記事を1件保存するたびにそのURLで、on_failed は生成・保存に失敗したキーワードで呼ばれる
+    （重複で生成しなかったキーワードは失敗に含めない）。
+    """
     # ★修正点2: ここで「記事作成ロボ」を実体化（起動）させます
+    # Gemini関連の読み込みは生成を行うときだけにする
+    from content_generator import ContentGenerator, DB_PATH
     generator = ContentGenerator(DB_PATH)
     
     total = len(target_list)
+    saved = []
     
     for i, keyword in enumerate(target_list, 1):
         logger.info(f"--- [{i}/{total}] キーワード: '{keyword}' の記事を作成中 ---")
         try:
             # ★修正点3: 実体化したロボットに命令する
-            generator.generate_article(target_keyword=keyword)
+            saved_url = generator.generate_article(target_keyword=keyword)
+            if not saved_url:
+                logger.info(f"⏭️ '{keyword}' は既存記事と重複するため生成しませんでした")
+                continue
             
             logger.info(f"✨ '{keyword}' の記事作成完了")
+            saved.append(saved_url)
+            if on_saved:
+                on_saved(saved_url)
             
             if i < total:
                 logger.info("☕ API休憩中 (10秒)...")
                 time.sleep(10)
         except Exception as e:
             logger.error(f"⚠️ '{keyword}' の作成に失敗しました: {e}")
+            if on_failed:
+                on_failed(keyword)
             continue
 
-    logger.info("📝 全記事の生成が終了しました。サイトデータを更新します。")
+    try:
+        log_generation_cost(DB_PATH)
+    except Exception as e:
+        # 集計は記録用なので、generation_metrics テーブルの問題で生成の結果を失敗にしない
+        logger.warning(f"⚠️ 生成コストの集計に失敗しました: {e}")
+    return saved
+
+def log_generation_cost(db_path: str):
+    """この実行での Gemini 呼び出しの合計（トークン・概算コスト・待ち時間）をログに出す"""
+    from generation_metrics import RUN_ID, run_rollup
+    for row in run_rollup(db_path, run_id=RUN_ID):
+        logger.info(
+            f"💰 Gemini: {row['calls']} calls ({row['failed']} failed, {row['retries']} retries), "
+            f"{row['prompt_tokens']} prompt + {row['output_tokens']} output tokens, ~${row['cost_usd']:.4f}, "
+            f"latency p50 {row['p50_ms'] / 1000:.1f}s / p95 {row['p95_ms'] / 1000:.1f}s"
+        )
+
+@contextmanager
+def _wal_mode(db_path: str):
+    """書き出しスレッドの読み込みと生成側の書き込みが互いを待たないよう、並行している間だけ WAL にする
+
+    journal_mode はDBファイルに保存される設定なので、終わったら元の DELETE に戻す
+    （リポジトリにコミットする seo_content.db を WAL のままにしない）。
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield
+    finally:
+        try:
+            # 他の接続が開いていると戻せないことがある（次回の実行で戻る）
+            conn.execute("PRAGMA journal_mode=DELETE")
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Could not switch {db_path} back to journal_mode=DELETE: {e}")
+        finally:
+            conn.close()
+
+
+def generate_and_export(target_list: List[str], on_failed: Optional[Callable[[str], None]] = None) -> List[str]:
+    """記事を生成しながら、保存できた記事から順に別スレッドでサイトに書き出す
+
+    生成（Gemini待ち・API休憩）の間に書き出しが進むので、最後の記事の保存後に残るのは
+    その記事の書き出しと一覧ページの更新だけになる。
+    """
+    from export_to_site import DB_PATH, export_streaming
+
+    saved_urls: "queue.Queue[Optional[str]]" = queue.Queue()
+    errors = []
+
+    def exporter():
+        try:
+            export_streaming(saved_urls)
+        except Exception as e:
+            errors.append(e)
+
+    with _wal_mode(DB_PATH):
+        thread = threading.Thread(target=exporter, name="export", daemon=True)
+        thread.start()
+        try:
+            saved = generate_articles(target_list, on_saved=saved_urls.put, on_failed=on_failed)
+        finally:
+            saved_urls.put(None)
+            thread.join()
+    if errors:
+        raise errors[0]
+    return saved
+
+def run_factory():
+    """記事量産工場のメインプロセス"""
     
-    # ★修正点4: エラー回避のため、コマンド経由でサイト生成を実行
+    # コマンド引数のチェック
+    if len(sys.argv) > 1:
+        target_list = sys.argv[1:]
+        logger.info(f"🎯 コマンドライン引数を検出しました: {target_list}")
+    else:
+        target_list = DEFAULT_KEYWORDS
+        logger.info("📂 コマンド指定がないため、ファイル内のデフォルトリストを使用します。")
+
+    logger.info("🏭 記事量産工場を稼働させます...")
+    total = len(target_list)
+
+    # ★修正点4: サイト生成は同じプロセス内で実行（再インポート・DB再接続を省く）
     try:
-        subprocess.run(["python", "export_to_site.py"], check=True)
+        if PIPELINED_EXPORT:
+            # 生成できた記事から順に書き出す
+            generate_and_export(target_list)
+            logger.info("📝 全記事の生成とサイトデータの更新が終了しました。")
+        else:
+            generate_articles(target_list)
+            logger.info("📝 全記事の生成が終了しました。サイトデータを更新します。")
+            from export_to_site import export_article_to_markdown
+            export_article_to_markdown()
     except Exception as e:
         logger.error(f"❌ サイト生成エラー: {e}")
         return
@@ -82,4 +178,6 @@ def run_factory():
     logger.info("🎉 全工程が完了しました。")
 
 if __name__ == "__main__":
+    from utils.log_setup import setup_logging
+    setup_logging("seo_pipeline")
     run_factory()
\ No newline at end of file
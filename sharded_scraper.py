@@ -0,0 +1,190 @@
+"""
+複数プロセスでのスクレイピング（URL をホストごとに振り分ける）
+
+1つの asyncio ループと1つのブラウザでは、Playwright の Python 側の処理とページの解析で
+ネットワークより先に CPU 1コアを使い切る。ここでは登録済みソースの URL をホスト名
+（SCRAPE_SHARD_BY=url なら URL）のハッシュで N 個に分け、ワーカープロセスごとに
+別のブラウザで取得する。同じホストは同じワーカーが順に回るので、サイトへの負荷は増えない。
+
+ワーカーはページを取得するたびに結果をキューに流し、呼び出し元のプロセスが唯一の書き込み役として
+Cleaner → Storage でDBに保存する（SHARD_WRITE_BATCH 件ずつ）。最後にワーカーごとのスループットを表示する。
+ブラウザは browser_service から借りるので、サービスを使う場合は --pool-size をワーカー数以上にする
+（足りないと空くまで待つ）。
+
+    SCRAPE_WORKERS=4 python scraper_pipeline.py
+    python sharded_scraper.py --workers 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from product_record import ProductRecord
+from scrape_sources import SourceSpec, get_sources
+
+SCRAPE_SHARD_BY = os.getenv("SCRAPE_SHARD_BY", "host")
+# 書き込み役がまとめて保存する件数（キューが空になったときも保存する）
+SHARD_WRITE_BATCH = int(os.getenv("SHARD_WRITE_BATCH", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkerStats:
+    worker: int
+    urls: int = 0
+    pages: int = 0
+    failed: int = 0
+    items: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def items_per_sec(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+    @property
+    def pages_per_sec(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+
+def shard_key(url: str, shard_by: str = SCRAPE_SHARD_BY) -> str:
+    return (urlparse(url).hostname or url) if shard_by == "host" else url
+
+
+def shard_sources(sources: List[SourceSpec], workers: int, shard_by: str = SCRAPE_SHARD_BY) -> List[List[SourceSpec]]:
+    """ソースの URL を workers 個に振り分ける（ワーカーごとのソース一覧。元の順序は保つ）"""
+    shards: List[List[SourceSpec]] = [[] for _ in range(workers)]
+    for source in sources:
+        urls: List[List[str]] = [[] for _ in range(workers)]
+        for url in source.urls:
+            # hash() はプロセスごとに値が変わるので crc32 を使う
+            urls[zlib.crc32(shard_key(url, shard_by).encode("utf-8")) % workers].append(url)
+        for shard, shard_urls in zip(shards, urls):
+            if shard_urls:
+                shard.append(replace(source, urls=tuple(shard_urls)))
+    return shards
+
+
+def _worker(worker_id: int, sources: List[SourceSpec], config, results, log_records):
+    """ワーカープロセスの本体: 自分の分のソースを取得し、ページごとに結果をキューへ流す"""
+    import asyncio
+    from scraper_pipeline import Scraper
+    from utils import metrics
+    from utils.log_setup import setup_worker_logging
+
+    # ログは親プロセスに送って、親の出力先（コンソール・JSON ファイル）にまとめる
+    setup_worker_logging(log_records)
+
+    stats = WorkerStats(worker=worker_id, urls=sum(len(s.urls) for s in sources))
+
+    def on_records(records):
+        stats.items += len(records)
+        if records:
+            results.put(("records", worker_id, records))
+
+    scraper = Scraper(replace(config, sources=sources), on_records=on_records)
+    started = time.perf_counter()
+    try:
+        asyncio.run(scraper.run())
+    except Exception as e:
+        stats.error = f"{type(e).__name__}: {e}"
+    stats.seconds = time.perf_counter() - started
+    stats.pages = scraper.pages_done
+    stats.failed = scraper.pages_failed
+    # ワーカーのメトリクスは書き込み役のプロセスでまとめて出力する（ワーカーは書き出さない）
+    results.put(("metrics", worker_id, metrics.snapshot()))
+    metrics.reset()
+    results.put(("done", worker_id, stats))
+
+
+def run_sharded(config, workers: int, shard_by: str = SCRAPE_SHARD_BY) -> Dict[str, Any]:
+    """workers 個のプロセスで取得し、このプロセスで保存する。ワーカーごとの集計を返す"""
+    from scraper_pipeline import Cleaner, Storage
+    from utils import metrics
+    from utils.log_setup import forward_from
+
+    sources = config.sources if config.sources is not None else get_sources()
+    shards = [(i, shard) for i, shard in enumerate(shard_sources(sources, workers, shard_by)) if shard]
+    if len(shards) < workers:
+        logger.info(f"Only {len(shards)} of {workers} workers have URLs (shard by {shard_by}).")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    log_records = ctx.Queue()
+    log_forwarder = forward_from(log_records)
+    processes = {i: ctx.Process(target=_worker, args=(i, shard, config, results, log_records), daemon=True)
+                 for i, shard in shards}
+    started = time.perf_counter()
+    for process in processes.values():
+        process.start()
+
+    cleaner = Cleaner()
+    storage = Storage(config.db_path)
+    stats: Dict[int, WorkerStats] = {}
+    pending: List[ProductRecord] = []
+    saved = 0
+
+    def flush():
+        nonlocal saved
+        if pending:
+            cleaned = cleaner.clean_records(pending)
+            storage.save_records(cleaned)
+            saved += len(cleaned)
+            pending.clear()
+
+    while len(stats) < len(processes):
+        try:
+            kind, worker_id, payload = results.get(timeout=0.2 if pending else 1.0)
+        except queue.Empty:
+            flush()
+            # 結果を送らずに落ちたワーカー
+            for worker_id, process in processes.items():
+                if worker_id not in stats and not process.is_alive() and results.empty():
+                    stats[worker_id] = WorkerStats(worker=worker_id, error=f"exited with code {process.exitcode}")
+            continue
+        if kind == "records":
+            pending.extend(payload)
+            if len(pending) >= SHARD_WRITE_BATCH:
+                flush()
+        elif kind == "metrics":
+            metrics.merge(payload)
+        else:
+            stats[worker_id] = payload
+    flush()
+    for process in processes.values():
+        process.join()
+    log_forwarder.stop()
+    elapsed = time.perf_counter() - started
+
+    logger.info(f"Sharded scrape finished: {saved} rows saved by {len(processes)} workers in {elapsed:.1f}s")
+    for s in sorted(stats.values(), key=lambda s: s.worker):
+        line = (f"  worker {s.worker}: {s.urls} urls, {s.pages} pages ({s.failed} failed), {s.items} items "
+                f"in {s.seconds:.1f}s = {s.pages_per_sec:.2f} pages/s, {s.items_per_sec:.2f} items/s")
+        if s.error:
+            line += f"  ERROR {s.error}"
+        logger.info(line)
+    return {"saved": saved, "seconds": elapsed, "workers": stats}
+
+
+def main():
+    from scraper_pipeline import CONFIG, SCRAPE_WORKERS
+    from utils.log_setup import setup_logging
+
+    setup_logging("sharded_scraper")
+
+    parser = argparse.ArgumentParser(description="複数プロセスでスクレイピングしてDBに保存する")
+    parser.add_argument("--workers", type=int, default=max(SCRAPE_WORKERS, os.cpu_count() or 1))
+    parser.add_argument("--shard-by", choices=["host", "url"], default=SCRAPE_SHARD_BY)
+    args = parser.parse_args()
+    run_sharded(CONFIG, args.workers, args.shard_by)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+一覧ページ（新着記事・カテゴリ別・月別アーカイブ）の生成
+
+index.md に全記事を並べる代わりに、一覧をページ分割して書き出す。
+ページ番号は古い記事から振るので、記事が1件増えても内容が変わるのは
+最新のページと目次（index.md / categories/index.md / archive/index.md）だけになる。
+各ページの「署名」（件数・最終更新日時など）をDBの集計クエリで求めて前回と比べ、
+変わったページだけを読み出して組み立てる。
+"""
+import hashlib
+import os
+import re
+
+import site_renderer
+
+# 1ページあたりの件数と、トップページに載せる最新記事の件数
+PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", "100"))
+INDEX_LATEST = int(os.getenv("INDEX_LATEST", "30"))
+
+ARTICLE_FILTER = "generated_body IS NOT NULL AND generated_body != ''"
+CATEGORY_EXPR = "COALESCE(category, 'Uncategorized')"
+MONTH_EXPR = "COALESCE(substr(scraped_at, 1, 7), 'unknown')"
+# 署名に使う集計列（タイトル変更は _save_article / Storage.save が updated_at を更新する）
+SIGNATURE_COLUMNS = "COUNT(*), MAX(scraped_at), MAX(updated_at), SUM(LENGTH(title))"
+
+
+def category_slug(category):
+    """カテゴリ名をファイル名に使える形にする（英数字以外はハッシュで代用）"""
+    slug = re.sub(r"[^0-9a-z]+", "-", category.lower()).strip("-")
+    return slug or hashlib.md5(category.encode("utf-8")).hexdigest()[:10]
+
+
+def _page_name(page):
+    return f"page-{page}.md"
+
+
+def _pager(page, last_page):
+    """前後のページへのリンク（新しい方が番号が大きい）"""
+    return {
+        "newer": _page_name(page + 1) if page < last_page else None,
+        "older": _page_name(page - 1) if page > 1 else None,
+    }
+
+
+class ListingPages:
+    """一覧ページ群を差分更新する
+
+    filename_for: 記事URL → 書き出しファイル名
+    write: (相対パス, 内容) を受け取って書き出す関数
+    exists: 相対パスのファイルが書き出し先にあるか
+    """
+
+    def __init__(self, conn, filename_for, write, exists, page_size=PAGE_SIZE):
+        self.conn = conn
+        self.filename_for = filename_for
+        self.write = write
+        self.exists = exists
+        self.page_size = page_size
+
+    def _ensure_indexes(self):
+        """ページ単位の LIMIT/OFFSET 読み出しを毎回のソートなしで済ませるためのインデックス
+
+        本文のある行だけの部分インデックスにして、OFFSETで読み飛ばす行の本文を読まないようにする。
+        """
+        for name, columns in (
+            ("idx_products_listing", "scraped_at, url"),
+            ("idx_products_listing_category", f"{CATEGORY_EXPR}, scraped_at, url"),
+            ("idx_products_listing_month", f"{MONTH_EXPR}, scraped_at, url"),
+        ):
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON products({columns}) WHERE {ARTICLE_FILTER}")
+        self.conn.commit()
+
+    # ---------------------------------------------------------
+    # 署名（ページ単位の集計値）
+    # ---------------------------------------------------------
+    def _new_page_signatures(self):
+        return self.conn.execute(f"""
+            SELECT page + 1, {SIGNATURE_COLUMNS}
+            FROM (
+                SELECT (ROW_NUMBER() OVER (ORDER BY scraped_at, url) - 1) / ? AS page,
+                       scraped_at, updated_at, title
+                FROM products WHERE {ARTICLE_FILTER}
+            )
+            GROUP BY page ORDER BY page
+        """, (self.page_size,)).fetchall()
+
+    def _category_page_signatures(self):
+        return self.conn.execute(f"""
+            SELECT category, page + 1, {SIGNATURE_COLUMNS}
+            FROM (
+                SELECT {CATEGORY_EXPR} AS category,
+                       (ROW_NUMBER() OVER (PARTITION BY {CATEGORY_EXPR} ORDER BY scraped_at, url) - 1) / ? AS page,
+                       scraped_at, updated_at, title
+                FROM products WHERE {ARTICLE_FILTER}
+            )
+            GROUP BY category, page ORDER BY category, page
+        """, (self.page_size,)).fetchall()
+
+    def _month_signatures(self):
+        return self.conn.execute(f"""
+            SELECT {MONTH_EXPR} AS month, {SIGNATURE_COLUMNS}
+            FROM products WHERE {ARTICLE_FILTER}
+            GROUP BY month ORDER BY month DESC
+        """).fetchall()
+
+    # ---------------------------------------------------------
+    # ページ本文の読み出し
+    # ---------------------------------------------------------
+    def _fetch(self, where, params, limit, offset):
+        rows = self.conn.execute(f"""
+            SELECT url, title, {CATEGORY_EXPR}
+            FROM products WHERE {ARTICLE_FILTER} {where}
+            ORDER BY scraped_at, url LIMIT ? OFFSET ?
+        """, (*params, limit, offset)).fetchall()
+        # 表示は新しい順
+        return [(self.filename_for(url), title, category) for url, title, category in reversed(rows)]
+
+    def _render_list_page(self, heading, items, prefix, pager=None):
+        return site_renderer.render("listing.md.j2", heading=heading, items=items, prefix=prefix, **(pager or {}))
+
+    # ---------------------------------------------------------
+    # 差分更新
+    # ---------------------------------------------------------
+    def update(self, state):
+        """署名が変わったページだけ組み立て直す
+
+        state は前回の {相対パス: 署名}。今回の署名で上書きされる。
+        今回生成対象になったページの相対パス集合を返す（書き換えなかったページも含む）。
+        """
+        self._ensure_indexes()
+        previous = dict(state)
+        state.clear()
+        produced = set()
+
+        def refresh(rel_path, signature, render):
+            signature = list(signature)
+            produced.add(rel_path)
+            state[rel_path] = signature
+            if previous.get(rel_path) != signature or not self.exists(rel_path):
+                self.write(rel_path, render())
+
+        # 1. 新着記事（全体）
+        new_pages = self._new_page_signatures()
+        last_new = len(new_pages)
+        for page, *signature in new_pages:
+            refresh(
+                f"new/{_page_name(page)}", [*signature, page == last_new],
+                lambda page=page: self._render_list_page(
+                    f"新着記事一覧 ({page}/{last_new})",
+                    self._fetch("", (), self.page_size, (page - 1) * self.page_size),
+                    "../", _pager(page, last_new),
+                ),
+            )
+
+        # 2. カテゴリ別
+        category_pages = {}
+        for category, page, *signature in self._category_page_signatures():
+            category_pages.setdefault(category, []).append((page, signature))
+        category_counts = []
+        for category, pages in category_pages.items():
+            slug = category_slug(category)
+            last = len(pages)
+            category_counts.append((category, f"{slug}/{_page_name(last)}", sum(sig[0] for _, sig in pages)))
+            for page, signature in pages:
+                refresh(
+                    f"categories/{slug}/{_page_name(page)}", [*signature, page == last],
+                    lambda category=category, page=page, last=last: self._render_list_page(
+                        f"{category} の記事 ({page}/{last})",
+                        self._fetch(f"AND {CATEGORY_EXPR} = ?", (category,), self.page_size, (page - 1) * self.page_size),
+                        "../../", _pager(page, last),
+                    ),
+                )
+
+        # 3. 月別アーカイブ
+        month_counts = []
+        for month, *signature in self._month_signatures():
+            month_counts.append((month, f"{month}.md", signature[0]))
+            refresh(
+                f"archive/{month}.md", signature,
+                lambda month=month, count=signature[0]: self._render_list_page(
+                    f"{month} の記事", self._fetch(f"AND {MONTH_EXPR} = ?", (month,), count, 0), "../",
+                ),
+            )
+
+        # 4. 目次ページ（小さいので毎回組み立て、内容が同じなら書き出し側でスキップされる）
+        category_counts.sort()
+        self.write("categories/index.md", site_renderer.render("toc.md.j2", heading="カテゴリ一覧", entries=category_counts))
+        produced.add("categories/index.md")
+
+        self.write("archive/index.md", site_renderer.render("toc.md.j2", heading="月別アーカイブ", entries=month_counts))
+        produced.add("archive/index.md")
+
+        # トップページ: 最新記事と各一覧への入口
+        self.write("index.md", site_renderer.render(
+            "index.md.j2", latest=self._latest(), last_new=last_new, categories=category_counts,
+        ))
+        produced.add("index.md")
+        return produced
+
+    def _latest(self):
+        rows = self.conn.execute(f"""
+            SELECT url, title, {CATEGORY_EXPR}
+            FROM products WHERE {ARTICLE_FILTER}
+            ORDER BY scraped_at DESC, url DESC LIMIT ?
+        """, (INDEX_LATEST,)).fetchall()
+        return [(self.filename_for(url), title, category) for url, title, category in rows]
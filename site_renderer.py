@@ -0,0 +1,48 @@
+"""
+Jinja2 によるサイトページのレンダリング
+
+テンプレートは templates/ に置き、1プロセスにつき1回だけコンパイルして使い回す。
+コンパイル結果はディスクのバイトコードキャッシュにも保存するので、
+エクスポーターのワーカープロセスや次回の実行ではパースを省略できる。
+"""
+import os
+import urllib.parse
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+BYTECODE_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", ".jinja_cache")
+
+_env = None
+_templates = {}
+
+
+def get_environment():
+    """Jinja2環境を初回利用時に作る（jinja2の読み込みもここまで遅らせる）"""
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+        os.makedirs(BYTECODE_CACHE_DIR, exist_ok=True)
+        _env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            bytecode_cache=FileSystemBytecodeCache(BYTECODE_CACHE_DIR),
+            # Markdownを出力するのでHTMLエスケープはしない
+            autoescape=False,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            keep_trailing_newline=True,
+            # 実行中にテンプレートは変わらないので、毎回のstatを省く
+            auto_reload=False,
+        )
+        _env.filters["quote"] = urllib.parse.quote
+    return _env
+
+
+def get_template(name):
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = get_environment().get_template(name)
+    return template
+
+
+def render(name, **context):
+    return get_template(name).render(**context)
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.keyword_index import KeywordIndex  # noqa: E402
+
+KEYWORD_URL = "https://example.com/keyword/{}.html"
+
+
+def _title(keyword):
+    return f"【入門】{keyword}とは？初心者向け徹底解説"
+
+
+class FindDuplicateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "seo_content.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE products (url TEXT PRIMARY KEY, title TEXT, generated_body TEXT)")
+        keywords = ["Gemini API 活用事例", "Gemini API 使い方 Python", "Gemini ChatGPT 比較",
+                    "Notion テンプレート 配布", "Python 副業 稼ぎ方"]
+        conn.executemany(
+            "INSERT INTO products VALUES (?, ?, ?)",
+            [(KEYWORD_URL.format(i), _title(k), "body") for i, k in enumerate(keywords)]
+            + [
+                # スクレイピングしたツールの紹介記事と、本文のない行
+                ("https://www.futuretools.io/tools/midjourney", "Midjourney", "review"),
+                ("https://www.futuretools.io/tools/notion-ai", "Notion AI", "review"),
+                ("https://www.futuretools.io/tools/runway", "Runway", None),
+            ],
+        )
+        conn.commit()
+        conn.close()
+        self.index = KeywordIndex.from_db(self.db_path, url_prefix="https://example.com/keyword/")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_different_topics_are_not_duplicates(self):
+        for keyword in ["Gemini API 料金", "ChatGPT 料金", "Midjourney 料金", "Notion AI 使い方", "Runway"]:
+            with self.subTest(keyword=keyword):
+                self.assertIsNone(self.index.find_duplicate(keyword))
+
+    def test_only_keyword_articles_with_body_are_indexed(self):
+        self.assertEqual(len(self.index), 5)
+        everything = KeywordIndex.from_db(self.db_path)
+        self.assertEqual(len(everything), 7)
+
+    def test_notation_variants_are_duplicates(self):
+        match = self.index.find_duplicate("gemini api　活用事例")
+        self.assertIsNotNone(match)
+        self.assertEqual(match.key, KEYWORD_URL.format(0))
+
+    def test_small_corpus(self):
+        index = KeywordIndex()
+        index.add("a", _title("Python 副業 稼ぎ方"))
+        index.add("b", _title("Notion テンプレート 配布"))
+        self.assertIsNone(index.find_duplicate("Python 入門"))
+        self.assertIsNotNone(index.find_duplicate("Python副業 稼ぎ方"))
+
+
+if __name__ == "__main__":
+    unittest.main()
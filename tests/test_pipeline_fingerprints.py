@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("METRICS", "0")
+
+import pipeline  # noqa: E402
+from pipeline import BLOCKED, DONE, FAILED, UNCHANGED, Pipeline, PipelineContext, Stage  # noqa: E402
+from product_record import ProductRecord  # noqa: E402
+
+
+def _scrape(ctx):
+    # スクレイピングのたびに新しいレコード（空白が残ったまま・取得時刻は毎回違う）
+    scraped_at = datetime.now().isoformat()
+    ctx.raw_data = [
+        ProductRecord(url=f"https://example.com/{i}", title=f"  Product   {i} ", description="a\n  b",
+                      raw_price=" ¥1,000 ", specs="cpu:  x", scraped_at=scraped_at)
+        for i in range(5)
+    ]
+
+
+STAGES = [
+    Stage("scrape", _scrape),
+    Stage("clean", pipeline._clean, ("scrape",), pipeline._clean_fingerprint),
+    Stage("store", pipeline._store, ("clean",), pipeline._store_fingerprint),
+]
+
+
+class CleanStoreFingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "seo_content.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self):
+        ctx = PipelineContext(db_path=self.db_path)
+        return Pipeline(STAGES, db_path=self.db_path, workers=1).run(ctx), ctx
+
+    def test_second_run_with_same_input_only_refreshes_scraped_at(self):
+        first, ctx = self._run()
+        self.assertEqual(first, {"scrape": DONE, "clean": DONE, "store": DONE})
+        # 整形は元のレコードを書き換えない
+        self.assertEqual(ctx.raw_data[0].title, "  Product   0 ")
+        self.assertEqual(ctx.cleaned[0].title, "Product 0")
+
+        second, ctx = self._run()
+        self.assertEqual(second["clean"], UNCHANGED)
+        # clean を省いても store は最終取得時刻を更新する（内容はそのまま）
+        self.assertEqual(second["store"], DONE)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute("SELECT title, scraped_at FROM products ORDER BY url").fetchall()
+        finally:
+            conn.close()
+        self.assertEqual(rows[0], ("Product 0", ctx.raw_data[0].scraped_at))
+
+
+class SoftDependencyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "seo_content.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_export_runs_even_if_store_failed(self):
+        def failing_scrape(ctx):
+            raise RuntimeError("site is down")
+
+        exported = []
+        stages = [
+            Stage("scrape", failing_scrape),
+            Stage("store", lambda ctx: None, ("scrape",)),
+            Stage("generate", lambda ctx: None),
+            Stage("export", lambda ctx: exported.append(True), ("generate",), soft_deps=("store",)),
+        ]
+        results = Pipeline(stages, db_path=self.db_path, workers=2).run(PipelineContext(db_path=self.db_path))
+        self.assertEqual(results["scrape"], FAILED)
+        self.assertEqual(results["store"], BLOCKED)
+        self.assertEqual(results["export"], DONE)
+        self.assertEqual(exported, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from promotion_scheduler import PromotionScheduler, upcoming_slots  # noqa: E402
+
+NOW = datetime(2026, 1, 5, 0, 0, tzinfo=timezone.utc)  # 日本時間 09:00 の枠の直前
+
+
+class PlanAfterSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "seo_content.db")
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE products (
+                url TEXT PRIMARY KEY, title TEXT, generated_body TEXT, category TEXT,
+                scraped_at TEXT, promoted INTEGER DEFAULT 0
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO products (url, title, generated_body, category, scraped_at) VALUES (?, ?, ?, ?, ?)",
+            [(f"https://example.com/{i}", f"title {i}", "body " * (i + 1), "AI Tool", "2026-01-04T12:00:00")
+             for i in range(30)],
+        )
+        conn.commit()
+        conn.close()
+        self.scheduler = PromotionScheduler(self.db_path)
+
+    def tearDown(self):
+        self.scheduler.close()
+        self.tmp.cleanup()
+
+    def test_replan_reuses_positions_freed_by_sync(self):
+        self.scheduler.sync()
+        first = self.scheduler.plan(now_utc=NOW)
+        capacity = sum(quota for slot_at, quota in upcoming_slots(NOW) if slot_at >= NOW.strftime("%Y-%m-%dT%H:%M"))
+        self.assertEqual(len(first), capacity)
+
+        # 先頭の枠の1件目が他の経路で投稿され、sync() で計画から外れる（position 0 が空く）
+        slot_at, url, _ = first[0]
+        self.scheduler.conn.execute("UPDATE products SET promoted = 1 WHERE url = ?", (url,))
+        self.scheduler.conn.commit()
+        self.scheduler.sync()
+
+        second = self.scheduler.plan(now_utc=NOW)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(second[0][0], slot_at)
+        self.assertNotEqual(second[0][1], url)
+
+        rows = self.scheduler.conn.execute(
+            "SELECT position FROM promotion_plan WHERE slot_at = ? ORDER BY position", (slot_at,)
+        ).fetchall()
+        self.assertEqual([position for (position,) in rows], [0, 1])
+        # 空きがなければ何も割り当てない
+        self.assertEqual(self.scheduler.plan(now_utc=NOW), [])
+
+    def test_unconfirmed_post_is_never_replanned(self):
+        self.scheduler.sync()
+        slot_at, url, _ = self.scheduler.plan(now_utc=NOW)[0]
+        self.scheduler.mark_unconfirmed(url)
+
+        # 失敗扱いと違い、キューに戻らず次の計画にも入らない
+        self.scheduler.sync()
+        replanned = self.scheduler.plan(now_utc=NOW)
+        self.assertNotIn(url, [u for _, u, _ in replanned])
+        self.assertEqual([u for u, _ in self.scheduler.unconfirmed()], [url])
+
+        # 手で確かめて「投稿されていなかった」と記録したときだけ計画し直す
+        self.scheduler.resolve(url, posted=False)
+        self.assertEqual(self.scheduler.unconfirmed(), [])
+        status = self.scheduler.conn.execute(
+            "SELECT status FROM promotion_queue WHERE url = ?", (url,)
+        ).fetchone()[0]
+        self.assertEqual(status, "pending")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_shards import SEARCH_DIR, SearchShards  # noqa: E402
+
+
+class InterruptedWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            "CREATE TABLE products (url TEXT PRIMARY KEY, title TEXT, generated_body TEXT, category TEXT, updated_at TEXT)"
+        )
+        self.conn.execute(
+            "INSERT INTO products VALUES ('https://example.com/a', 'Python 入門', 'python 副業', 'AI Tool', '1')"
+        )
+        self.conn.commit()
+        self.files = {}
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _shards(self, write):
+        return SearchShards(
+            self.conn,
+            filename_for=lambda url: url.rsplit("/", 1)[-1] + ".md",
+            write=write,
+            exists=lambda rel_path: rel_path in self.files,
+        )
+
+    def _write(self, rel_path, content):
+        self.files[rel_path] = content
+
+    def test_files_left_stale_by_a_failed_write_are_rewritten(self):
+        self._shards(self._write).update()
+        block = f"{SEARCH_DIR}/docs/0.json"
+        self.assertIn("Python 入門", self.files[block])
+
+        self.conn.execute("UPDATE products SET title = 'Rust 入門', updated_at = '2'")
+        self.conn.commit()
+
+        def failing_write(rel_path, content):
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            self._shards(failing_write).update()
+
+        # 転置インデックスは更新済みで記事の変更はもう検出されないが、書き出しは残っている
+        self._shards(self._write).update()
+        self.assertIn("Rust 入門", self.files[block])
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM search_dirty").fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 """
 アフィリエイトリンクを一元管理するファイル
 """
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 # ==========================================
 # 1. ここにあなたのA8.netリンクを登録します
@@ -26,8 +30,122 @@ DEFAULT_AD = """
 </div>
 """
 
+# 外部のリンクカタログ（JSON）。大量の案件キーワードはこちらに置く
+# 形式: {"links": [{"keywords": ["PLAUD", "PLAUD NOTE"], "html": "<a ...>", "priority": 10}, ...]}
+AFFILIATE_CATALOG = os.getenv("AFFILIATE_CATALOG", "")
+
+# ==========================================
+# 2. リンクカタログ
+# ==========================================
+
+@dataclass
+class LinkEntry:
+    keywords: List[str]
+    html: str
+    priority: int = 0
+
+def load_link_catalog(path: str = AFFILIATE_CATALOG) -> List[LinkEntry]:
+    """SPECIFIC_LINKS と（あれば）JSONカタログからリンク一覧を作る"""
+    entries = [LinkEntry(keywords=[keyword], html=html) for keyword, html in SPECIFIC_LINKS.items()]
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for item in json.load(f).get("links", []):
+                entries.append(LinkEntry(
+                    keywords=list(item["keywords"]),
+                    html=item["html"],
+                    priority=int(item.get("priority", 0)),
+                ))
+    return entries
+
+# ==========================================
+# 3. Aho-Corasick マッチャー
+# ==========================================
+
+class AhoCorasickMatcher:
+    """複数キーワードを一度に探す有限オートマトン
+
+    構築はキーワードの総文字数に比例し、検索はタイトルの長さ（＋ヒット数）に比例する。
+    キーワード数が何千件になってもタイトル1件あたりの検索コストは変わらない。
+    """
+
+    def __init__(self, patterns: List[Tuple[str, object]]):
+        # ノードごとの遷移表・失敗リンク・そのノードで終わるパターン
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, object]]] = [[]]
+
+        for pattern, value in patterns:
+            pattern = pattern.lower()
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                node = nxt
+            self._outputs[node].append((len(pattern), value))
+
+        # 幅優先で失敗リンクを張り、失敗先の出力を引き継ぐ
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._outputs[nxt] = self._outputs[nxt] + self._outputs[self._fail[nxt]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, object]]:
+        """テキスト中のすべての一致を (開始位置, 長さ, 値) で返す（1パス）"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        node = 0
+        for i, ch in enumerate(text.lower()):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if outputs[node]:
+                for length, value in outputs[node]:
+                    matches.append((i - length + 1, length, value))
+        return matches
+
+_matcher: Optional[AhoCorasickMatcher] = None
+
+def build_matcher(entries: List[LinkEntry]) -> AhoCorasickMatcher:
+    return AhoCorasickMatcher([(keyword, entry) for entry in entries for keyword in entry.keywords])
+
+def get_matcher() -> AhoCorasickMatcher:
+    """カタログから一度だけマッチャーを構築して使い回す"""
+    global _matcher
+    if _matcher is None:
+        _matcher = build_matcher(load_link_catalog())
+    return _matcher
+
+def find_affiliate_links(product_title: str, matcher: Optional[AhoCorasickMatcher] = None) -> List[LinkEntry]:
+    """タイトルにマッチするリンクを優先順に返す
+
+    優先順位: priority が高い → 一致したキーワードが長い → タイトル中で先に出る
+    """
+    best: Dict[int, Tuple[int, int, int, LinkEntry]] = {}
+    for start, length, entry in (matcher or get_matcher()).find_all(product_title):
+        rank = (-entry.priority, -length, start)
+        current = best.get(id(entry))
+        if current is None or rank < current[:3]:
+            best[id(entry)] = (*rank, entry)
+    return [item[3] for item in sorted(best.values(), key=lambda item: item[:3])]
+
 # ==========================================
-# 2. リンク取得ロジック
+# 4. リンク取得ロジック
 # ==========================================
 
 def get_affiliate_html(product_title: str) -> str:
@@ -35,11 +153,11 @@ def get_affiliate_html(product_title: str) -> str:
     記事のタイトル（製品名）にマッチする広告があればそれを返し、
     なければデフォルト広告を返す関数
     """
-    # 特定の商品リンクがあるかチェック
-    for keyword, html in SPECIFIC_LINKS.items():
-        if keyword.lower() in product_title.lower():
-            # マッチしたら、その商品のリンク + デフォルトバナーも返す（収益最大化）
-            return f'<div class="affiliate-box"><p>公式サイトはこちら：{html}</p></div>'
+    # 特定の商品リンクがあるかチェック（全キーワードを1パスで照合）
+    matches = find_affiliate_links(product_title)
+    if matches:
+        # マッチしたら、その商品のリンク + デフォルトバナーも返す（収益最大化）
+        return f'<div class="affiliate-box"><p>公式サイトはこちら：{matches[0].html}</p></div>'
 
     # マッチングしない場合はデフォルト広告のみ返す
     return DEFAULT_AD
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+キーワード・記事タイトルの類似度インデックス
+
+文字n-gram TF-IDF のコサイン類似度で、既存記事とほぼ同じテーマの
+キーワードを生成前に検出する。外部ライブラリには依存しない。
+"""
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# ==========================================
+# 設定
+# ==========================================
+NGRAM_SIZES = (2, 3)
+DEFAULT_THRESHOLD = 0.85
+# クエリのn-gram（IDF重み付き）のうち既存記事側にも含まれる割合の下限。
+# 「Gemini API 料金」と「Gemini API 活用事例」のように、共通部分が長くても
+# クエリ固有の語（料金）が残るものは別テーマとして扱う。
+DEFAULT_MIN_COVERAGE = 0.9
+
+# 候補抽出で辿る転置リストの総数の上限と、厳密に類似度計算する候補数。
+# "python" のようにほぼ全記事に出るn-gramはIDFが小さく、辿っても効果が薄い。
+POSTINGS_BUDGET = 4000
+MAX_CANDIDATES = 32
+
+# content_generator.py が付けるタイトルの定型部分（キーワードだけを比較する）
+_TITLE_TEMPLATE_RE = re.compile(r"^【入門】(.+)とは？初心者向け徹底解説$")
+
+
+@dataclass
+class DuplicateMatch:
+    key: str
+    label: str
+    score: float
+
+
+def extract_keyword(title: str) -> str:
+    """自動生成タイトルから元のキーワードを取り出す（定型外はそのまま返す）"""
+    m = _TITLE_TEMPLATE_RE.match(title.strip())
+    return m.group(1) if m else title
+
+
+def normalize(text: str) -> str:
+    """全角/半角・大文字小文字・空白の揺れを吸収する"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(text.split())
+
+
+def char_ngrams(text: str) -> Counter:
+    text = normalize(text)
+    grams: Counter = Counter()
+    for n in NGRAM_SIZES:
+        if len(text) < n:
+            continue
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    if not grams and text:
+        grams[text] += 1
+    return grams
+
+
+# ==========================================
+# インデックス本体
+# ==========================================
+class KeywordIndex:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, min_coverage: float = DEFAULT_MIN_COVERAGE):
+        self.threshold = threshold
+        self.min_coverage = min_coverage
+        self._keys: List[str] = []
+        self._labels: List[str] = []
+        self._vectors: List[Counter] = []
+        self._norms: List[float] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._key_to_id: Dict[str, int] = {}
+        # IDFは文書数で変わるので、件数が一定以上増えたらノルムを再計算する
+        self._norms_at = 0
+        self._bulk_loading = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _idf(self, gram: str) -> float:
+        df = len(self._postings.get(gram, ()))
+        return math.log((len(self._keys) + 1) / (df + 1)) + 1.0
+
+    def _norm(self, vector: Counter) -> float:
+        return math.sqrt(sum((tf * self._idf(g)) ** 2 for g, tf in vector.items())) or 1.0
+
+    def _refresh_norms(self):
+        self._norms = [self._norm(v) for v in self._vectors]
+        self._norms_at = len(self._keys)
+
+    def add(self, key: str, text: str):
+        """記事（URLなどの一意キー）とそのタイトル/キーワードを登録する"""
+        if key in self._key_to_id:
+            return
+        vector = char_ngrams(extract_keyword(text))
+        doc_id = len(self._keys)
+        self._keys.append(key)
+        self._labels.append(text)
+        self._vectors.append(vector)
+        self._key_to_id[key] = doc_id
+        for gram in vector:
+            self._postings[gram].append(doc_id)
+        if self._bulk_loading:
+            self._norms.append(1.0)
+            return
+        self._norms.append(self._norm(vector))
+        if len(self._keys) > self._norms_at * 1.1 + 100:
+            self._refresh_norms()
+
+    def query(self, text: str, limit: int = 5) -> List[Tuple[float, str, str]]:
+        """類似度の高い順に (score, key, label) を返す"""
+        q_tf = char_ngrams(extract_keyword(text))
+        if not q_tf or not self._keys:
+            return []
+
+        # クエリ側の重み（tf * idf^2）を先に計算し、文書側は tf だけ掛ければ済むようにする
+        q_weights: Dict[str, float] = {}
+        q_norm_sq = 0.0
+        for gram, tf in q_tf.items():
+            idf = self._idf(gram)
+            q_weights[gram] = tf * idf * idf
+            q_norm_sq += (tf * idf) ** 2
+        q_norm = math.sqrt(q_norm_sq) or 1.0
+
+        # 候補抽出: 出現文書の少ない（＝識別力の高い）n-gramから転置リストを辿り、
+        # 部分スコアの上位だけを厳密計算に回す
+        partial: Dict[int, float] = defaultdict(float)
+        budget = POSTINGS_BUDGET
+        grams = sorted((g for g in q_tf if g in self._postings), key=lambda g: len(self._postings[g]))
+        for gram in grams:
+            postings = self._postings[gram]
+            if partial and len(postings) > budget:
+                break
+            weight = q_weights[gram]
+            for doc_id in postings[:budget]:
+                partial[doc_id] += weight
+            budget -= len(postings)
+            if budget <= 0:
+                break
+        candidates = sorted(partial, key=partial.__getitem__, reverse=True)[:MAX_CANDIDATES]
+
+        scored = []
+        for doc_id in candidates:
+            vector = self._vectors[doc_id]
+            dot = 0.0
+            for gram, weight in q_weights.items():
+                tf = vector.get(gram)
+                if tf:
+                    dot += weight * tf
+            if dot:
+                scored.append((dot / (q_norm * self._norms[doc_id]), doc_id))
+
+        scored.sort(reverse=True)
+        return [(min(score, 1.0), self._keys[d], self._labels[d]) for score, d in scored[:limit]]
+
+    def coverage(self, text: str, key: str) -> float:
+        """クエリのn-gram重みのうち、key の記事にも含まれる割合（0〜1）"""
+        doc_id = self._key_to_id.get(key)
+        q_tf = char_ngrams(extract_keyword(text))
+        if doc_id is None or not q_tf:
+            return 0.0
+        vector = self._vectors[doc_id]
+        total = covered = 0.0
+        for gram, tf in q_tf.items():
+            weight = tf * self._idf(gram)
+            total += weight
+            if gram in vector:
+                covered += weight
+        return covered / total
+
+    def find_duplicate(self, text: str) -> Optional[DuplicateMatch]:
+        """しきい値以上に似ていて、クエリをほぼ覆う既存記事があれば返す"""
+        for score, key, label in self.query(text, limit=3):
+            if score < self.threshold:
+                break
+            if self.coverage(text, key) >= self.min_coverage:
+                return DuplicateMatch(key=key, label=label, score=score)
+        return None
+
+    @classmethod
+    def from_db(cls, db_path: str, threshold: float = DEFAULT_THRESHOLD,
+                url_prefix: Optional[str] = None) -> "KeywordIndex":
+        """生成済み記事のタイトルからインデックスを構築する
+
+        url_prefix を渡すと、その配下の記事（キーワード指定で生成した記事など）だけを対象にする。
+        """
+        index = cls(threshold=threshold)
+        conn = sqlite3.connect(db_path)
+        try:
+            sql = ("SELECT url, title FROM products "
+                   "WHERE generated_body IS NOT NULL AND generated_body != '' AND title IS NOT NULL")
+            params: Tuple = ()
+            if url_prefix:
+                sql += " AND substr(url, 1, ?) = ?"
+                params = (len(url_prefix), url_prefix)
+            cursor = conn.execute(sql, params)
+            # 構築中はノルム計算を止め、最後に一度だけ計算する
+            index._bulk_loading = True
+            for url, title in cursor:
+                index.add(url, title)
+        finally:
+            index._bulk_loading = False
+            index._refresh_norms()
+            conn.close()
+        return index
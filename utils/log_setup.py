@@ -0,0 +1,135 @@
+"""
+全エントリーポイント共通のログ設定（書き込みはバックグラウンドのスレッドで行う）
+
+    from utils.log_setup import setup_logging
+
+    def main():
+        setup_logging("scraper_pipeline")
+
+ルートロガーには QueueHandler だけをつけ、logger.info() はキューに積んで戻る
+（asyncio のイベントループやスクレイピングのワーカーがディスク書き込みで止まらない）。
+QueueListener のスレッドがキューから取り出して、次の2か所に書く。
+    コンソール  これまでと同じ「時刻 - レベル - メッセージ」の形式
+    ファイル    LOG_DIR/<名前>.log に1行1レコードの JSON（run_id / stage / url の文脈つき）。
+                LOG_MAX_BYTES を超えたら .1, .2 ... にローテーションし、LOG_BACKUP_COUNT 個まで残す
+
+別プロセス（sharded_scraper のワーカー）は setup_worker_logging(queue) でレコードを
+multiprocessing のキューに送り、親プロセスの forward_from(queue) が同じ出力先に流す。
+LOG_DIR を空にするとファイルには書かない。
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+from utils import run_context
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord が最初から持つ属性（これ以外は extra= で渡された値として JSON に入れる）
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "run_id", "stage", "url"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード1行の JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+            "url": getattr(record, "url", None),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """呼び出し元のスレッドで文脈（run_id / stage / url）をつけてからキューに積む"""
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        if not hasattr(record, "run_id"):
+            # 別プロセスから転送されたレコードは送り元の文脈のまま
+            record.run_id, record.stage, record.url = run_context.current()
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        # キューの先（別スレッド・別プロセス）で引数や例外オブジェクトを触らないよう、文字列にしておく
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _output_handlers(name):
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    handlers = [console]
+    if LOG_DIR:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIR, f"{name}.log"), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    return handlers
+
+
+def setup_logging(name, level=LOG_LEVEL):
+    """ルートロガーを設定する（プロセスで最初の1回だけ有効）。name はログファイル名になる"""
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()  # 上限なし（put が待たされることはない）
+    _listener = logging.handlers.QueueListener(records, *_output_handlers(name), respect_handler_level=True)
+    _listener.start()
+    root = logging.getLogger()
+    root.addHandler(ContextQueueHandler(records))
+    root.setLevel(level)
+    # 終了時にキューに残ったレコードを書き切る（後から登録された atexit の処理のログも含む）
+    atexit.register(_listener.stop)
+
+
+def setup_worker_logging(records, level=LOG_LEVEL):
+    """子プロセス用: ログを multiprocessing のキューで親プロセスに送る"""
+    root = logging.getLogger()
+    root.handlers[:] = [ContextQueueHandler(records)]
+    root.setLevel(level)
+
+
+class _Forward(logging.Handler):
+    def emit(self, record):
+        logger = logging.getLogger(record.name)
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def forward_from(records):
+    """子プロセスから届いたレコードをこのプロセスのロガーに流すリスナーを起動して返す（終わったら stop()）"""
+    listener = logging.handlers.QueueListener(records, _Forward())
+    listener.start()
+    return listener
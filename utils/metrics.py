@@ -0,0 +1,328 @@
+"""
+Prometheus 形式のメトリクス（カウンター・ゲージ・ヒストグラム）
+
+    from utils import metrics
+
+    PAGES = metrics.counter("seo_scrape_pages_total", "取得したページ数", ("source", "status"))
+    PAGES.inc(source="Zenn", status="ok")
+
+    STAGE_SECONDS = metrics.histogram("seo_pipeline_stage_duration_seconds", "ステージの所要時間", ("stage",))
+    with STAGE_SECONDS.time(stage="export"):
+        ...
+
+値はプロセス内のメモリに持つだけなので、ホットループで使っても安い（1回あたり数マイクロ秒）。
+出力先は2つ:
+    テキストファイル  プロセス終了時に METRICS_DIR/<エントリーポイント名>.prom へ書く
+                      （node_exporter の textfile コレクターで拾えば、日をまたいだグラフにできる）
+    HTTP              METRICS_PORT を指定すると、最初に値を記録したときに
+                      http://127.0.0.1:<port>/metrics で公開する（常駐プロセスや長い実行の確認用）
+
+どの系列にも entrypoint ラベル（scraper_pipeline など）をつけるので、複数のエントリーポイントの
+ファイルを同じディレクトリに置いても系列がぶつからない。METRICS=0 で無効化（記録も書き出しもしない）。
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ENTRYPOINT = os.getenv("METRICS_ENTRYPOINT") or os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+# 秒単位のヒストグラムの既定の区切り（ページ取得〜パイプラインのステージまで）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_started = False
+_started_lock = threading.Lock()
+_process_started = time.time()
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(名前の接尾辞, ラベル値, 追加のラベル, 値) の一覧"""
+        with self._lock:
+            return [("", key, (), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_started()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        _ensure_started()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_started()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各区切り以下の件数..., 件数, 合計]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+        _ensure_started()
+
+    def time(self, **labels):
+        """with ブロックの所要時間（秒）を記録する"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), count))
+            samples.append(("_bucket", key, (("le", "+Inf"),), state[-2]))
+            samples.append(("_count", key, (), state[-2]))
+            samples.append(("_sum", key, (), state[-1]))
+        return samples
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def _get_or_create(cls, name, documentation, labelnames, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} is already registered with a different type or labels")
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _get_or_create(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return _get_or_create(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+# ==========================================
+# 別プロセスの値の取り込み（sharded_scraper のワーカーなど）
+# ==========================================
+def snapshot():
+    """記録済みの値（pickle できる辞書）。merge() で別のプロセスに足し込める"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    result = {}
+    for metric in metrics:
+        with metric._lock:
+            if metric._values:
+                result[metric.name] = {key: list(value) if isinstance(value, list) else value
+                                       for key, value in metric._values.items()}
+    return result
+
+
+def merge(values):
+    """snapshot() の値を足し込む（カウンター・ヒストグラムは加算、ゲージは上書き）"""
+    if not METRICS_ENABLED:
+        return
+    with _registry_lock:
+        metrics = dict(_registry)
+    for name, series in values.items():
+        metric = metrics.get(name)
+        if metric is None:
+            continue
+        with metric._lock:
+            for key, value in series.items():
+                current = metric._values.get(key)
+                if isinstance(metric, Histogram):
+                    metric._values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                elif isinstance(metric, Gauge) or current is None:
+                    metric._values[key] = value
+                else:
+                    metric._values[key] = current + value
+    if values:
+        _ensure_started()
+
+
+def reset():
+    """記録済みの値を捨てる（終了時にも何も書き出さなくなる）"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        with metric._lock:
+            metric._values.clear()
+
+
+# ==========================================
+# 出力
+# ==========================================
+def _format_value(value):
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    """Prometheus のテキスト形式（version 0.0.4）"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        samples = metric.samples()
+        if not samples:
+            continue
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, key, extra, value in samples:
+            labels = [("entrypoint", METRICS_ENTRYPOINT), *zip(metric.labelnames, key), *extra]
+            text = ",".join(f'{name}="{_escape(str(label))}"' for name, label in labels)
+            lines.append(f"{metric.name}{suffix}{{{text}}} {_format_value(value)}")
+    if lines:
+        lines.append("# HELP seo_process_start_time_seconds 記録したプロセスの開始時刻（UNIX時間）")
+        lines.append("# TYPE seo_process_start_time_seconds gauge")
+        lines.append(f'seo_process_start_time_seconds{{entrypoint="{_escape(METRICS_ENTRYPOINT)}"}} {_process_started:.3f}')
+        lines.append("# HELP seo_metrics_written_time_seconds メトリクスを書き出した時刻（UNIX時間）")
+        lines.append("# TYPE seo_metrics_written_time_seconds gauge")
+        lines.append(f'seo_metrics_written_time_seconds{{entrypoint="{_escape(METRICS_ENTRYPOINT)}"}} {time.time():.3f}')
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def write_textfile(path=None):
+    """テキストファイルに書き出してパスを返す（値がなければ何もしない）。書き換えは一時ファイル経由で行う"""
+    text = render()
+    if not text:
+        return None
+    if path is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{METRICS_ENTRYPOINT}.prom")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+def start_http_server(port=METRICS_PORT, host="127.0.0.1"):
+    """/metrics を返す HTTP サーバーをデーモンスレッドで起動し、サーバーを返す"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _ensure_started():
+    """最初に値を記録したときに、終了時の書き出しと（指定があれば）HTTP サーバーを用意する"""
+    global _started
+    if _started:
+        return
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+        atexit.register(_write_at_exit)
+        if METRICS_PORT:
+            try:
+                start_http_server(METRICS_PORT)
+            except OSError as e:
+                import logging
+                logging.getLogger(__name__).warning(f"Failed to start metrics endpoint on port {METRICS_PORT}: {e}")
+
+
+def _write_at_exit():
+    import logging
+    logger = logging.getLogger(__name__)
+    try:
+        path = write_textfile()
+    except OSError as e:
+        logger.warning(f"Failed to write metrics: {e}")
+        return
+    if path:
+        logger.info(f"Metrics written to {path}")
@@ -0,0 +1,45 @@
+"""
+実行ID と、ログにつける文脈（ステージ・URL）
+
+RUN_ID は1回の実行を表す ID で、ログの各行・generation_metrics の各行に入る。
+RUN_ID 環境変数 → GitHub Actions の GITHUB_RUN_ID → 起動時刻とプロセスID の順に決め、
+環境変数にも入れておくので、子プロセス（sharded_scraper のワーカーなど）も同じ ID になる。
+
+    from utils import run_context
+
+    with run_context.bind(stage="scrape", url=url):
+        logger.info("...")   # JSON ログに run_id / stage / url が入る
+
+文脈は contextvars に持つので、スレッドや asyncio のタスクごとに別になる。
+"""
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+RUN_ID = os.environ.setdefault(
+    "RUN_ID", os.getenv("GITHUB_RUN_ID") or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+)
+
+_stage = contextvars.ContextVar("run_context_stage", default=None)
+_url = contextvars.ContextVar("run_context_url", default=None)
+
+
+@contextmanager
+def bind(stage=None, url=None):
+    """with ブロックの中のログに stage / url をつける（None の項目は外側の値のまま）"""
+    tokens = []
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    if url is not None:
+        tokens.append((_url, _url.set(url)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current():
+    """(run_id, stage, url)"""
+    return RUN_ID, _stage.get(), _url.get()
@@ -1,34 +1,41 @@
 from playwright.sync_api import sync_playwright
+import os
+import sys
 import time
 
+# リポジトリ直下のモジュールを読めるように（python utils/save_x_cookies.py で実行される）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from browser_service import browser_lease_sync
+
 def save_cookies():
     with sync_playwright() as p:
-        # ブラウザを起動（ログインできるように画面を表示）
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
+        # ブラウザを起動（ログインできるように画面を表示）。
+        # 手で操作する画面なので browser_service（バックグラウンドで動く）からは借りず、常にこの場で起動する
+        launch = lambda: p.chromium.launch(headless=False)
+        with browser_lease_sync(p, None, launch) as lease:
+            context = lease.new_context_sync()
+            page = context.new_page()
 
-        print("🔵 Xのログイン画面を開きます。")
-        print("❗ 自分でIDとパスワードを入力してログインしてください！")
-        print("❗ ログインが完了してホーム画面（タイムライン）が表示されるまで操作してください。")
-        
-        page.goto("https://x.com/i/flow/login")
+            print("🔵 Xのログイン画面を開きます。")
+            print("❗ 自分でIDとパスワードを入力してログインしてください！")
+            print("❗ ログインが完了してホーム画面（タイムライン）が表示されるまで操作してください。")
+            
+            page.goto("https://x.com/i/flow/login")
 
-        # ログイン完了を待つ（URLが 'home' になるまで、最大3分待機）
-        try:
-            page.wait_for_url("**/home", timeout=180000)
-            print("✅ ログインを検知しました！")
-        except:
-            print("❌ タイムアウトしました。ログインできませんでしたか？")
-            return
+            # ログイン完了を待つ（URLが 'home' になるまで、最大3分待機）
+            try:
+                page.wait_for_url("**/home", timeout=180000)
+                print("✅ ログインを検知しました！")
+            except:
+                print("❌ タイムアウトしました。ログインできませんでしたか？")
+                return
 
-        # ログイン状態（クッキー）をファイルに保存
-        context.storage_state(path="x_cookies.json")
-        print("💾 ログイン情報（合鍵）を 'x_cookies.json' に保存しました。")
-        print("✨ これでもうID入力は不要です！")
-        
-        time.sleep(2)
-        browser.close()
+            # ログイン状態（クッキー）をファイルに保存
+            context.storage_state(path="x_cookies.json")
+            print("💾 ログイン情報（合鍵）を 'x_cookies.json' に保存しました。")
+            print("✨ これでもうID入力は不要です！")
+            
+            time.sleep(2)
 
 if __name__ == "__main__":
-    save_cookies()
\ No newline at end of file
+    save_cookies()
@@ -0,0 +1,202 @@
+"""
+軽量トレーシング（Chrome trace 形式で書き出す）
+
+    from utils import tracing
+
+    with tracing.span("scrape.navigate", url=url) as sp:
+        await page.goto(url)
+        sp.set(bytes=len(await page.content()))
+
+TRACE=1 のときだけ記録する（既定は無効で、span() は何もしないオブジェクトを返す）。
+スパンは開始・終了時刻（perf_counter_ns）と属性をメモリ上のリストに追記するだけなので、
+調べたい実行でそのまま有効にできる（1スパンあたり数マイクロ秒）。プロセス終了時に
+traces/trace-<日時>-<pid>.json に書き出し、時間のかかったスパンの上位をログに出す。
+書き出したファイルは chrome://tracing や https://ui.perfetto.dev で開ける。
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+TRACE_ENABLED = os.getenv("TRACE", "0") == "1"
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+# 1プロセスで保持するスパンの上限（超えた分は数だけ数える）
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200000"))
+TRACE_TOP_N = int(os.getenv("TRACE_TOP_N", "10"))
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("tracing_current_span", default=None)
+_spans = []
+_dropped = 0
+_epoch_ns = time.perf_counter_ns()
+_started_at = datetime.now()
+_atexit_registered = False
+_lock = threading.Lock()
+
+
+def _track_id():
+    """Chrome trace のトラック: asyncio のタスクごと、なければスレッドごと"""
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            return id(task)
+    return threading.get_ident()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "parent", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = 0
+        self.parent = None
+        self._token = None
+
+    def set(self, **attrs):
+        """URL・バイト数・トークン数などの属性を追加する"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self, end)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    """name のスパンを開始する（with 文で使う）"""
+    if not TRACE_ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def _record(sp, end):
+    global _dropped, _atexit_registered
+    if len(_spans) >= TRACE_MAX_SPANS:
+        _dropped += 1
+        return
+    parent = sp.parent.name if sp.parent is not None else None
+    _spans.append((sp.name, sp.start, end, _track_id(), parent, sp.attrs))
+    if not _atexit_registered:
+        with _lock:
+            if not _atexit_registered:
+                atexit.register(_write_at_exit)
+                _atexit_registered = True
+
+
+def reset():
+    """記録済みのスパンを捨てる"""
+    global _dropped
+    _spans.clear()
+    _dropped = 0
+
+
+# ==========================================
+# 書き出し・集計
+# ==========================================
+def chrome_trace():
+    """Chrome trace（Trace Event Format）の辞書"""
+    pid = os.getpid()
+    events = []
+    for name, start, end, track, parent, attrs in list(_spans):
+        args = {k: v if isinstance(v, (str, int, float, bool)) or v is None else str(v) for k, v in attrs.items()}
+        if parent:
+            args["parent"] = parent
+        events.append({
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": (start - _epoch_ns) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": pid,
+            "tid": track,
+            "args": args,
+        })
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "command": " ".join(sys.argv),
+            "started_at": _started_at.isoformat(timespec="seconds"),
+            "dropped_spans": _dropped,
+        },
+    }
+
+
+def summary(top_n=TRACE_TOP_N):
+    """時間のかかったスパン上位 top_n 件と、スパン名ごとの合計を表示用の行で返す"""
+    spans = list(_spans)
+    if not spans:
+        return []
+    lines = [f"Slowest {min(top_n, len(spans))} of {len(spans)} spans:"]
+    for name, start, end, _track, _parent, attrs in sorted(spans, key=lambda s: s[1] - s[2])[:top_n]:
+        detail = ", ".join(f"{k}={v}" for k, v in attrs.items())
+        lines.append(f"  {(end - start) / 1e6:10.1f} ms  {name}  {detail}"[:200])
+
+    totals = {}
+    for name, start, end, *_ in spans:
+        count, total = totals.get(name, (0, 0))
+        totals[name] = (count + 1, total + end - start)
+    lines.append("Total time by span name:")
+    for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:top_n]:
+        lines.append(f"  {total / 1e6:10.1f} ms  {name}  ({count} spans, avg {total / count / 1e6:.2f} ms)")
+    return lines
+
+
+def write(path=None):
+    """トレースを書き出してパスを返す（スパンがなければ何もしない）"""
+    if not _spans:
+        return None
+    if path is None:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"trace-{_started_at:%Y%m%d-%H%M%S}-{os.getpid()}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(), f, ensure_ascii=False, separators=(",", ":"))
+    return path
+
+
+def _write_at_exit():
+    try:
+        path = write()
+    except OSError as e:
+        logger.warning(f"Failed to write trace: {e}")
+        return
+    if path:
+        for line in summary():
+            logger.info(line)
+        logger.info(f"Trace written to {path}")